@@ -1,6 +1,6 @@
 # backend/analysis_utils.py - PERFECTED VERSION
 import re
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import nltk
 from nltk.tokenize import word_tokenize, sent_tokenize
 from nltk.corpus import stopwords
@@ -69,22 +69,64 @@ SARCASM_PATTERNS = [
     r"\boh\s+(boy|joy)\b"
 ]
 
+# token -> emotion lookup (each keyword belongs to exactly one emotion)
+EMOTION_LOOKUP = {word: emotion for emotion, words in EMOTION_KEYWORDS.items() for word in words}
+
+IMPORTANT_WORDS = NEGATION_WORDS | INTENSIFIERS | set(EMOTION_LOOKUP)
+
+SENTENCE_SPLIT = re.compile(r'[.!?]+')
+WHITESPACE = re.compile(r'\s+')
+
+_stop_words = None
+
+def get_stop_words() -> set:
+    """NLTK English stopwords, loaded once per process"""
+    global _stop_words
+    if _stop_words is None:
+        _stop_words = set(stopwords.words('english'))
+    return _stop_words
+
+class Document:
+    """Text normalized and tokenized once, shared by every analysis stage.
+
+    - text:       original text (case kept, for summaries/VADER)
+    - lower:      lowercased text (for the regex rules)
+    - sentences:  original text split on sentence punctuation
+    - tokens:     word tokens of the lowercased, whitespace-collapsed text
+    - stop_mask:  True where a token is a stopword the emotion engine drops
+    """
+    __slots__ = ("text", "lower", "sentences", "tokens", "stop_mask")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lower = text.lower()
+        self.sentences = SENTENCE_SPLIT.split(text.strip())
+        self.tokens = word_tokenize(WHITESPACE.sub(' ', self.lower).strip())
+        stop_words = get_stop_words()
+        self.stop_mask = [
+            (token in stop_words) and (token not in IMPORTANT_WORDS)
+            for token in self.tokens
+        ]
+
+    def content_tokens(self, start: int = 0) -> List[str]:
+        """Tokens that survive stopword filtering, from token index `start` on"""
+        return [
+            token for token, is_stop in zip(self.tokens[start:], self.stop_mask[start:])
+            if not is_stop
+        ]
+
+def process_document(text: str) -> Document:
+    """Run the shared normalization/tokenization pipeline over a text"""
+    return Document(text)
+
 def preprocess_text(text: str) -> List[str]:
     """Tokenize and clean text"""
-    text = text.lower()
-    text = re.sub(r'\s+', ' ', text).strip()
-    tokens = word_tokenize(text)
-    
-    stop_words = set(stopwords.words('english'))
-    important_words = (NEGATION_WORDS | INTENSIFIERS | 
-                      set().union(*[set(words) for words in EMOTION_KEYWORDS.values()]))
-    
-    tokens = [token for token in tokens if (token not in stop_words) or (token in important_words)]
-    return tokens
+    return process_document(text).content_tokens()
 
-def detect_sarcasm(text: str) -> Tuple[bool, float]:
+def detect_sarcasm(text: str, text_lower: Optional[str] = None) -> Tuple[bool, float]:
     """Detect sarcasm with confidence score"""
-    text_lower = text.lower()
+    if text_lower is None:
+        text_lower = text.lower()
     score = 0
     
     # Check patterns
@@ -127,10 +169,15 @@ def detect_sarcasm(text: str) -> Tuple[bool, float]:
     
     return is_sarcastic, confidence
 
-def analyze_text_with_context(text: str) -> Dict:
-    """PERFECTED emotion analysis with proper handling of all edge cases"""
+def analyze_text_with_context(text: str, doc: Document = None) -> Dict:
+    """PERFECTED emotion analysis with proper handling of all edge cases
+
+    Pass a `doc` from process_document() to reuse an existing tokenization.
+    """
+    if doc is None:
+        doc = process_document(text)
     original_text = text
-    text_lower = text.lower()
+    text_lower = doc.lower
     
     # =============================================================
     # PHASE 1: SPECIAL CASE HANDLING (Exact matches first)
@@ -206,9 +253,9 @@ def analyze_text_with_context(text: str) -> Dict:
     # =============================================================
     
     # Check for sarcasm
-    sarcasm_detected, sarcasm_confidence = detect_sarcasm(text)
+    sarcasm_detected, sarcasm_confidence = detect_sarcasm(text, text_lower)
     
-    tokens = preprocess_text(text)
+    tokens = doc.content_tokens()
     
     # Initialize scores
     scores = {emotion: 0 for emotion in EMOTION_KEYWORDS.keys()}
@@ -228,37 +275,37 @@ def analyze_text_with_context(text: str) -> Dict:
             continue
         
         # Check for emotions
-        for emotion, keywords in EMOTION_KEYWORDS.items():
-            if token in keywords:
-                # Check if this emotion is negated (look back 3 words)
-                negated = False
-                for j in range(max(0, i-3), i):
-                    if tokens[j] in NEGATION_WORDS:
-                        negated = True
-                        break
-                
-                # Calculate base score
-                base_score = 2.0 if intensifier_active else 1.0
-                intensifier_active = False  # Reset after use
+        emotion = EMOTION_LOOKUP.get(token)
+        if emotion is not None:
+            # Check if this emotion is negated (look back 3 words)
+            negated = False
+            for j in range(max(0, i-3), i):
+                if tokens[j] in NEGATION_WORDS:
+                    negated = True
+                    break
+            
+            # Calculate base score
+            base_score = 2.0 if intensifier_active else 1.0
+            intensifier_active = False  # Reset after use
+            
+            if not negated:
+                scores[emotion] += base_score
+            else:
+                # Apply negation: reduce this emotion
+                scores[emotion] -= base_score * 0.5
                 
-                if not negated:
-                    scores[emotion] += base_score
-                else:
-                    # Apply negation: reduce this emotion
-                    scores[emotion] -= base_score * 0.5
-                    
-                    # Add to opposite emotion
-                    opposites = {
-                        "joy": "sadness",
-                        "sadness": "joy",
-                        "anger": "fear",
-                        "fear": "anger",
-                        "surprise": "fear",
-                        "love": "sadness"
-                    }
-                    opposite = opposites.get(emotion)
-                    if opposite:
-                        scores[opposite] += base_score * 0.8
+                # Add to opposite emotion
+                opposites = {
+                    "joy": "sadness",
+                    "sadness": "joy",
+                    "anger": "fear",
+                    "fear": "anger",
+                    "surprise": "fear",
+                    "love": "sadness"
+                }
+                opposite = opposites.get(emotion)
+                if opposite:
+                    scores[opposite] += base_score * 0.8
     
     # Apply sarcasm transformation if detected
     if sarcasm_detected:
@@ -271,14 +318,15 @@ def analyze_text_with_context(text: str) -> Dict:
     # Handle "but" clauses (second part is more important)
     if " but " in text_lower:
         parts = text_lower.split(" but ")
-        if len(parts) == 2:
-            # Analyze second part separately
-            second_tokens = preprocess_text(parts[1])
+        # First "but" that is not the opening word, like split(" but ")[1]
+        but_index = next((i for i, token in enumerate(doc.tokens) if token == "but" and i > 0), None)
+        if len(parts) == 2 and but_index is not None:
+            # Analyze second part separately (tokens after "but")
+            second_tokens = doc.content_tokens(but_index + 1)
             for token in second_tokens:
-                for emotion, keywords in EMOTION_KEYWORDS.items():
-                    if token in keywords:
-                        scores[emotion] *= 1.5  # Boost emotions in second half
-                        break
+                emotion = EMOTION_LOOKUP.get(token)
+                if emotion is not None:
+                    scores[emotion] *= 1.5  # Boost emotions in second half
     
     # =============================================================
     # PHASE 3: POST-PROCESSING AND NORMALIZATION
@@ -408,9 +456,9 @@ def create_sentiment(sentiment_type: str) -> Dict[str, float]:
     else:  # mixed
         return {"positive": 40.0, "negative": 40.0, "neutral": 20.0}
 
-def analyze_text(text: str) -> Dict:
+def analyze_text(text: str, doc: Document = None) -> Dict:
     """Wrapper for backward compatibility"""
-    return analyze_text_with_context(text)
+    return analyze_text_with_context(text, doc)
 
 
 # Test function
@@ -1,15 +1,79 @@
 import os
 os.environ["DEEPFACE_BACKEND"] = "torch"  # 🔥 Force Torch backend (skip TensorFlow)
 
+import asyncio
 import base64
+import json
 import random
+import time
+import uuid
 import numpy as np
-import cv2
-from deepface import DeepFace
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+from typing import Any, List, Optional, Tuple, Union
+
+from face_pipeline import DETECTOR_BACKEND, EMOTION_LABELS, WARMUP_RUNS, FaceModels, Prediction, decode_bounded
+from face_tracking import EmotionSmoother, FaceTracker
+from face_cache import FrameHashCache
+from face_detectors import KNOWN_DETECTORS
+from face_executor import MicroBatcher
+from inference_executor import InferenceExecutor, Overloaded
+from face_workers import FaceWorkerPool
+from face_trends import TrendStore
+from face_profiling import StageProfiler, add_stage, server_timing_header, stage_timer
+
+# How long a request may wait for the models to finish warming up before 503
+READY_WAIT_SECONDS = float(os.getenv("FACE_READY_WAIT_SECONDS", "10"))
+
+# Model worker processes (0: run the models in this process), thread budget and
+# shared-memory frame slot size of each worker
+WORKER_PROCESSES = int(os.getenv("FACE_WORKERS", "0"))
+WORKER_THREADS = int(os.getenv("FACE_WORKER_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, WORKER_PROCESSES)))))
+WORKER_SLOT_BYTES = int(os.getenv("FACE_WORKER_SLOT_BYTES", str(1024 * 1024)))
+
+# Inference concurrency and admission queue (beyond it requests get 429/503)
+INFERENCE_CONCURRENCY = int(os.getenv("FACE_INFERENCE_CONCURRENCY", str(max(2, 2 * WORKER_PROCESSES))))
+INFERENCE_QUEUE_SIZE = int(os.getenv("FACE_INFERENCE_QUEUE_SIZE", "16"))
+INFERENCE_MAX_WAIT_SECONDS = float(os.getenv("FACE_INFERENCE_MAX_WAIT", "5"))
+
+# Micro-batching: gather concurrent frames for a few ms (FACE_BATCH_MAX_SIZE=1 disables)
+BATCH_MAX_SIZE = int(os.getenv("FACE_BATCH_MAX_SIZE", "8"))
+BATCH_WINDOW_MS = float(os.getenv("FACE_BATCH_WINDOW_MS", "5"))
+# Requests gathered or in flight before 429 (0: a full batch per inference thread plus the queue size)
+BATCH_MAX_WAITING = int(os.getenv("FACE_BATCH_MAX_WAITING", "0"))
+
+# Binary uploads (/analyze_face/upload)
+MAX_UPLOAD_BYTES = int(os.getenv("FACE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+RAW_IMAGE_TYPES = ("image/jpeg", "image/jpg", "image/png", "image/webp")
+
+# Per-session face tracking: ROI search between full re-detects
+TRACK_REDETECT_EVERY = int(os.getenv("FACE_TRACK_REDETECT_EVERY", "30"))
+TRACK_ROI_PADDING = float(os.getenv("FACE_TRACK_ROI_PADDING", "0.4"))
+
+# Perceptual-hash cache of recent results (FACE_CACHE_THRESHOLD < 0 disables)
+CACHE_THRESHOLD = int(os.getenv("FACE_CACHE_THRESHOLD", "5"))  # max differing bits of 64
+CACHE_TTL_SECONDS = float(os.getenv("FACE_CACHE_TTL", "10"))
+CACHE_SCOPE = os.getenv("FACE_CACHE_SCOPE", "session")  # "session" or "global"
+CACHE_HASH = os.getenv("FACE_CACHE_HASH", "dhash")  # "dhash" or "ahash"
+
+# Per-user emotion trend store (FACE_TREND_DIR="" keeps it in memory only)
+TREND_DIR = os.getenv("FACE_TREND_DIR", "face_trends")
+TREND_MAX_USERS = int(os.getenv("FACE_TREND_MAX_USERS", "2000"))
+TREND_SNAPSHOT_INTERVAL = float(os.getenv("FACE_TREND_SNAPSHOT_INTERVAL", "60"))
+TREND_UTC_OFFSET_MINUTES = int(os.getenv("FACE_TREND_UTC_OFFSET_MINUTES", "0"))  # day/hour boundaries
+
+# Send per-stage timings as a Server-Timing header on every response
+# (otherwise only when the request has X-Debug-Timing: 1)
+TIMING_HEADER = os.getenv("FACE_TIMING_HEADER", "0") == "1"
+
+# WebSocket streaming: EMA weight of the newest frame, update pacing
+STREAM_SMOOTHING = float(os.getenv("FACE_STREAM_SMOOTHING", "0.3"))
+STREAM_MIN_INTERVAL = float(os.getenv("FACE_STREAM_MIN_INTERVAL", "0.2"))
+STREAM_HEARTBEAT = float(os.getenv("FACE_STREAM_HEARTBEAT", "1.0"))
 
 # ----------------------
 # FastAPI Setup
@@ -24,11 +88,82 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ----------------------
+# Model Preloading
+# ----------------------
+frame_cache = FrameHashCache(
+    threshold=CACHE_THRESHOLD,
+    ttl=CACHE_TTL_SECONDS,
+    scope=CACHE_SCOPE,
+    algorithm=CACHE_HASH
+) if CACHE_THRESHOLD >= 0 else None
+face_tracker = FaceTracker(redetect_every=TRACK_REDETECT_EVERY, roi_padding=TRACK_ROI_PADDING)
+face_workers = FaceWorkerPool(
+    WORKER_PROCESSES,
+    threads_per_worker=WORKER_THREADS,
+    slots_per_worker=2 * max(1, BATCH_MAX_SIZE),
+    slot_bytes=WORKER_SLOT_BYTES,
+    detector_backend=DETECTOR_BACKEND,
+    warmup_runs=WARMUP_RUNS,
+    redetect_every=TRACK_REDETECT_EVERY,
+    roi_padding=TRACK_ROI_PADDING,
+    max_wait=INFERENCE_MAX_WAIT_SECONDS
+) if WORKER_PROCESSES > 0 else None
+# Readiness and /health report on whichever hosts the models
+face_models = face_workers or FaceModels(tracker=face_tracker)
+stage_profiler = StageProfiler()
+trend_store = TrendStore(
+    EMOTION_LABELS,
+    directory=TREND_DIR or None,
+    max_users=TREND_MAX_USERS,
+    utc_offset_minutes=TREND_UTC_OFFSET_MINUTES
+)
+inference_executor = InferenceExecutor(
+    concurrency=INFERENCE_CONCURRENCY,
+    max_queue=INFERENCE_QUEUE_SIZE,
+    max_wait=INFERENCE_MAX_WAIT_SECONDS
+)
+
+@app.on_event("startup")
+def preload_models():
+    # Build and warm the models in the background; /health reports progress
+    face_models.start_background_load()
+    trend_store.start_snapshots(TREND_SNAPSHOT_INTERVAL)
+
+@app.on_event("shutdown")
+async def shutdown_batcher():
+    # Answer (or fail) every gathered frame before the executor goes away
+    if face_batcher is not None:
+        await face_batcher.shutdown()
+
+@app.on_event("shutdown")
+def stop_executor():
+    inference_executor.shutdown()
+    trend_store.stop_snapshots()
+    if face_workers is not None:
+        face_workers.shutdown()
+
+async def wait_until_ready():
+    """Queue a request briefly while the models warm up, then refuse it"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + READY_WAIT_SECONDS
+    while not face_models.is_ready:
+        if face_models.state == "failed" or loop.time() >= deadline:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Face models are not ready (state: {face_models.state})",
+                headers={"Retry-After": "5"}
+            )
+        await asyncio.sleep(0.05)
+
 # ----------------------
 # Pydantic Model
 # ----------------------
 class ImageData(BaseModel):
     image: str  # Base64 string
+    session_id: Optional[str] = None  # enables face tracking across frames
+    user_id: Optional[str] = None  # records the result in the user's emotion trend
+    detector: Optional[str] = None  # face detector override (remembered for the session)
 
 # ----------------------
 # Emotion Responses
@@ -107,47 +242,404 @@ EMOTION_RESPONSES = {
 def get_random_response(responses):
     return random.choice(responses) if responses else ""
 
+def decode_base64(image: Union[str, bytes], timings: Optional[dict] = None) -> bytes:
+    """Raw bytes of a data-URL / base64 string (raw bytes pass through)"""
+    if not isinstance(image, str):
+        return image
+    with stage_timer(timings, "b64decode"):
+        return base64.b64decode(image.split(",")[1])
+
+def decode_image(image: Union[str, bytes, bytearray, memoryview], timings: Optional[dict] = None) -> np.ndarray:
+    """Decode a data-URL / base64 string or raw encoded bytes into a BGR array"""
+    image = decode_base64(image, timings)
+    # np.frombuffer views the bytes in place, so raw uploads decode without a copy;
+    # large frames are decoded at reduced resolution
+    with stage_timer(timings, "imdecode"):
+        img = decode_bounded(image)
+
+    if img is None:
+        raise ValueError("Invalid image data provided")
+    return img
+
+# A frame, the client session it belongs to (None: no tracking), the
+# request's stage timings (None: not profiled) and its detector override
+# (None: the calibrated or configured backend)
+FrameJob = Tuple[Union[str, bytes], Optional[str], Optional[dict], Optional[str]]
+
+# Stages measured inside run_inference; the rest of its wall time is "queue"
+INFERENCE_STAGES = ("b64decode", "imdecode", "detect", "classify", "analyze")
+
+def run_face_analysis(job: FrameJob) -> Prediction:
+    """Blocking part of a request: decode + inference (runs on the executor)"""
+    if face_workers is not None:
+        return face_workers.analyze_job(job)
+    image, session_id, timings, detector = job
+    if session_id:
+        return face_models.analyze_batch([decode_image(image, timings)], [face_tracker.get(session_id)], [timings],
+                                         [detector])[0]
+    return face_models.analyze(decode_image(image, timings), timings, detector)
+
+def run_face_batch(jobs: List[FrameJob]) -> List[Any]:
+    """Decode a batch, detect faces per image and classify all crops at once.
+
+    Returns one (emotion, confidence) per image, or the exception for images that failed to decode.
+    """
+    if face_workers is not None:
+        return face_workers.run_batch(jobs)
+    results: List[Any] = [None] * len(jobs)
+    frames, tracks, timings, detectors, positions = [], [], [], [], []
+    for i, (image, session_id, job_timings, detector) in enumerate(jobs):
+        try:
+            frames.append(decode_image(image, job_timings))
+            tracks.append(face_tracker.get(session_id) if session_id else None)
+            timings.append(job_timings)
+            detectors.append(detector)
+            positions.append(i)
+        except Exception as e:
+            results[i] = e
+    for i, emotion in zip(positions, face_models.analyze_batch(frames, tracks, timings, detectors)):
+        results[i] = emotion
+    return results
+
+# Gathers concurrent requests into one detection + classification job
+face_batcher = MicroBatcher(
+    inference_executor,
+    run_face_batch,
+    max_batch=BATCH_MAX_SIZE,
+    window_ms=BATCH_WINDOW_MS,
+    max_waiting=BATCH_MAX_WAITING or None
+) if BATCH_MAX_SIZE > 1 else None
+
 # ----------------------
 # Emotion Analysis Endpoint
 # ----------------------
-@app.post("/analyze_face")
-async def analyze_face(data: ImageData):
-    try:
-        # Decode base64 image
-        image_data = base64.b64decode(data.image.split(",")[1])
-        np_arr = np.frombuffer(image_data, np.uint8)
-        img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-
-        if img is None:
-            raise ValueError("Invalid image data provided")
-
-        # 🔥 Use DeepFace with Torch backend
-        result = DeepFace.analyze(
-            img,
-            actions=['emotion'],
-            enforce_detection=False,
-            detector_backend="opencv"
-        )
+async def run_inference(job: FrameJob) -> Prediction:
+    # 🔥 Decode and run the preloaded DeepFace models off the event loop
+    timings = job[2]
+    measured = sum(timings.get(stage, 0.0) for stage in INFERENCE_STAGES) if timings is not None else 0.0
+    started = time.perf_counter()
+    if face_batcher is not None:
+        prediction = await face_batcher.submit(job)
+    else:
+        prediction = await inference_executor.submit(run_face_analysis, job)
+    if timings is not None:
+        measured = sum(timings.get(stage, 0.0) for stage in INFERENCE_STAGES) - measured
+        add_stage(timings, "queue", max(0.0, time.perf_counter() - started - measured))
+    return prediction
 
-        emotion = result[0]['dominant_emotion'].lower()
+async def infer_emotion(job: FrameJob) -> Prediction:
+    """Reuse the result of a near-identical recent frame, else run inference"""
+    image, session_id, timings, detector = job
+    key = frame_cache.scope_key(session_id) if frame_cache is not None else None
+    if key is None:
+        return await run_inference(job)
 
-        # Get responses (fallback to neutral if not found)
-        responses = EMOTION_RESPONSES.get(emotion, EMOTION_RESPONSES["neutral"])
+    def hash_job():
+        raw = decode_base64(image, timings)
+        with stage_timer(timings, "cache"):
+            return frame_cache.hash_frame(raw), raw
+
+    if detector:
+        key = f"{key}|{detector}"  # results of another detector are not interchangeable
+    value, raw = await asyncio.to_thread(hash_job)
+    if value is not None:
+        with stage_timer(timings, "cache"):
+            cached = frame_cache.lookup(key, value)
+        if cached is not None:
+            return cached
+
+    started = time.perf_counter()
+    prediction = await run_inference((raw, session_id, timings, detector))
+    if value is not None:
+        frame_cache.store(key, value, prediction, time.perf_counter() - started)
+    return prediction
+
+def emotion_guidance(emotion: str) -> dict:
+    # Get responses (fallback to neutral if not found)
+    responses = EMOTION_RESPONSES.get(emotion, EMOTION_RESPONSES["neutral"])
+    return {
+        "recommendation": get_random_response(responses["recommendations"]),
+        "challenge": get_random_response(responses["challenges"]),
+        "tip": get_random_response(responses["tips"]),
+    }
 
-        return {
-            "emotion": emotion,
-            "recommendation": get_random_response(responses["recommendations"]),
-            "challenge": get_random_response(responses["challenges"]),
-            "tip": get_random_response(responses["tips"]),
-            "trend": {
-                "labels": ["Mon", "Tue", "Wed", "Thu", "Fri"],
-                "values": [random.randint(1, 5) for _ in range(5)]
+def resolve_detector(session_id: Optional[str], detector: Optional[str]) -> Optional[str]:
+    """Detector override for a frame: the requested one (remembered for the session), else the session's"""
+    if detector:
+        detector = detector.strip().lower()
+        if detector not in KNOWN_DETECTORS:
+            raise ValueError(f"Unknown detector '{detector}'; use one of: {', '.join(KNOWN_DETECTORS)}")
+        if session_id:
+            face_tracker.get(session_id).detector = detector
+        return detector
+    return face_tracker.get(session_id).detector if session_id else None
+
+async def analyze_image(image: Union[str, bytes], session_id: Optional[str] = None, user_id: Optional[str] = None,
+                        response: Optional[Response] = None, debug_timing: bool = False,
+                        detector: Optional[str] = None):
+    """Shared by the base64 and binary endpoints: inference, recommendations and the user's trend"""
+    try:
+        detector = resolve_detector(session_id, detector)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await wait_until_ready()
+    timings = {}
+    started = time.perf_counter()
+    try:
+        emotion, confidence = await infer_emotion((image, session_id, timings, detector))
+        await load_trend(user_id)
+
+        with stage_timer(timings, "respond"):
+            if user_id:
+                trend_store.record(user_id, emotion, confidence)
+            result = {
+                "emotion": emotion,
+                "confidence": round(confidence * 100, 1),
+                **emotion_guidance(emotion),
+                "trend": trend_store.trend(user_id)
             }
-        }
 
+        timings["total"] = time.perf_counter() - started
+        stage_profiler.observe(timings)
+        if response is not None and (TIMING_HEADER or debug_timing):
+            response.headers["Server-Timing"] = server_timing_header(timings)
+        return result
+
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to analyze face: {str(e)}")
 
+def wants_timing(request: Request) -> bool:
+    return request.headers.get("x-debug-timing", "").lower() in ("1", "true")
+
+@app.post("/analyze_face")
+async def analyze_face(data: ImageData, request: Request, response: Response):
+    # Base64 data URL in JSON (kept for existing clients)
+    return await analyze_image(
+        data.image,
+        data.session_id or request.headers.get("x-session-id"),
+        data.user_id or request.headers.get("x-user-id"),
+        response,
+        wants_timing(request),
+        data.detector
+    )
+
+@app.post("/analyze_face/upload")
+async def analyze_face_upload(request: Request, response: Response, session_id: Optional[str] = None,
+                              user_id: Optional[str] = None, detector: Optional[str] = None):
+    """Raw image/jpeg or image/png body, or a multipart upload (field "image").
+
+    Pass `session_id` (query) or X-Session-Id to track the face across frames,
+    and `user_id` (query) or X-User-Id to record the result in the user's trend.
+    `detector` (query) overrides the face detector backend, for the rest of
+    the session when there is one.
+    X-Debug-Timing: 1 returns per-stage timings in a Server-Timing header.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image larger than {MAX_UPLOAD_BYTES} bytes")
+
+    if content_type in RAW_IMAGE_TYPES:
+        image = await request.body()
+    elif content_type == "multipart/form-data":
+        form = await request.form()
+        upload = form.get("image") or next((v for v in form.values() if hasattr(v, "read")), None)
+        if upload is None or not hasattr(upload, "read"):
+            raise HTTPException(status_code=400, detail="Multipart upload must include an image file")
+        image = await upload.read()
+        await form.close()
+    else:
+        raise HTTPException(
+            status_code=415,
+            detail="Send image/jpeg, image/png or multipart/form-data (use /analyze_face for base64 JSON)"
+        )
+
+    if not image:
+        raise HTTPException(status_code=400, detail="Empty image body")
+    if len(image) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image larger than {MAX_UPLOAD_BYTES} bytes")
+    return await analyze_image(
+        image,
+        session_id or request.headers.get("x-session-id"),
+        user_id or request.headers.get("x-user-id"),
+        response,
+        wants_timing(request),
+        detector
+    )
+
+# ----------------------
+# WebSocket Streaming
+# ----------------------
+@app.websocket("/ws/analyze_face")
+async def analyze_face_stream(websocket: WebSocket):
+    """Continuous analysis over one connection.
+
+    The client sends frames as binary messages (JPEG/PNG bytes) or text
+    {"image": "<data URL>"}. Only the newest frame is analyzed; frames that
+    arrive while inference is busy replace the pending one and are dropped.
+    The server pushes {"type": "emotion", ...} with the smoothed emotion as
+    soon as it changes (at most every FACE_STREAM_MIN_INTERVAL) and a
+    heartbeat update every FACE_STREAM_HEARTBEAT seconds while it is stable.
+    With a `user_id` query parameter, every update sent is recorded in the
+    user's emotion trend; `detector` overrides the face detector backend.
+    """
+    await websocket.accept()
+    session_id = websocket.query_params.get("session_id") or f"ws-{uuid.uuid4().hex}"
+    user_id = websocket.query_params.get("user_id")
+    try:
+        detector = resolve_detector(session_id, websocket.query_params.get("detector"))
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1008)
+        return
+    loop = asyncio.get_running_loop()
+    latest = {"frame": None, "seq": 0}
+    frame_ready = asyncio.Event()
+    stats = {"received": 0, "dropped": 0, "processed": 0}
+
+    async def receive_frames():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            frame = message.get("bytes")
+            if frame is None and message.get("text"):
+                try:
+                    frame = json.loads(message["text"]).get("image")
+                except (ValueError, AttributeError):
+                    frame = None
+            if not frame:
+                continue
+            stats["received"] += 1
+            if latest["frame"] is not None:
+                stats["dropped"] += 1  # superseded before inference got to it
+            latest["frame"], latest["seq"] = frame, stats["received"]
+            frame_ready.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    smoother = EmotionSmoother(EMOTION_LABELS, alpha=STREAM_SMOOTHING)
+    last_sent_at = 0.0
+    last_sent_emotion = None
+    try:
+        try:
+            await wait_until_ready()
+        except HTTPException as e:
+            await websocket.send_json({"type": "error", "detail": e.detail})
+            await websocket.close(code=1013)  # try again later
+            return
+
+        while True:
+            waiter = asyncio.ensure_future(frame_ready.wait())
+            await asyncio.wait({waiter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if not waiter.done():
+                waiter.cancel()
+                break  # client disconnected
+            frame_ready.clear()
+            frame, seq = latest["frame"], latest["seq"]
+            latest["frame"] = None
+
+            started = loop.time()
+            try:
+                timings = {}
+                emotion, _ = await infer_emotion((frame, session_id, timings, detector))
+            except Overloaded as e:
+                await websocket.send_json({"type": "throttled", "detail": e.detail, "retry_after": e.retry_after})
+                await asyncio.sleep(min(e.retry_after, STREAM_HEARTBEAT))
+                continue
+            except Exception as e:
+                await websocket.send_json({"type": "error", "frame": seq, "detail": f"Failed to analyze face: {str(e)}"})
+                continue
+            stats["processed"] += 1
+            timings["total"] = loop.time() - started
+            stage_profiler.observe(timings)
+
+            smoothed, confidence = smoother.update(emotion)
+            now = loop.time()
+            changed = smoothed != last_sent_emotion
+            if (changed and now - last_sent_at >= STREAM_MIN_INTERVAL) or now - last_sent_at >= STREAM_HEARTBEAT:
+                update = {
+                    "type": "emotion",
+                    "emotion": smoothed,
+                    "confidence": round(confidence, 3),
+                    "raw_emotion": emotion,
+                    "distribution": smoother.distribution(),
+                    "frame": seq,
+                    "latency_ms": round((now - started) * 1000, 1),
+                    **stats,
+                }
+                if changed:
+                    update.update(emotion_guidance(smoothed))
+                await websocket.send_json(update)
+                if user_id:
+                    await load_trend(user_id)
+                    trend_store.record(user_id, smoothed, confidence)
+                last_sent_at, last_sent_emotion = now, smoothed
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # connection closed mid-send
+    finally:
+        receiver.cancel()
+        face_tracker.drop(session_id)
+        if face_workers is not None:
+            face_workers.drop_session(session_id)
+        if frame_cache is not None:
+            frame_cache.drop_session(session_id)
+
+# ----------------------
+# Emotion Trends
+# ----------------------
+async def load_trend(user_id: Optional[str]):
+    """Read a user's trend snapshot on a worker thread, not the event loop, when it is not in memory"""
+    if user_id and user_id not in trend_store:
+        await run_in_threadpool(trend_store.load, user_id)
+
+@app.get("/trend/{user_id}")
+async def get_trend(user_id: str, period: str = "daily", points: int = 7, recent: int = 0):
+    """Hourly or daily mood trend from the in-service store, plus optionally the newest raw frames"""
+    if period not in ("hourly", "daily"):
+        raise HTTPException(status_code=400, detail="period must be 'hourly' or 'daily'")
+    await load_trend(user_id)
+    result = {"user_id": user_id, "trend": trend_store.trend(user_id, period, max(1, points))}
+    if recent > 0:
+        result["recent"] = trend_store.recent(user_id, min(recent, trend_store.raw_capacity))
+    return result
+
+# ----------------------
+# Health Checks
+# ----------------------
+@app.get("/health")
+async def health_check():
+    # Liveness: the process is up, with model loading progress
+    return {
+        "status": "ok",
+        "service": "face_analysis_api",
+        "models": face_models.status(),
+        "executor": inference_executor.metrics(),
+        "batching": face_batcher.metrics() if face_batcher else None,
+        "frame_cache": frame_cache.metrics() if frame_cache else None,
+        "trends": trend_store.metrics()
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    # Queue depth, wait and service times of the inference executor, batch sizes, cache hits,
+    # and per-stage latency histograms
+    return {
+        "stages": stage_profiler.metrics(buckets=True),
+        "executor": inference_executor.metrics(),
+        "batching": face_batcher.metrics() if face_batcher else None,
+        "frame_cache": frame_cache.metrics() if frame_cache else None
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    # Readiness: only accept traffic once the models are warm
+    status = face_models.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "not_ready", "models": status})
+    return {"status": "ready", "models": status}
+
 # ----------------------
 # Run server
 # ----------------------
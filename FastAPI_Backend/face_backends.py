@@ -0,0 +1,374 @@
+# backend/face_backends.py
+"""
+Pluggable emotion classifiers for the face analysis service.
+
+Every backend takes a float32 batch of 48x48 grayscale face crops
+(N x 48 x 48 x 1, values in [0, 1]) and returns N x 7 probabilities in
+EMOTION_LABELS order:
+
+    deepface   DeepFace's own emotion model (default, the reference)
+    onnx       the same model exported to ONNX (optionally int8-quantized),
+               run by ONNX Runtime with a fixed intra-op thread count
+    random     a tiny, seeded, randomly initialised NumPy network for
+               offline runs of the service, workers and benchmarks
+
+Select with FACE_EMOTION_BACKEND. Offline tooling:
+
+    python face_backends.py export-onnx --output emotion.onnx          # needs tf2onnx (or torch)
+    python face_backends.py quantize emotion.onnx --output emotion.int8.onnx
+    python face_backends.py tiny-onnx --output tiny.onnx                # ONNX twin of "random"
+    python face_backends.py benchmark --backends deepface,onnx --onnx-model emotion.int8.onnx
+
+The benchmark reports per-backend latency and agreement (same dominant
+emotion, mean absolute probability difference) against a reference backend.
+onnx and onnxruntime are optional dependencies, imported only when used.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from inference_executor import METRIC_WINDOW, percentiles_ms
+
+EMOTION_BACKEND = os.getenv("FACE_EMOTION_BACKEND", "deepface")
+ONNX_MODEL_PATH = os.getenv("FACE_ONNX_MODEL", "emotion.onnx")
+ONNX_THREADS = int(os.getenv("FACE_ONNX_THREADS", "0"))  # 0: one per core (or FACE_WORKER_THREADS)
+RANDOM_MODEL_SEED = int(os.getenv("FACE_RANDOM_MODEL_SEED", "0"))
+
+NUM_EMOTIONS = 7
+INPUT_SHAPE = (48, 48, 1)
+
+
+def build_deepface_model(model_name: str, task: str):
+    """DeepFace.build_model across versions (the `task` argument arrived in 0.0.90)"""
+    from deepface import DeepFace
+    try:
+        return DeepFace.build_model(model_name=model_name, task=task)
+    except TypeError:
+        return DeepFace.build_model(model_name)
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+class EmotionBackend:
+    """Base class: load() once, then predict(batch) -> N x 7 probabilities"""
+
+    name = "base"
+
+    def __init__(self):
+        self.latencies = deque(maxlen=METRIC_WINDOW)
+        self.frames = 0
+
+    def load(self) -> None:
+        raise NotImplementedError
+
+    def _predict(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        started = time.perf_counter()
+        probabilities = np.asarray(self._predict(np.asarray(batch, dtype=np.float32)))
+        self.latencies.append(time.perf_counter() - started)
+        self.frames += len(batch)
+        return probabilities
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "frames": self.frames,
+            "batch_ms": percentiles_ms(self.latencies),
+            "mean_frame_ms": round(sum(self.latencies) * 1000 / self.frames, 3) if self.frames else 0.0,
+        }
+
+
+class DeepFaceBackend(EmotionBackend):
+    """DeepFace's emotion CNN, through whatever framework DeepFace was built with"""
+
+    name = "deepface"
+
+    def __init__(self):
+        super().__init__()
+        self.model = None
+
+    def load(self) -> None:
+        client = build_deepface_model("Emotion", "facial_attribute")
+        # Newer DeepFace wraps the Keras model in a client object
+        self.model = getattr(client, "model", client)
+
+    def _predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.model.predict(batch, verbose=0)
+
+
+class OnnxBackend(EmotionBackend):
+    """ONNX Runtime session over an exported (optionally int8-quantized) emotion model"""
+
+    name = "onnx"
+
+    def __init__(self, model_path: str = ONNX_MODEL_PATH, intra_op_threads: int = ONNX_THREADS):
+        super().__init__()
+        self.model_path = model_path
+        self.intra_op_threads = intra_op_threads or int(os.getenv("FACE_WORKER_THREADS", "0")) or (os.cpu_count() or 1)
+        self.session = None
+        self.input_name = None
+        self.nchw = False
+
+    def load(self) -> None:
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("The onnx emotion backend needs onnxruntime (pip install onnxruntime)")
+
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"ONNX emotion model not found: {self.model_path} "
+                                    f"(create it with `python face_backends.py export-onnx`)")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # torch exports are NCHW (N x 1 x 48 x 48), Keras exports NHWC
+        self.nchw = len(model_input.shape) == 4 and model_input.shape[1] == 1
+
+    def _predict(self, batch: np.ndarray) -> np.ndarray:
+        if self.nchw:
+            batch = np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
+        output = self.session.run(None, {self.input_name: batch})[0]
+        # Exports that stop at the logits layer get the softmax applied here
+        return output if np.allclose(output.sum(axis=1), 1.0, atol=1e-3) else softmax(output)
+
+    def info(self) -> Dict[str, Any]:
+        return {**super().info(), "model_path": self.model_path, "intra_op_threads": self.intra_op_threads}
+
+
+class TinyRandomBackend(EmotionBackend):
+    """4x4 average pool -> dense(32) + ReLU -> dense(7) -> softmax, with seeded random weights.
+
+    Cheap and deterministic; its predictions mean nothing, it only exercises
+    the backend contract without downloading any weights.
+    """
+
+    name = "random"
+    POOL = 4
+    HIDDEN = 32
+
+    def __init__(self, seed: int = RANDOM_MODEL_SEED):
+        super().__init__()
+        self.seed = seed
+        self.weights: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def make_weights(cls, seed: int) -> Dict[str, np.ndarray]:
+        rng = np.random.default_rng(seed)
+        features = (INPUT_SHAPE[0] // cls.POOL) * (INPUT_SHAPE[1] // cls.POOL)
+        return {
+            "w1": (rng.standard_normal((features, cls.HIDDEN)) / np.sqrt(features)).astype(np.float32),
+            "b1": (rng.standard_normal(cls.HIDDEN) * 0.1).astype(np.float32),
+            "w2": (rng.standard_normal((cls.HIDDEN, NUM_EMOTIONS)) / np.sqrt(cls.HIDDEN)).astype(np.float32),
+            "b2": (rng.standard_normal(NUM_EMOTIONS) * 0.1).astype(np.float32),
+        }
+
+    def load(self) -> None:
+        self.weights = self.make_weights(self.seed)
+
+    def _predict(self, batch: np.ndarray) -> np.ndarray:
+        n, size = len(batch), INPUT_SHAPE[0] // self.POOL
+        pooled = batch.reshape(n, size, self.POOL, size, self.POOL).mean(axis=(2, 4)).reshape(n, -1)
+        hidden = np.maximum(pooled @ self.weights["w1"] + self.weights["b1"], 0)
+        return softmax(hidden @ self.weights["w2"] + self.weights["b2"])
+
+    def info(self) -> Dict[str, Any]:
+        return {**super().info(), "seed": self.seed}
+
+
+BACKENDS = {
+    "deepface": DeepFaceBackend,
+    "onnx": OnnxBackend,
+    "random": TinyRandomBackend,
+}
+
+
+def create_backend(name: str = EMOTION_BACKEND, **options) -> EmotionBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown emotion backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name](**options)
+
+
+# -----------------------------
+# Offline tooling
+# -----------------------------
+def export_onnx(output: str, opset: int = 13) -> None:
+    """Export DeepFace's emotion model (Keras via tf2onnx, or torch) with a dynamic batch axis"""
+    model = DeepFaceBackend()
+    model.load()
+    if hasattr(model.model, "state_dict"):
+        import torch
+        dummy = torch.zeros((1, 1) + INPUT_SHAPE[:2])
+        torch.onnx.export(model.model.eval(), dummy, output, opset_version=opset, input_names=["input"],
+                          output_names=["emotion"], dynamic_axes={"input": {0: "batch"}, "emotion": {0: "batch"}})
+    else:
+        import tensorflow as tf
+        import tf2onnx
+        signature = [tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32, name="input")]
+        tf2onnx.convert.from_keras(model.model, input_signature=signature, opset=opset, output_path=output)
+    print(f"✅ Exported emotion model to {output}")
+
+
+def quantize_onnx(source: str, output: str) -> None:
+    """Dynamic int8 quantization of an exported model's weights"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(source, output, weight_type=QuantType.QInt8)
+    print(f"✅ Wrote int8 model to {output} ({os.path.getsize(source) // 1024} KB -> {os.path.getsize(output) // 1024} KB)")
+
+
+def tiny_onnx_model(output: str, seed: int = RANDOM_MODEL_SEED) -> None:
+    """Write TinyRandomBackend's network as ONNX, so the onnx backend can run offline"""
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    weights = TinyRandomBackend.make_weights(seed)
+    pool = TinyRandomBackend.POOL
+    nodes = [
+        helper.make_node("Transpose", ["input"], ["nchw"], perm=[0, 3, 1, 2]),
+        helper.make_node("AveragePool", ["nchw"], ["pooled"], kernel_shape=[pool, pool], strides=[pool, pool]),
+        helper.make_node("Flatten", ["pooled"], ["flat"], axis=1),
+        helper.make_node("Gemm", ["flat", "w1", "b1"], ["dense1"]),
+        helper.make_node("Relu", ["dense1"], ["hidden"]),
+        helper.make_node("Gemm", ["hidden", "w2", "b2"], ["logits"]),
+        helper.make_node("Softmax", ["logits"], ["emotion"], axis=1),
+    ]
+    graph = helper.make_graph(
+        nodes, "tiny_emotion",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["batch", *INPUT_SHAPE])],
+        [helper.make_tensor_value_info("emotion", TensorProto.FLOAT, ["batch", NUM_EMOTIONS])],
+        initializer=[numpy_helper.from_array(value, name) for name, value in weights.items()],
+    )
+    # IR version 7 is what opset 13 needs; newer onnx releases default to IRs onnxruntime may not read yet
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=7)
+    onnx.checker.check_model(model)
+    onnx.save(model, output)
+    print(f"✅ Wrote tiny ONNX emotion model to {output}")
+
+
+def benchmark_inputs(frames: int, images_dir: Optional[str], seed: int) -> np.ndarray:
+    """N x 48 x 48 x 1 inputs: face crops from a directory, or jittered synthetic faces"""
+    import cv2
+    from face_pipeline import face_to_emotion_input, warmup_image
+
+    crops: List[np.ndarray] = []
+    if images_dir:
+        for name in sorted(os.listdir(images_dir)):
+            img = cv2.imread(os.path.join(images_dir, name))
+            if img is not None:
+                crops.append(face_to_emotion_input(img[:, :, ::-1].astype(np.float32) / 255.0))
+        if not crops:
+            raise SystemExit(f"No readable images in {images_dir}")
+    else:
+        rng = np.random.default_rng(seed)
+        for i in range(min(frames, 64)):
+            img = warmup_image(seed + i).astype(np.float32) / 255.0
+            img = np.clip(img + rng.normal(0, 0.05, img.shape), 0, 1)
+            crops.append(face_to_emotion_input(img[:, :, ::-1]))
+    crops = [crops[i % len(crops)] for i in range(frames)]
+    return np.stack(crops)[..., np.newaxis].astype(np.float32)
+
+
+def run_benchmark(backends: List[EmotionBackend], inputs: np.ndarray, batch_size: int,
+                  reference: str, warmup_batches: int = 2) -> Dict[str, Any]:
+    """Latency of each backend on the same batches, and agreement with `reference`"""
+    batches = [inputs[i:i + batch_size] for i in range(0, len(inputs), batch_size)]
+    outputs: Dict[str, np.ndarray] = {}
+    report: Dict[str, Any] = {"frames": len(inputs), "batch_size": batch_size, "reference": reference, "backends": {}}
+    for backend in backends:
+        started = time.perf_counter()
+        backend.load()
+        load_seconds = time.perf_counter() - started
+        for batch in batches[:warmup_batches]:
+            backend.predict(batch)
+        backend.latencies.clear()
+        backend.frames = 0
+
+        started = time.perf_counter()
+        outputs[backend.name] = np.concatenate([backend.predict(batch) for batch in batches])
+        elapsed = time.perf_counter() - started
+        report["backends"][backend.name] = {
+            **backend.info(),
+            "load_seconds": round(load_seconds, 3),
+            "frames_per_second": round(len(inputs) / elapsed, 1) if elapsed else None,
+        }
+
+    if reference in outputs:
+        expected = outputs[reference]
+        for name, probabilities in outputs.items():
+            report["backends"][name]["agreement"] = {
+                "dominant_match": round(float(np.mean(probabilities.argmax(axis=1) == expected.argmax(axis=1))), 4),
+                "mean_abs_diff": round(float(np.mean(np.abs(probabilities - expected))), 5),
+                "max_abs_diff": round(float(np.max(np.abs(probabilities - expected))), 5),
+            }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Emotion classifier backends: export, quantize, benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export-onnx", help="export DeepFace's emotion model to ONNX")
+    export.add_argument("--output", default=ONNX_MODEL_PATH)
+    export.add_argument("--opset", type=int, default=13)
+
+    quantize = commands.add_parser("quantize", help="int8 dynamic quantization of an ONNX model")
+    quantize.add_argument("model")
+    quantize.add_argument("--output", required=True)
+
+    tiny = commands.add_parser("tiny-onnx", help="write the random test model as ONNX")
+    tiny.add_argument("--output", default="tiny_emotion.onnx")
+    tiny.add_argument("--seed", type=int, default=RANDOM_MODEL_SEED)
+
+    bench = commands.add_parser("benchmark", help="latency and agreement per backend")
+    bench.add_argument("--backends", default="deepface,onnx", help="comma-separated backend names")
+    bench.add_argument("--reference", default="deepface", help="backend the others are compared against")
+    bench.add_argument("--onnx-model", default=ONNX_MODEL_PATH)
+    bench.add_argument("--onnx-threads", type=int, default=ONNX_THREADS)
+    bench.add_argument("--seed", type=int, default=RANDOM_MODEL_SEED)
+    bench.add_argument("--frames", type=int, default=256)
+    bench.add_argument("--batch-size", type=int, default=8)
+    bench.add_argument("--images", default=None, help="directory of face crops (default: synthetic faces)")
+    bench.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.command == "export-onnx":
+        export_onnx(args.output, args.opset)
+    elif args.command == "quantize":
+        quantize_onnx(args.model, args.output)
+    elif args.command == "tiny-onnx":
+        tiny_onnx_model(args.output, args.seed)
+    else:
+        options = {
+            "onnx": {"model_path": args.onnx_model, "intra_op_threads": args.onnx_threads},
+            "random": {"seed": args.seed},
+        }
+        names = [name.strip() for name in args.backends.split(",") if name.strip()]
+        backends = [create_backend(name, **options.get(name, {})) for name in names]
+        report = run_benchmark(backends, benchmark_inputs(args.frames, args.images, args.seed),
+                               args.batch_size, args.reference)
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(text)
+            print(f"📄 Report written to {args.output}")
+        else:
+            print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+# backend/face_benchmark.py
+"""
+Offline benchmark of the face analysis pipeline.
+
+Loads face-analysis-api.py in-process, generates synthetic face-like JPEG
+frames at several resolutions and drives /analyze_face/upload (or the base64
+/analyze_face) through an in-process ASGI transport at several concurrency
+levels. Every request asks for per-stage timings (X-Debug-Timing), so the
+report has throughput plus p50/p95/p99 per stage for each
+resolution x concurrency cell. No network and no real faces are needed; the
+default "random" emotion backend also avoids downloading model weights.
+
+    python face_benchmark.py
+    python face_benchmark.py --resolutions 640x480,1280x720 --concurrency 1,8 --requests 200
+    python face_benchmark.py --emotion-backend deepface --workers 2 --output bench.json
+"""
+import argparse
+import asyncio
+import base64
+import importlib.util
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_app(args):
+    """Import face-analysis-api.py with the benchmark's configuration in the environment"""
+    os.environ.update({
+        "FACE_EMOTION_BACKEND": args.emotion_backend,
+        "FACE_DETECTOR_BACKEND": args.detector,
+        "FACE_WORKERS": str(args.workers),
+        "FACE_CACHE_THRESHOLD": "5" if args.cache else "-1",
+        "FACE_BATCH_MAX_SIZE": str(args.batch_size),
+        "FACE_TREND_DIR": "",
+        "FACE_INFERENCE_QUEUE_SIZE": str(max(16, max(args.concurrency_levels) * 2)),
+    })
+    sys.path.insert(0, HERE)
+    spec = importlib.util.spec_from_file_location("face_analysis_api", os.path.join(HERE, "face-analysis-api.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["face_analysis_api"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_frames(width: int, height: int, count: int, seed: int) -> List[bytes]:
+    """Face-like JPEGs: the warm-up face drawn at a random spot and scale on a noisy background"""
+    import cv2
+    from face_pipeline import synthetic_face_frame
+
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        frame, _ = synthetic_face_frame(width, height, rng, seed + i)
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        frames.append(buf.tobytes())
+    return frames
+
+
+async def run_cell(app, frames: List[bytes], concurrency: int, requests: int, endpoint: str) -> Tuple[Dict, float]:
+    """Send `requests` frames with at most `concurrency` in flight; collect per-stage ms"""
+    import httpx
+    from face_profiling import parse_server_timing
+
+    samples: Dict[str, List[float]] = defaultdict(list)
+    status_codes: Dict[int, int] = defaultdict(int)
+    counter = iter(range(requests))
+
+    async def client(http):
+        for i in counter:
+            frame = frames[i % len(frames)]
+            started = time.perf_counter()
+            if endpoint == "json":
+                data_url = "data:image/jpeg;base64," + base64.b64encode(frame).decode()
+                response = await http.post("/analyze_face", json={"image": data_url},
+                                           headers={"X-Debug-Timing": "1"})
+            else:
+                response = await http.post("/analyze_face/upload", content=frame,
+                                           headers={"Content-Type": "image/jpeg", "X-Debug-Timing": "1"})
+            samples["client"].append((time.perf_counter() - started) * 1000.0)
+            status_codes[response.status_code] += 1
+            for stage, ms in parse_server_timing(response.headers.get("server-timing", "")).items():
+                samples[stage].append(ms)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://face-benchmark", timeout=120) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*[client(http) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+    return {"samples": samples, "status_codes": dict(status_codes)}, elapsed
+
+
+async def run_cells(app, resolutions: List[Tuple[int, int]], args) -> List[Dict[str, Any]]:
+    """Every resolution x concurrency cell on one event loop, like a running server"""
+    results = []
+    for width, height in resolutions:
+        frames = synthetic_frames(width, height, args.frames, args.seed)
+        for concurrency in args.concurrency_levels:
+            result, elapsed = await run_cell(app, frames, concurrency, args.requests, args.endpoint)
+            cell = summarize(result, elapsed, args.requests)
+            cell.update({"resolution": f"{width}x{height}", "concurrency": concurrency,
+                         "mean_frame_kb": round(sum(map(len, frames)) / len(frames) / 1024, 1)})
+            results.append(cell)
+    return results
+
+
+def summarize(result: Dict, elapsed: float, requests: int) -> Dict[str, Any]:
+    ok = result["status_codes"].get(200, 0)
+    stages = {}
+    for stage, values in result["samples"].items():
+        ms = np.asarray(values)
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        stages[stage] = {"mean": round(float(ms.mean()), 3), "p50": round(float(p50), 3),
+                         "p95": round(float(p95), 3), "p99": round(float(p99), 3)}
+    return {
+        "requests": requests,
+        "ok": ok,
+        "status_codes": result["status_codes"],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+        "stages_ms": stages,
+    }
+
+
+def print_table(report: Dict[str, Any]) -> None:
+    from face_profiling import STAGES
+
+    columns = [s for s in STAGES if any(s in cell["stages_ms"] for cell in report["results"])]
+    print(f"{'resolution':>11} {'conc':>4} {'rps':>8}  " + " ".join(f"{c + ' p50/p95':>18}" for c in columns),
+          file=sys.stderr)
+    for cell in report["results"]:
+        parts = []
+        for stage in columns:
+            s = cell["stages_ms"].get(stage)
+            parts.append(f"{s['p50']:>8.2f}/{s['p95']:<9.2f}" if s else f"{'-':>18}")
+        print(f"{cell['resolution']:>11} {cell['concurrency']:>4} {cell['throughput_rps']:>8.1f}  " + " ".join(parts),
+              file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the face pipeline in-process on synthetic frames")
+    parser.add_argument("--resolutions", default="320x240,640x480,1280x720",
+                        help="comma-separated WIDTHxHEIGHT list")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrent client counts")
+    parser.add_argument("--requests", type=int, default=64, help="requests per resolution x concurrency cell")
+    parser.add_argument("--frames", type=int, default=16, help="distinct synthetic frames per resolution")
+    parser.add_argument("--endpoint", choices=["upload", "json"], default="upload",
+                        help="binary upload or base64 JSON endpoint")
+    parser.add_argument("--emotion-backend", default="random", help="deepface, onnx or random")
+    parser.add_argument("--detector", default=os.getenv("FACE_DETECTOR_BACKEND", "opencv"))
+    parser.add_argument("--workers", type=int, default=0, help="model worker processes (0: in-process)")
+    parser.add_argument("--batch-size", type=int, default=8, help="micro-batch size (1 disables batching)")
+    parser.add_argument("--cache", action="store_true", help="keep the perceptual-hash frame cache on")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    resolutions = [tuple(int(v) for v in r.lower().split("x")) for r in args.resolutions.split(",") if r]
+    args.concurrency_levels = [int(c) for c in args.concurrency.split(",") if c]
+
+    face_api = load_app(args)
+    face_api.preload_models()
+    started = time.perf_counter()
+    while not face_api.face_models.is_ready:
+        if face_api.face_models.state == "failed":
+            raise SystemExit(f"Face models failed to load: {face_api.face_models.status().get('error')}")
+        time.sleep(0.1)
+    print(f"Models ready in {time.perf_counter() - started:.1f}s "
+          f"({args.emotion_backend} classifier, {args.detector} detector, {args.workers} workers)", file=sys.stderr)
+
+    try:
+        results = asyncio.run(run_cells(face_api.app, resolutions, args))
+    finally:
+        face_api.stop_executor()
+
+    report = {
+        "config": {
+            "endpoint": args.endpoint,
+            "emotion_backend": args.emotion_backend,
+            "detector": args.detector,
+            "workers": args.workers,
+            "batch_size": args.batch_size,
+            "cache": args.cache,
+            "requests_per_cell": args.requests,
+            "started_at": datetime.now().isoformat(),
+        },
+        "results": results,
+    }
+    print_table(report)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# backend/face_cache.py
+"""
+Perceptual-hash cache for near-identical webcam frames.
+
+Each frame is reduced to a 64-bit dHash (or aHash) computed in NumPy on a
+tiny grayscale version of the image. If a recent frame in the same scope
+(session, or the whole service) is within `threshold` bits Hamming distance,
+its emotion result is reused and the CNN pass is skipped. Session-scoped
+requests that carry no session id are never cached, so unrelated callers
+cannot receive each other's results.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Union
+
+import cv2
+import numpy as np
+
+HASH_ALGORITHMS = ("dhash", "ahash")
+BIT_WEIGHTS = (1 << np.arange(64, dtype=np.uint64)).astype(np.uint64)
+
+
+def frame_gray(image: Union[bytes, np.ndarray]) -> Optional[np.ndarray]:
+    """Small grayscale version of an encoded or decoded frame (JPEGs decode at 1/4 scale)"""
+    if isinstance(image, np.ndarray):
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    arr = np.frombuffer(image, np.uint8)
+    flag = cv2.IMREAD_REDUCED_GRAYSCALE_4 if bytes(arr[:2]) == b"\xff\xd8" else cv2.IMREAD_GRAYSCALE
+    return cv2.imdecode(arr, flag)
+
+
+def perceptual_hash(gray: np.ndarray, algorithm: str = "dhash") -> int:
+    """64-bit perceptual hash of a grayscale image"""
+    if algorithm == "ahash":
+        small = cv2.resize(gray, (8, 8), interpolation=cv2.INTER_AREA).astype(np.float32)
+        bits = (small > small.mean()).ravel()
+    else:
+        small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+        bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.bitwise_or.reduce(BIT_WEIGHTS[bits])) if bits.any() else 0
+
+
+def hamming_distances(hashes: np.ndarray, value: int) -> np.ndarray:
+    """Bit distance from `value` to every uint64 in `hashes`"""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class FrameHashCache:
+    """Bounded per-scope rings of (hash, result, time), matched by Hamming distance"""
+
+    def __init__(self, threshold: int = 5, ttl: float = 10.0, entries_per_scope: int = 32,
+                 max_scopes: int = 1024, scope: str = "session", algorithm: str = "dhash"):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.entries_per_scope = max(1, entries_per_scope)
+        self.max_scopes = max_scopes
+        self.scope = scope
+        self.algorithm = algorithm if algorithm in HASH_ALGORITHMS else "dhash"
+        self._scopes: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+        self.hash_seconds = 0.0
+        self.miss_seconds = 0.0
+        self.misses_timed = 0
+
+    def scope_key(self, session_id: Optional[str]) -> Optional[str]:
+        """Cache key for a request; None (do not cache) for a session-scoped request without a session"""
+        if self.scope == "global":
+            return "global"
+        return f"session:{session_id}" if session_id else None
+
+    def hash_frame(self, raw: bytes) -> Optional[int]:
+        """Hash an encoded frame (None if it does not decode)"""
+        started = time.perf_counter()
+        gray = frame_gray(raw)
+        value = perceptual_hash(gray, self.algorithm) if gray is not None else None
+        with self._lock:
+            self.hash_seconds += time.perf_counter() - started
+        return value
+
+    def lookup(self, key: str, value: int) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            self.lookups += 1
+            ring = self._scopes.get(key)
+            if ring is None or ring["count"] == 0:
+                return None
+            n = ring["count"]
+            distances = hamming_distances(ring["hashes"][:n], value)
+            fresh = now - ring["times"][:n] <= self.ttl
+            candidates = np.nonzero(fresh & (distances <= self.threshold))[0]
+            if len(candidates) == 0:
+                return None
+            best = candidates[np.argmin(distances[candidates])]
+            self.hits += 1
+            self._scopes.move_to_end(key)
+            return ring["results"][best]
+
+    def store(self, key: str, value: int, result: Any, inference_seconds: float) -> None:
+        with self._lock:
+            self.miss_seconds += inference_seconds
+            self.misses_timed += 1
+            ring = self._scopes.get(key)
+            if ring is None:
+                ring = {
+                    "hashes": np.zeros(self.entries_per_scope, dtype=np.uint64),
+                    "times": np.zeros(self.entries_per_scope, dtype=np.float64),
+                    "results": [None] * self.entries_per_scope,
+                    "count": 0,
+                    "next": 0,
+                }
+                self._scopes[key] = ring
+                while len(self._scopes) > self.max_scopes:
+                    self._scopes.popitem(last=False)
+            slot = ring["next"]
+            ring["hashes"][slot] = np.uint64(value)
+            ring["times"][slot] = time.monotonic()
+            ring["results"][slot] = result
+            ring["next"] = (slot + 1) % self.entries_per_scope
+            ring["count"] = min(ring["count"] + 1, self.entries_per_scope)
+            self._scopes.move_to_end(key)
+
+    def drop_session(self, session_id: Optional[str]) -> None:
+        """Forget a finished session's frames (every detector variant of its key)"""
+        key = self.scope_key(session_id)
+        if key is None or self.scope == "global":
+            return
+        with self._lock:
+            for stale in [k for k in self._scopes if k == key or k.startswith(key + "|")]:
+                del self._scopes[stale]
+
+    def metrics(self) -> Dict[str, Any]:
+        mean_inference = self.miss_seconds / self.misses_timed if self.misses_timed else 0.0
+        mean_hash = self.hash_seconds / self.lookups if self.lookups else 0.0
+        return {
+            "scope": self.scope,
+            "algorithm": self.algorithm,
+            "threshold_bits": self.threshold,
+            "ttl_s": self.ttl,
+            "scopes": len(self._scopes),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "mean_hash_ms": round(mean_hash * 1000, 3),
+            "mean_inference_ms": round(mean_inference * 1000, 2),
+            "saved_inference_s": round(self.hits * max(0.0, mean_inference - mean_hash), 3),
+        }
@@ -0,0 +1,118 @@
+# backend/face_detectors.py
+"""
+Face detector backend selection.
+
+With FACE_DETECTOR_BACKEND=auto the service calibrates at startup: every
+candidate backend in FACE_DETECTOR_CANDIDATES is timed on a few frames at the
+configured decode resolution, and its detection rate is measured. The
+fastest backend whose detection rate meets FACE_DETECTOR_MIN_DETECTION_RATE
+wins. Calibration frames are synthetic faces with a known box, or real photos
+from FACE_DETECTOR_CALIBRATION_DIR, which give a far more meaningful rate.
+
+Clients can still force a backend per request or per session.
+"""
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Backends DeepFace.extract_faces accepts (requests may only override to one of these)
+KNOWN_DETECTORS = ("opencv", "ssd", "dlib", "mtcnn", "fastmtcnn", "retinaface", "mediapipe",
+                   "yolov8", "yunet", "centerface", "skip")
+
+# Only backends that ship their weights with an installed package by default;
+# others download weights on first use
+DETECTOR_CANDIDATES = [b.strip() for b in os.getenv("FACE_DETECTOR_CANDIDATES", "opencv,mtcnn").split(",") if b.strip()]
+MIN_DETECTION_RATE = float(os.getenv("FACE_DETECTOR_MIN_DETECTION_RATE", "0.8"))
+CALIBRATION_FRAMES = int(os.getenv("FACE_DETECTOR_CALIBRATION_FRAMES", "8"))
+CALIBRATION_DIR = os.getenv("FACE_DETECTOR_CALIBRATION_DIR", "")
+FALLBACK_DETECTOR = "opencv"
+
+Box = Tuple[int, int, int, int]
+
+
+def frame_size_for(max_pixels: int) -> Tuple[int, int]:
+    """4:3 frame size with about `max_pixels` pixels (what the decoder hands the detector)"""
+    width = int((max_pixels * 4 / 3) ** 0.5)
+    return width, width * 3 // 4
+
+
+def box_iou(a: Box, b: Box) -> float:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    union = aw * ah + bw * bh - w * h
+    return w * h / union if union else 0.0
+
+
+def calibration_frames(width: int, height: int, count: int, directory: str = CALIBRATION_DIR,
+                       seed: int = 0) -> List[Tuple[np.ndarray, Optional[Box]]]:
+    """(BGR frame, expected face box or None) pairs: photos from `directory`, else synthetic faces"""
+    from face_pipeline import synthetic_face_frame
+
+    frames = []
+    if directory and os.path.isdir(directory):
+        for name in sorted(os.listdir(directory))[:count]:
+            img = cv2.imread(os.path.join(directory, name))
+            if img is not None:
+                scale = min(1.0, (width * height / (img.shape[0] * img.shape[1])) ** 0.5)
+                if scale < 1.0:
+                    img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                frames.append((img, None))
+    if not frames:
+        rng = np.random.default_rng(seed)
+        frames = [synthetic_face_frame(width, height, rng, seed + i) for i in range(count)]
+    return frames
+
+
+def calibrate(candidates: List[str], frames: List[Tuple[np.ndarray, Optional[Box]]],
+              extract: Callable[[np.ndarray, str], Dict[str, Any]],
+              found: Callable[[Dict[str, Any], np.ndarray], bool]) -> List[Dict[str, Any]]:
+    """Time every candidate on `frames`; one row per backend with latency and detection rate"""
+    table = []
+    for backend in candidates:
+        row: Dict[str, Any] = {"backend": backend, "available": False}
+        try:
+            started = time.perf_counter()
+            extract(frames[0][0], backend)  # builds the detector; not timed as a frame
+            row["build_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            latencies, detected = [], 0
+            for img, expected in frames:
+                started = time.perf_counter()
+                face = extract(img, backend)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if found(face, img):
+                    area = face["facial_area"]
+                    box = (area["x"], area["y"], area["w"], area["h"])
+                    detected += expected is None or box_iou(box, expected) >= 0.3
+            row.update({
+                "available": True,
+                "frames": len(frames),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+                "mean_ms": round(float(np.mean(latencies)), 2),
+                "detection_rate": round(detected / len(frames), 3),
+            })
+        except Exception as e:
+            row["error"] = str(e)[:200]
+        table.append(row)
+    return table
+
+
+def select(table: List[Dict[str, Any]], min_rate: float = MIN_DETECTION_RATE,
+           fallback: str = FALLBACK_DETECTOR) -> Tuple[str, str]:
+    """(backend, reason): fastest backend meeting the quality floor, else the best detector"""
+    usable = [row for row in table if row["available"]]
+    if not usable:
+        return fallback, "no candidate backend could run; using the fallback"
+    passing = [row for row in usable if row["detection_rate"] >= min_rate]
+    if passing:
+        best = min(passing, key=lambda row: row["p50_ms"])
+        return best["backend"], f"fastest backend with detection rate >= {min_rate}"
+    best = max(usable, key=lambda row: (row["detection_rate"], -row["p50_ms"]))
+    if best["detection_rate"] == 0:
+        fallback = fallback if any(row["backend"] == fallback for row in usable) else best["backend"]
+        return fallback, "no backend detected the calibration faces; using the fallback"
+    return best["backend"], f"no backend reached {min_rate}; using the highest detection rate"
@@ -0,0 +1,142 @@
+# backend/face_executor.py
+"""
+Micro-batching in front of the shared InferenceExecutor (inference_executor.py).
+
+MicroBatcher gathers concurrent requests for up to `window_ms` (or until
+`max_batch` are waiting) and submits them as one job, so the model sees a
+stacked batch instead of N single images.
+
+Admission is counted per request, not per batch: once `max_waiting` requests
+are gathered or in flight, submit() raises Overloaded (429) at once instead
+of letting them queue behind whole batches.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from inference_executor import METRIC_WINDOW, InferenceExecutor, Overloaded
+
+
+class MicroBatcher:
+    """Coalesces concurrent submissions into batches run by an InferenceExecutor.
+
+    `run_batch(items)` executes on the executor and must return one result per
+    item, in order; an Exception instance in that list fails only its item.
+    """
+
+    def __init__(self, executor: InferenceExecutor, run_batch: Callable[[List[Any]], List[Any]],
+                 max_batch: int = 8, window_ms: float = 5.0, max_waiting: Optional[int] = None):
+        self.executor = executor
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.window = max(0.0, window_ms) / 1000.0
+        # Default: full batches on every executor thread plus the executor's queue length in requests
+        self.max_waiting = max_waiting or executor.concurrency * self.max_batch + executor.max_queue
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()  # the loop only holds weak references to tasks
+        self._closing = False
+
+        self.waiting = 0  # requests gathered or in a running batch
+        self.rejected = 0
+        self.batches = 0
+        self.items = 0
+        self.flushed_full = 0
+        self.flushed_window = 0
+        self.batch_sizes = deque(maxlen=METRIC_WINDOW)
+
+    async def submit(self, item: Any) -> Any:
+        if self._closing:
+            raise Overloaded(503, f"{self.executor.label} is shutting down", 1)
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise Overloaded(429, f"{self.executor.label} queue is full, please retry shortly",
+                             self.executor.retry_after())
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        self.waiting += 1
+        if len(self._pending) >= self.max_batch:
+            self.flushed_full += 1
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush_window)
+        try:
+            return await future
+        finally:
+            self.waiting -= 1
+
+    def _flush_window(self) -> None:
+        self._timer = None
+        if self._pending:
+            self.flushed_window += 1
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush_window)
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        self.batch_sizes.append(len(batch))
+        try:
+            results = await self.executor.submit(self.run_batch, [item for item, _ in batch])
+        except asyncio.CancelledError:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(Overloaded(503, f"{self.executor.label} is shutting down", 1))
+            raise
+        except Exception as e:
+            # Overloaded (or a whole-batch failure) applies to every waiting request
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # the client went away
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop accepting work, run what is already gathered and wait up to `timeout` for running batches"""
+        self._closing = True
+        if self._pending:
+            self._flush()
+        if not self._tasks:
+            return
+        _, unfinished = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in unfinished:
+            task.cancel()  # _run fails its callers' futures with Overloaded(503)
+        if unfinished:
+            await asyncio.wait(unfinished)
+
+    def metrics(self) -> Dict[str, Any]:
+        sizes = np.asarray(self.batch_sizes) if self.batch_sizes else np.zeros(1)
+        return {
+            "max_batch": self.max_batch,
+            "max_waiting": self.max_waiting,
+            "window_ms": round(self.window * 1000.0, 2),
+            "batches": self.batches,
+            "items": self.items,
+            "flushed_full": self.flushed_full,
+            "flushed_window": self.flushed_window,
+            "gathering": len(self._pending),
+            "waiting": self.waiting,
+            "running_batches": len(self._tasks),
+            "rejected": self.rejected,
+            "batch_size_mean": round(float(sizes.mean()), 2),
+            "batch_size_p95": float(np.percentile(sizes, 95)),
+        }
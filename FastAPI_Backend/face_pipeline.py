@@ -0,0 +1,326 @@
+# backend/face_pipeline.py
+"""
+Face emotion models for the face analysis service.
+
+FaceModels loads the emotion classifier backend (see face_backends.py) and
+the DeepFace face detector once per process and warms them up with a few dummy inferences, so the first real
+request does not pay for weight loading and graph tracing.
+
+analyze_batch() runs detection per image and then classifies all face crops
+in one forward pass of the emotion model, for the micro-batching scheduler.
+Detection can be narrowed to a tracked region of interest per session, and
+decode_bounded() keeps decoded frames within a pixel budget.
+"""
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from deepface import DeepFace
+
+import face_detectors
+from face_backends import EmotionBackend, build_deepface_model, create_backend
+from face_profiling import add_stage, stage_timer
+from face_tracking import FaceTracker, SessionTrack, padded_roi
+
+DETECTOR_BACKEND = os.getenv("FACE_DETECTOR_BACKEND", "auto")  # "auto": calibrate at startup
+WARMUP_RUNS = int(os.getenv("FACE_WARMUP_RUNS", "3"))
+
+# Output order of DeepFace's emotion model
+EMOTION_LABELS = ("angry", "disgust", "fear", "happy", "sad", "surprise", "neutral")
+EMOTION_INPUT_SIZE = 48
+
+# (emotion label, model probability of that label)
+Prediction = Tuple[str, float]
+
+# Frames are decoded to at most this many pixels (default 640x480)
+MAX_DECODE_PIXELS = int(os.getenv("FACE_MAX_DECODE_PIXELS", str(640 * 480)))
+REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def image_dimensions(buf) -> Optional[Tuple[str, int, int]]:
+    """(format, width, height) from a JPEG or PNG header without decoding"""
+    data = memoryview(buf)
+    if len(data) >= 24 and bytes(data[:8]) == b"\x89PNG\r\n\x1a\n":
+        width, height = struct.unpack(">II", data[16:24])
+        return "png", width, height
+    if len(data) < 4 or bytes(data[:2]) != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return "jpeg", width, height
+        i += 2 + length
+    return None
+
+
+def decode_bounded(buf, max_pixels: int = MAX_DECODE_PIXELS) -> Optional[np.ndarray]:
+    """Decode an encoded image to BGR with at most `max_pixels` pixels.
+
+    JPEGs are decoded at 1/2, 1/4 or 1/8 scale by libjpeg itself (no full-size
+    intermediate); other formats, and any remaining excess, are downscaled
+    with INTER_AREA after decoding.
+    """
+    arr = np.frombuffer(buf, np.uint8)
+    flag = cv2.IMREAD_COLOR
+    header = image_dimensions(buf) if max_pixels else None
+    if header is not None and header[0] == "jpeg":
+        _, width, height = header
+        for factor, reduced in REDUCED_DECODE_FLAGS:
+            if (width // factor) * (height // factor) >= max_pixels:
+                flag = reduced
+                break
+    img = cv2.imdecode(arr, flag)
+    if img is None or not max_pixels:
+        return img
+    pixels = img.shape[0] * img.shape[1]
+    if pixels > max_pixels:
+        scale = (max_pixels / pixels) ** 0.5
+        size = (max(1, int(img.shape[1] * scale)), max(1, int(img.shape[0] * scale)))
+        img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    return img
+
+
+def face_to_emotion_input(face: np.ndarray) -> np.ndarray:
+    """DeepFace face crop (RGB, floats in [0, 1]) -> 48x48 grayscale model input.
+
+    Mirrors DeepFace's own preprocessing: pad to a square, convert to gray and
+    resize, so batched results match DeepFace.analyze.
+    """
+    face = np.ascontiguousarray(face[:, :, ::-1], dtype=np.float32)  # RGB -> BGR
+    h, w = face.shape[:2]
+    side = max(h, w)
+    if h != w:
+        padded = np.zeros((side, side, 3), dtype=np.float32)
+        top, left = (side - h) // 2, (side - w) // 2
+        padded[top:top + h, left:left + w] = face
+        face = padded
+    gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (EMOTION_INPUT_SIZE, EMOTION_INPUT_SIZE), interpolation=cv2.INTER_AREA)
+
+
+def warmup_image(seed: int = 0, size: int = 224) -> np.ndarray:
+    """A synthetic face-like BGR image: enough structure to run detector and classifier"""
+    rng = np.random.default_rng(seed)
+    img = rng.integers(90, 160, size=(size, size, 3), dtype=np.uint8)
+    center = (size // 2, size // 2)
+    cv2.ellipse(img, center, (size // 4, size // 3), 0, 0, 360, (180, 200, 225), -1)
+    for dx in (-size // 10, size // 10):
+        cv2.circle(img, (center[0] + dx, center[1] - size // 12), size // 30, (40, 40, 40), -1)
+    cv2.ellipse(img, (center[0], center[1] + size // 8), (size // 10, size // 30), 0, 0, 180, (60, 60, 150), 2)
+    return img
+
+
+def synthetic_face_frame(width: int, height: int, rng: np.random.Generator,
+                         seed: int = 0) -> Tuple[np.ndarray, Tuple[int, int, int, int]]:
+    """A warm-up face at a random spot and scale on a blurred noise background, and its box"""
+    frame = rng.integers(60, 200, size=(height, width, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (0, 0), 3)
+    side = int(min(width, height) * rng.uniform(0.35, 0.7))
+    face = cv2.resize(warmup_image(seed), (side, side), interpolation=cv2.INTER_AREA)
+    x, y = int(rng.integers(0, width - side + 1)), int(rng.integers(0, height - side + 1))
+    frame[y:y + side, x:x + side] = face
+    # The drawn face ellipse spans about half the tile's width and two thirds of its height
+    return frame, (x + side // 4, y + side // 6, side // 2, side * 2 // 3)
+
+
+class FaceModels:
+    """Loads, warms and serves the emotion model and detector for this process"""
+
+    def __init__(self, detector_backend: str = DETECTOR_BACKEND, warmup_runs: int = WARMUP_RUNS,
+                 tracker: Optional[FaceTracker] = None, backend: Optional[EmotionBackend] = None):
+        self.auto_detector = detector_backend == "auto"
+        self.detector_backend = face_detectors.FALLBACK_DETECTOR if self.auto_detector else detector_backend
+        self.detector_selection: Dict[str, Any] = {"mode": "auto" if self.auto_detector else "fixed"}
+        self.backend = backend or create_backend()
+        self.tracker = tracker
+        self.warmup_runs = warmup_runs
+        self.state = "not_loaded"  # -> loading -> warming -> ready | failed
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self.ready_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    def start_background_load(self) -> None:
+        """Load in a daemon thread so the server can answer health checks meanwhile"""
+        if self.is_ready or (self._thread and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self.load, name="face-model-load", daemon=True)
+        self._thread.start()
+
+    def load(self) -> None:
+        self.state = "loading"
+        started = time.perf_counter()
+        try:
+            self.backend.load()
+            if self.auto_detector:
+                self.calibrate_detector()
+            try:
+                build_deepface_model(self.detector_backend, "face_detector")
+            except Exception:
+                pass  # older DeepFace builds detectors lazily; the warm-up below covers it
+            self.load_seconds = round(time.perf_counter() - started, 3)
+
+            self.state = "warming"
+            warm_started = time.perf_counter()
+            for i in range(self.warmup_runs):
+                self.analyze(warmup_image(i))
+            # Trace the batched path too, at the shapes it will see
+            self.analyze_batch([warmup_image(i) for i in range(max(2, self.warmup_runs))])
+            self.warmup_seconds = round(time.perf_counter() - warm_started, 3)
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            print(f"❌ Face model load failed: {e}")
+            return
+
+        self.state = "ready"
+        self.ready_at = time.time()
+        self.ready_event.set()
+        print(f"✅ Face models ready (load {self.load_seconds}s, warm-up {self.warmup_seconds}s)")
+
+    def calibrate_detector(self) -> None:
+        """Time the candidate detectors at the decode resolution and keep the fastest good one"""
+        started = time.perf_counter()
+        width, height = face_detectors.frame_size_for(MAX_DECODE_PIXELS)
+        frames = face_detectors.calibration_frames(width, height, face_detectors.CALIBRATION_FRAMES)
+        table = face_detectors.calibrate(face_detectors.DETECTOR_CANDIDATES, frames, self._extract, self._found)
+        self.detector_backend, reason = face_detectors.select(table)
+        self.detector_selection.update({
+            "reason": reason,
+            "min_detection_rate": face_detectors.MIN_DETECTION_RATE,
+            "frame_size": f"{width}x{height}",
+            "synthetic_frames": all(expected is not None for _, expected in frames),
+            "calibration_seconds": round(time.perf_counter() - started, 3),
+            "calibration": table,
+        })
+        print(f"🔎 Face detector: {self.detector_backend} ({reason})")
+
+    def analyze(self, img: np.ndarray, timings: Optional[Dict[str, float]] = None,
+                detector: Optional[str] = None) -> Prediction:
+        """(dominant emotion, probability) of the (first) face in a BGR image"""
+        if self.backend.name != "deepface":
+            return self.analyze_batch([img], timings=[timings], detectors=[detector])[0]
+        with stage_timer(timings, "analyze"):  # detection and classification in one DeepFace call
+            result = DeepFace.analyze(
+                img,
+                actions=['emotion'],
+                enforce_detection=False,
+                detector_backend=detector or self.detector_backend
+            )
+        dominant = result[0]['dominant_emotion']
+        # DeepFace reports the emotion scores as percentages
+        return dominant.lower(), float(result[0]['emotion'].get(dominant, 0.0)) / 100.0
+
+    def _extract(self, img: np.ndarray, detector: Optional[str] = None) -> Dict[str, Any]:
+        faces = DeepFace.extract_faces(
+            img,
+            detector_backend=detector or self.detector_backend,
+            enforce_detection=False,
+            align=True
+        )
+        return max(faces, key=lambda f: f.get("confidence") or 0)
+
+    @staticmethod
+    def _found(face: Dict[str, Any], img: np.ndarray) -> bool:
+        """False for DeepFace's enforce_detection=False fallback (the whole image)"""
+        area = face.get("facial_area") or {}
+        whole = area.get("w") == img.shape[1] and area.get("h") == img.shape[0]
+        return bool(face.get("confidence")) and not whole
+
+    def detect_face(self, img: np.ndarray, track: Optional[SessionTrack] = None,
+                    detector: Optional[str] = None) -> np.ndarray:
+        """Most confident face crop of a BGR image (the whole image if none is found).
+
+        With a session `track`, search only the padded ROI around the last box
+        until a periodic full re-detect is due or the face is lost. `detector`
+        overrides the selected backend for this image.
+        """
+        if track is None or self.tracker is None:
+            return self._extract(img, detector)["face"]
+
+        with track.lock:
+            if self.tracker.should_use_roi(track):
+                x, y, w, h = padded_roi(track.box, img.shape, self.tracker.roi_padding)
+                roi = img[y:y + h, x:x + w]
+                face = self._extract(roi, detector)
+                if self._found(face, roi):
+                    area = face["facial_area"]
+                    track.box = (x + area["x"], y + area["y"], area["w"], area["h"])
+                    track.frames_since_detect += 1
+                    self.tracker.record("roi", w * h)
+                    return face["face"]
+                self.tracker.record("miss", w * h)
+
+            face = self._extract(img, detector)
+            self.tracker.record("full", img.shape[0] * img.shape[1])
+            if self._found(face, img):
+                area = face["facial_area"]
+                track.box = (area["x"], area["y"], area["w"], area["h"])
+            else:
+                track.box = None
+            track.frames_since_detect = 0
+            return face["face"]
+
+    def classify_faces(self, faces: List[np.ndarray]) -> np.ndarray:
+        """Emotion probabilities (n x 7) for face crops, in a single forward pass"""
+        batch = np.stack([face_to_emotion_input(face) for face in faces])[..., np.newaxis]
+        return self.backend.predict(batch)
+
+    def analyze_batch(self, images: List[np.ndarray], tracks: Optional[List[Optional[SessionTrack]]] = None,
+                      timings: Optional[List[Optional[Dict[str, float]]]] = None,
+                      detectors: Optional[List[Optional[str]]] = None) -> List[Prediction]:
+        """(dominant emotion, probability) per BGR image: per-image detection, batched classification.
+
+        `timings` (one dict or None per image) collect "detect" per image and
+        the whole batch's "classify" time for every image. `detectors` holds
+        per-image detector overrides (None: the selected backend).
+        """
+        if not images:
+            return []
+        tracks = tracks or [None] * len(images)
+        timings = timings or [None] * len(images)
+        detectors = detectors or [None] * len(images)
+        faces = []
+        for img, track, image_timings, detector in zip(images, tracks, timings, detectors):
+            with stage_timer(image_timings, "detect"):
+                faces.append(self.detect_face(img, track, detector))
+        started = time.perf_counter()
+        probabilities = self.classify_faces(faces)
+        for image_timings in timings:
+            add_stage(image_timings, "classify", time.perf_counter() - started)
+        best = np.argmax(probabilities, axis=1)
+        return [(EMOTION_LABELS[i], float(p[i])) for i, p in zip(best, probabilities)]
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "ready": self.is_ready,
+            "detector_backend": self.detector_backend,
+            "detector_selection": self.detector_selection,
+            "emotion_backend": self.backend.info(),
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "warmup_runs": self.warmup_runs,
+            "max_decode_pixels": MAX_DECODE_PIXELS,
+            "error": self.error,
+            "tracking": self.tracker.metrics() if self.tracker else None,
+        }
@@ -0,0 +1,124 @@
+# backend/face_profiling.py
+"""
+Stage-level latency accounting for the face pipeline.
+
+A request carries a plain dict of stage -> seconds. Pipeline code adds to it
+with `stage_timer(timings, "detect")`; a None dict makes timing a no-op.
+Stages that run once per micro-batch (the emotion CNN) are charged in full
+to every frame of the batch, since each of them waited for it.
+
+StageProfiler folds finished requests into fixed log-spaced histograms
+(constant memory, cheap to update) and estimates percentiles from them.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+
+# Pipeline order; "queue" is whatever inference time the other stages do not explain
+# (batch window, executor queue, worker IPC)
+STAGES = ("b64decode", "cache", "queue", "imdecode", "detect", "classify", "analyze", "respond", "total")
+
+# Bucket upper bounds in ms: 0.05 ms .. ~30 s, 4 buckets per doubling
+BUCKET_BOUNDS_MS = 0.05 * 2.0 ** (np.arange(80) / 4.0)
+
+
+@contextmanager
+def stage_timer(timings: Optional[Dict[str, float]], stage: str) -> Iterator[None]:
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def add_stage(timings: Optional[Dict[str, float]], stage: str, seconds: float) -> None:
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    """Server-Timing header value (durations in ms), readable in browser dev tools"""
+    return ", ".join(f"{stage};dur={timings[stage] * 1000:.2f}" for stage in STAGES if stage in timings)
+
+
+def parse_server_timing(value: str) -> Dict[str, float]:
+    """Inverse of server_timing_header: stage -> ms"""
+    timings = {}
+    for part in value.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.startswith("dur="):
+            timings[name] = float(params[4:])
+    return timings
+
+
+class StageHistogram:
+    def __init__(self):
+        self.counts = np.zeros(len(BUCKET_BOUNDS_MS) + 1, dtype=np.int64)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[int(np.searchsorted(BUCKET_BOUNDS_MS, ms))] += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (within ~19%)"""
+        n = int(self.counts.sum())
+        if n == 0:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.counts), q / 100.0 * n))
+        return min(float(BUCKET_BOUNDS_MS[index]), self.max_ms) if index < len(BUCKET_BOUNDS_MS) else self.max_ms
+
+    def summary(self, buckets: bool) -> Dict[str, Any]:
+        n = int(self.counts.sum())
+        out = {
+            "count": n,
+            "mean_ms": round(self.total_ms / n, 3) if n else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max_ms, 3),
+        }
+        if buckets:
+            # Cumulative counts per upper bound, Prometheus-style; empty tail buckets omitted
+            cumulative = np.cumsum(self.counts[:-1])
+            last = int(np.nonzero(self.counts[:-1])[0].max()) + 1 if self.counts[:-1].any() else 0
+            out["buckets"] = {f"{BUCKET_BOUNDS_MS[i]:.3g}": int(cumulative[i]) for i in range(last)}
+            out["buckets"]["+Inf"] = n
+        return out
+
+
+class StageProfiler:
+    """Histograms of every pipeline stage across requests"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, StageHistogram] = {stage: StageHistogram() for stage in STAGES}
+        self.requests = 0
+
+    def observe(self, timings: Dict[str, float]) -> None:
+        with self._lock:
+            self.requests += 1
+            for stage, seconds in timings.items():
+                histogram = self.histograms.get(stage)
+                if histogram is not None:
+                    histogram.observe(seconds * 1000.0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms = {stage: StageHistogram() for stage in STAGES}
+            self.requests = 0
+
+    def metrics(self, buckets: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "stages": {stage: h.summary(buckets) for stage, h in self.histograms.items() if h.counts.any()},
+            }
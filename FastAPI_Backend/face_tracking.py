@@ -0,0 +1,135 @@
+# backend/face_tracking.py
+"""
+Per-session face box tracking for consecutive webcam frames.
+
+After a full-frame detection, the next frames of the same session are only
+searched inside a padded region of interest around the last face box. A full
+re-detect happens every `redetect_every` frames, or as soon as the ROI
+search loses the face.
+
+EmotionSmoother keeps a rolling emotion history for streaming sessions.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+Box = Tuple[int, int, int, int]  # x, y, w, h in full-frame pixels
+
+
+def padded_roi(box: Box, frame_shape: Tuple[int, ...], padding: float) -> Box:
+    """Expand `box` by `padding` x its size on every side, clipped to the frame"""
+    x, y, w, h = box
+    frame_h, frame_w = frame_shape[:2]
+    pad_x, pad_y = int(w * padding), int(h * padding)
+    x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+    x1, y1 = min(frame_w, x + w + pad_x), min(frame_h, y + h + pad_y)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+class SessionTrack:
+    """Tracking state of one client session"""
+
+    __slots__ = ("box", "frames_since_detect", "last_seen", "lock", "detector")
+
+    def __init__(self):
+        self.box: Optional[Box] = None
+        self.detector: Optional[str] = None  # the session's detector override, if any
+        self.frames_since_detect = 0
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class FaceTracker:
+    """Bounded LRU of SessionTracks plus hit/miss counters"""
+
+    def __init__(self, redetect_every: int = 10, roi_padding: float = 0.5,
+                 max_sessions: int = 1024, session_ttl: float = 120.0):
+        self.redetect_every = max(1, redetect_every)
+        self.roi_padding = roi_padding
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self._sessions: "OrderedDict[str, SessionTrack]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.full_detections = 0
+        self.roi_detections = 0
+        self.roi_misses = 0
+        self.full_pixels = 0
+        self.roi_pixels = 0
+
+    def get(self, session_id: str) -> SessionTrack:
+        now = time.monotonic()
+        with self._lock:
+            track = self._sessions.get(session_id)
+            if track is None or now - track.last_seen > self.session_ttl:
+                track = SessionTrack()
+                self._sessions[session_id] = track
+            track.last_seen = now
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return track
+
+    def drop(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def should_use_roi(self, track: SessionTrack) -> bool:
+        return track.box is not None and track.frames_since_detect < self.redetect_every
+
+    def record(self, kind: str, pixels: int) -> None:
+        if kind == "roi":
+            self.roi_detections += 1
+            self.roi_pixels += pixels
+        elif kind == "miss":
+            self.roi_misses += 1
+            self.roi_pixels += pixels
+        else:
+            self.full_detections += 1
+            self.full_pixels += pixels
+
+    def metrics(self) -> Dict[str, Any]:
+        searched = self.full_detections + self.roi_detections
+        return {
+            "sessions": len(self._sessions),
+            "redetect_every": self.redetect_every,
+            "roi_padding": self.roi_padding,
+            "full_detections": self.full_detections,
+            "roi_detections": self.roi_detections,
+            "roi_misses": self.roi_misses,
+            "roi_hit_rate": round(self.roi_detections / searched, 4) if searched else 0.0,
+            "mean_full_pixels": int(self.full_pixels / self.full_detections) if self.full_detections else 0,
+            "mean_roi_pixels": int(self.roi_pixels / (self.roi_detections + self.roi_misses))
+            if self.roi_detections + self.roi_misses else 0,
+        }
+
+
+class EmotionSmoother:
+    """Exponential moving average over per-frame emotion labels"""
+
+    def __init__(self, labels: Iterable[str], alpha: float = 0.3, history: int = 30):
+        self.labels = list(labels)
+        self.index = {label: i for i, label in enumerate(self.labels)}
+        self.alpha = alpha
+        self.scores = np.zeros(len(self.labels))
+        self.history = deque(maxlen=history)
+        self.frames = 0
+
+    def update(self, emotion: str) -> Tuple[str, float]:
+        """Add one frame's label; return the smoothed dominant emotion and its weight"""
+        observed = np.zeros(len(self.labels))
+        observed[self.index.get(emotion, self.index.get("neutral", 0))] = 1.0
+        if self.frames == 0:
+            self.scores = observed
+        else:
+            self.scores = (1.0 - self.alpha) * self.scores + self.alpha * observed
+        self.frames += 1
+        self.history.append(emotion)
+        best = int(np.argmax(self.scores))
+        return self.labels[best], float(self.scores[best])
+
+    def distribution(self) -> Dict[str, float]:
+        return {label: round(float(score), 3) for label, score in zip(self.labels, self.scores) if score >= 0.001}
@@ -0,0 +1,295 @@
+# backend/face_trends.py
+"""
+Per-user emotion history for the face analysis service.
+
+Every analysed frame is recorded as (timestamp, emotion_id, confidence) in a
+fixed-size NumPy ring per user, and folded into hourly and daily aggregate
+rings (per-emotion counts, mood and confidence sums). Recording and reading
+a trend touch a constant number of slots, so analyze_face can return the
+real trend without a database round trip.
+
+Memory is bounded: at most `max_users` users are kept in memory (least
+recently used are written out and evicted) and every user's rings have a
+fixed size. Dirty users are snapshotted to one .npz file each in the trend
+directory, and loaded back lazily on their next request. Snapshots are read
+outside the store lock; async callers should `load()` a user that is not in
+memory on a worker thread first, so the event loop never waits on the disk.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Mood level (1-5) per emotion, the scale of the `values` in a trend
+EMOTION_MOOD = {"angry": 1.0, "disgust": 1.5, "fear": 2.0, "sad": 2.0, "neutral": 3.0, "surprise": 4.0, "happy": 5.0}
+
+
+class AggregateRing:
+    """Per-period emotion counts, mood and confidence sums for the last `size` periods"""
+
+    def __init__(self, size: int, labels: int):
+        self.period = np.full(size, -1, dtype=np.int64)  # which period each slot currently holds
+        self.counts = np.zeros((size, labels), dtype=np.uint32)
+        self.mood_sum = np.zeros(size, dtype=np.float64)
+        self.confidence_sum = np.zeros(size, dtype=np.float64)
+
+    def add(self, period: int, emotion_id: int, mood: float, confidence: float) -> None:
+        slot = period % len(self.period)
+        if period < self.period[slot]:
+            return  # older than the ring's window (late or back-dated record)
+        if self.period[slot] != period:
+            self.period[slot] = period
+            self.counts[slot] = 0
+            self.mood_sum[slot] = 0.0
+            self.confidence_sum[slot] = 0.0
+        self.counts[slot, emotion_id] += 1
+        self.mood_sum[slot] += mood
+        self.confidence_sum[slot] += confidence
+
+    def window(self, last_period: int, points: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(periods, per-emotion counts, mood sums, confidence sums) for the `points` periods up to `last_period`"""
+        points = min(points, len(self.period))
+        periods = np.arange(last_period - points + 1, last_period + 1)
+        slots = periods % len(self.period)
+        valid = (self.period[slots] == periods)[:, np.newaxis]
+        return (periods, np.where(valid, self.counts[slots], 0),
+                np.where(valid[:, 0], self.mood_sum[slots], 0.0), np.where(valid[:, 0], self.confidence_sum[slots], 0.0))
+
+
+class UserTrend:
+    """Raw ring of recent frames plus hourly and daily aggregates for one user"""
+
+    def __init__(self, labels: int, raw_capacity: int, hours: int, days: int):
+        self.timestamps = np.zeros(raw_capacity, dtype=np.float64)
+        self.emotions = np.zeros(raw_capacity, dtype=np.uint8)
+        self.confidences = np.zeros(raw_capacity, dtype=np.float32)
+        self.next = 0
+        self.count = 0
+        self.hourly = AggregateRing(hours, labels)
+        self.daily = AggregateRing(days, labels)
+        self.dirty = False
+
+    def record(self, ts: float, local_ts: float, emotion_id: int, confidence: float, mood: float) -> None:
+        slot = self.next
+        self.timestamps[slot] = ts
+        self.emotions[slot] = emotion_id
+        self.confidences[slot] = confidence
+        self.next = (slot + 1) % len(self.timestamps)
+        self.count = min(self.count + 1, len(self.timestamps))
+        self.hourly.add(int(local_ts // 3600), emotion_id, mood, confidence)
+        self.daily.add(int(local_ts // 86400), emotion_id, mood, confidence)
+        self.dirty = True
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        out = {"timestamps": self.timestamps, "emotions": self.emotions, "confidences": self.confidences,
+               "cursor": np.array([self.next, self.count], dtype=np.int64)}
+        for name, ring in (("hourly", self.hourly), ("daily", self.daily)):
+            out.update({f"{name}_period": ring.period, f"{name}_counts": ring.counts,
+                        f"{name}_mood": ring.mood_sum, f"{name}_confidence": ring.confidence_sum})
+        return out
+
+    def restore(self, data) -> None:
+        """Load saved arrays; rings of a different size are skipped (sizes changed since the snapshot)"""
+        for name in ("timestamps", "emotions", "confidences"):
+            if data[name].shape == getattr(self, name).shape:
+                getattr(self, name)[:] = data[name]
+        if data["timestamps"].shape == self.timestamps.shape:
+            self.next, self.count = (int(v) for v in data["cursor"])
+        for name, ring in (("hourly", self.hourly), ("daily", self.daily)):
+            if data[f"{name}_period"].shape == ring.period.shape and data[f"{name}_counts"].shape == ring.counts.shape:
+                ring.period[:] = data[f"{name}_period"]
+                ring.counts[:] = data[f"{name}_counts"]
+                ring.mood_sum[:] = data[f"{name}_mood"]
+                ring.confidence_sum[:] = data[f"{name}_confidence"]
+
+
+class TrendStore:
+    """Bounded LRU of UserTrends with per-user .npz snapshots"""
+
+    def __init__(self, labels, directory: Optional[str] = "face_trends", raw_capacity: int = 256,
+                 hours: int = 7 * 24, days: int = 90, max_users: int = 2000, utc_offset_minutes: int = 0):
+        self.labels = list(labels)
+        self.index = {label: i for i, label in enumerate(self.labels)}
+        self.moods = np.array([EMOTION_MOOD.get(label, 3.0) for label in self.labels])
+        self.directory = directory
+        self.raw_capacity = raw_capacity
+        self.hours = hours
+        self.days = days
+        self.max_users = max_users
+        self.offset_seconds = utc_offset_minutes * 60
+        self._users: "OrderedDict[str, UserTrend]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self.bytes_per_user = sum(a.nbytes for a in self._new().arrays().values())
+
+        self.recorded = 0
+        self.loaded = 0
+        self.evicted = 0
+        self.snapshots = 0
+        self.last_snapshot: Optional[Dict[str, Any]] = None
+
+    # ---- storage ---------------------------------------------------
+
+    def _path(self, user_id: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:20] + ".npz")
+
+    def _new(self) -> UserTrend:
+        return UserTrend(len(self.labels), self.raw_capacity, self.hours, self.days)
+
+    def _get(self, user_id: str, create: bool) -> Optional[UserTrend]:
+        """The user's trend, made most recently used. Call without holding the lock"""
+        with self._lock:
+            trend = self._users.get(user_id)
+            if trend is not None:
+                self._users.move_to_end(user_id)
+                return trend
+        path = self._path(user_id) if self.directory else None
+        loaded = False
+        if path and os.path.exists(path):
+            trend = self._new()
+            try:
+                with np.load(path) as data:
+                    trend.restore(data)
+                loaded = True
+            except Exception as e:
+                print(f"⚠️ Could not load emotion trend snapshot {path}: {e}")
+        elif create:
+            trend = self._new()
+        else:
+            return None
+        with self._lock:
+            current = self._users.get(user_id)
+            if current is not None:
+                self._users.move_to_end(user_id)
+                return current  # another thread loaded it meanwhile
+            self.loaded += loaded
+            self._users[user_id] = trend
+            while len(self._users) > self.max_users:
+                evicted_id, evicted = self._users.popitem(last=False)
+                self.evicted += 1
+                if evicted.dirty:
+                    self._write(evicted_id, evicted.arrays())
+        return trend
+
+    def _write(self, user_id: str, arrays: Dict[str, np.ndarray]) -> None:
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(user_id)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    def snapshot(self) -> int:
+        """Write every user changed since the last snapshot; returns how many"""
+        with self._lock:
+            pending = []
+            for user_id, trend in self._users.items():
+                if trend.dirty:
+                    pending.append((user_id, {k: v.copy() for k, v in trend.arrays().items()}))
+                    trend.dirty = False
+        started = time.perf_counter()
+        for user_id, arrays in pending:
+            self._write(user_id, arrays)
+        self.snapshots += 1
+        self.last_snapshot = {"users": len(pending), "seconds": round(time.perf_counter() - started, 3),
+                              "at": datetime.now(timezone.utc).isoformat()}
+        return len(pending)
+
+    def snapshot_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"⚠️ Emotion trend snapshot failed: {e}")
+
+    def start_snapshots(self, interval: float) -> None:
+        if self.directory and interval > 0:
+            self._stop.clear()
+            threading.Thread(target=self.snapshot_loop, args=(interval,), name="face-trend-snapshot", daemon=True).start()
+
+    def stop_snapshots(self) -> None:
+        self._stop.set()
+        if self.directory:
+            self.snapshot()
+
+    # ---- recording and reading -------------------------------------
+
+    def __contains__(self, user_id: str) -> bool:
+        with self._lock:
+            return user_id in self._users
+
+    def load(self, user_id: str) -> None:
+        """Bring a user's snapshot into memory (blocking file I/O)"""
+        self._get(user_id, create=False)
+
+    def record(self, user_id: str, emotion: str, confidence: float, ts: Optional[float] = None) -> None:
+        ts = time.time() if ts is None else ts
+        emotion_id = self.index.get(emotion, self.index.get("neutral", 0))
+        while True:
+            trend = self._get(user_id, create=True)
+            with self._lock:
+                if self._users.get(user_id) is not trend:
+                    continue  # evicted before we got the lock back
+                trend.record(ts, ts + self.offset_seconds, emotion_id, confidence, float(self.moods[emotion_id]))
+                self.recorded += 1
+                return
+
+    def trend(self, user_id: Optional[str], period: str = "daily", points: int = 7,
+              now: Optional[float] = None) -> Dict[str, Any]:
+        """Mood level (1-5, None without data), frame counts and dominant emotion per hour or day"""
+        local_now = (time.time() if now is None else now) + self.offset_seconds
+        seconds = 3600 if period == "hourly" else 86400
+        trend = self._get(user_id, create=False) if user_id else None
+        with self._lock:
+            if trend is not None:
+                ring = trend.hourly if period == "hourly" else trend.daily
+                periods, counts, mood, confidence = ring.window(int(local_now // seconds), points)
+            else:
+                periods = np.arange(int(local_now // seconds) - points + 1, int(local_now // seconds) + 1)
+                counts = np.zeros((len(periods), len(self.labels)), dtype=np.uint32)
+                mood = confidence = np.zeros(len(periods))
+
+        totals = counts.sum(axis=1)
+        starts = [datetime(1970, 1, 1) + timedelta(seconds=int(p) * seconds) for p in periods]
+        labels = [s.strftime("%H:00") if period == "hourly" else s.strftime("%a") for s in starts]
+        return {
+            "period": "hourly" if period == "hourly" else "daily",
+            "labels": labels,
+            "values": [round(float(m / n), 2) if n else None for m, n in zip(mood, totals)],
+            "counts": [int(n) for n in totals],
+            "confidence": [round(float(c / n), 3) if n else None for c, n in zip(confidence, totals)],
+            "dominant": [self.labels[int(np.argmax(row))] if n else None for row, n in zip(counts, totals)],
+            "start": [s.strftime("%Y-%m-%dT%H:%M") for s in starts],
+        }
+
+    def recent(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest-first raw frames still in the user's ring"""
+        trend = self._get(user_id, create=False)
+        if trend is None:
+            return []
+        with self._lock:
+            n = min(limit, trend.count)
+            slots = (trend.next - 1 - np.arange(n)) % len(trend.timestamps)
+            rows = list(zip(trend.timestamps[slots], trend.emotions[slots], trend.confidences[slots]))
+        return [{"timestamp": datetime.fromtimestamp(float(ts), timezone.utc).isoformat(),
+                 "emotion": self.labels[int(e)], "confidence": round(float(c), 3)} for ts, e, c in rows]
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "users_in_memory": len(self._users),
+            "max_users": self.max_users,
+            "bytes_per_user": self.bytes_per_user,
+            "recorded": self.recorded,
+            "loaded_from_disk": self.loaded,
+            "evicted": self.evicted,
+            "directory": self.directory,
+            "snapshots": self.snapshots,
+            "last_snapshot": self.last_snapshot,
+        }
@@ -0,0 +1,442 @@
+# backend/face_workers.py
+"""
+Multi-process face inference.
+
+FaceWorkerPool starts N spawned worker processes, each loading and warming
+its own FaceModels with a fixed thread budget (OpenCV, BLAS, torch). Encoded
+frames are copied by the API process into per-worker shared-memory slots;
+only (slot, length, session_id, detector) tuples cross the pipe, so frame
+bytes are never pickled. Frames are routed by session: a session's frames go
+to its home worker (a stable hash of the session id), which keeps that
+worker's tracked face box and caches warm. Only when the home worker is not
+ready or has no free slots does a batch go to the ready worker with the
+fewest frames outstanding.
+
+With detector_backend="auto" only worker 0 starts at first: it calibrates the
+detector backends, and the other workers (and any restarts) are spawned with
+the backend it picked instead of calibrating again.
+
+run_batch() blocks until the worker replies, so it is meant to be called
+from the InferenceExecutor threads (the executor keeps admission control).
+"""
+import base64
+import itertools
+import multiprocessing as mp
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from inference_executor import Overloaded
+from face_profiling import add_stage, stage_timer
+
+FrameJob = Tuple[Union[str, bytes], Optional[str], Optional[dict], Optional[str]]
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TF_NUM_INTRAOP_THREADS")
+
+
+@contextmanager
+def child_environment(values: Dict[str, str]):
+    """Set env vars only while a spawned child is being started (it copies os.environ)"""
+    saved = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Open the parent's block; spawned children share its resource tracker, which unlinks it once"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def worker_main(index: int, conn, shm_name: str, slot_bytes: int, detector_backend: str,
+                warmup_runs: int, threads: int, redetect_every: int, roi_padding: float) -> None:
+    """Worker process: load the models, then serve batches of shared-memory frames"""
+    import cv2
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    from face_pipeline import FaceModels, decode_bounded
+    from face_profiling import stage_timer
+    from face_tracking import FaceTracker
+
+    shm = attach_shared_memory(shm_name)
+    tracker = FaceTracker(redetect_every=redetect_every, roi_padding=roi_padding)
+    models = FaceModels(detector_backend=detector_backend, warmup_runs=warmup_runs, tracker=tracker)
+    models.load()
+    if not models.is_ready:
+        conn.send(("failed", models.error))
+        shm.close()
+        return
+    conn.send(("ready", {"pid": os.getpid(), "load_seconds": models.load_seconds,
+                         "warmup_seconds": models.warmup_seconds, "detector_backend": models.detector_backend,
+                         "detector_selection": models.detector_selection}))
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        if message[0] == "drop":
+            tracker.drop(message[1])
+            continue
+
+        _, batch_id, frames = message
+        started = time.perf_counter()
+        results: List[Any] = [None] * len(frames)
+        timings: List[Dict[str, float]] = [{} for _ in frames]
+        images, tracks, detectors, positions = [], [], [], []
+        for i, (slot, length, session_id, detector) in enumerate(frames):
+            view = shm.buf[slot * slot_bytes:slot * slot_bytes + length]
+            try:
+                with stage_timer(timings[i], "imdecode"):
+                    img = decode_bounded(view)  # decodes straight from shared memory
+            finally:
+                view.release()
+            if img is None:
+                results[i] = {"error": "Invalid image data provided"}
+                continue
+            images.append(img)
+            tracks.append(tracker.get(session_id) if session_id else None)
+            detectors.append(detector)
+            positions.append(i)
+        try:
+            batch_timings = [timings[i] for i in positions]
+            for i, emotion in zip(positions, models.analyze_batch(images, tracks, batch_timings, detectors)):
+                results[i] = emotion
+        except Exception as e:
+            for i in positions:
+                results[i] = {"error": str(e)}
+        conn.send(("result", batch_id, results, time.perf_counter() - started, tracker.metrics(), timings))
+
+    shm.close()
+
+
+class WorkerHandle:
+    """Parent-side state of one worker process"""
+
+    def __init__(self, index: int, slots: int):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self.state = "not_started"  # -> loading -> ready | failed | exited
+        self.info: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.free_slots = list(range(slots))
+        self.outstanding = 0  # frames sent and not yet answered
+        self.pending: Dict[int, Tuple[Future, List[int]]] = {}
+        self.send_lock = threading.Lock()
+        self.batches = 0
+        self.frames = 0
+        self.busy_seconds = 0.0
+        self.restarts = 0
+        self.tracking: Optional[Dict[str, Any]] = None
+
+
+class FaceWorkerPool:
+    """Session-sticky scheduler over N face model processes fed through shared memory"""
+
+    def __init__(self, workers: int, threads_per_worker: int = 1, slots_per_worker: int = 16,
+                 slot_bytes: int = 1024 * 1024, detector_backend: str = "opencv", warmup_runs: int = 3,
+                 redetect_every: int = 30, roi_padding: float = 0.4, reply_timeout: float = 30.0,
+                 max_wait: float = 5.0):
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.slots_per_worker = max(1, slots_per_worker)
+        self.slot_bytes = slot_bytes
+        self.detector_backend = detector_backend
+        self.detector_selection: Dict[str, Any] = {"mode": "auto" if detector_backend == "auto" else "fixed"}
+        self.warmup_runs = warmup_runs
+        self.redetect_every = redetect_every
+        self.roi_padding = roi_padding
+        self.reply_timeout = reply_timeout
+        self.max_wait = max_wait
+        self.workers = [WorkerHandle(i, self.slots_per_worker) for i in range(max(1, workers))]
+        self._ctx = mp.get_context("spawn")  # no forked copies of model or thread-pool state
+        self._cond = threading.Condition()
+        self._batch_ids = itertools.count()
+        self._started = False
+        self._closing = False
+        self.sticky_hits = 0
+        self.sticky_fallbacks = 0
+
+    # ---- lifecycle -------------------------------------------------
+
+    @property
+    def state(self) -> str:
+        states = {w.state for w in self.workers}
+        if "ready" in states:
+            return "ready"
+        if states <= {"failed", "exited"}:
+            return "failed"
+        return "loading" if self._started else "not_loaded"
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    def start_background_load(self) -> None:
+        """Spawn every worker; each reports 'ready' once its models are warm"""
+        if self._started:
+            return
+        self._started = True
+        for worker in self.workers:
+            worker.shm = shared_memory.SharedMemory(create=True, size=self.slots_per_worker * self.slot_bytes)
+        if self.detector_backend == "auto":
+            self._spawn(self.workers[0])  # calibrates; the rest start once it has picked a detector
+        else:
+            self._spawn_remaining()
+
+    def _spawn_remaining(self) -> None:
+        for worker in self.workers:
+            if worker.state == "not_started" and not self._closing:
+                self._spawn(worker)
+
+    def _spawn(self, worker: WorkerHandle) -> None:
+        parent_conn, child_conn = self._ctx.Pipe()
+        threads = str(self.threads_per_worker)
+        env = {name: threads for name in THREAD_ENV_VARS}
+        env.update({"TF_NUM_INTEROP_THREADS": "1", "FACE_WORKERS": "0"})
+        process = self._ctx.Process(
+            target=worker_main,
+            args=(worker.index, child_conn, worker.shm.name, self.slot_bytes, self.detector_backend,
+                  self.warmup_runs, self.threads_per_worker, self.redetect_every, self.roi_padding),
+            name=f"face-worker-{worker.index}",
+            daemon=True
+        )
+        with child_environment(env):
+            process.start()
+        child_conn.close()
+        worker.process, worker.conn, worker.state = process, parent_conn, "loading"
+        threading.Thread(target=self._reader, args=(worker, parent_conn), name=f"face-worker-{worker.index}-reader",
+                         daemon=True).start()
+
+    def _reader(self, worker: WorkerHandle, conn) -> None:
+        """Resolve batch futures from one worker's replies; handle its exit"""
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                break
+            kind = message[0]
+            if kind == "ready":
+                worker.info = message[1]
+                if self.detector_backend == "auto":
+                    self.detector_backend = worker.info["detector_backend"]
+                    self.detector_selection = {**worker.info["detector_selection"], "calibrated_by": worker.index}
+                with self._cond:
+                    worker.state = "ready"
+                    self._cond.notify_all()
+                print(f"✅ Face worker {worker.index} ready (pid {worker.info['pid']})")
+                self._spawn_remaining()
+            elif kind == "failed":
+                worker.state, worker.error = "failed", message[1]
+                print(f"❌ Face worker {worker.index} failed to load: {message[1]}")
+                self._spawn_remaining()
+            elif kind == "result":
+                _, batch_id, results, seconds, worker.tracking, timings = message
+                with self._cond:
+                    future, slots = worker.pending.pop(batch_id, (None, []))
+                    worker.free_slots.extend(slots)
+                    worker.outstanding -= len(slots)
+                    worker.batches += 1
+                    worker.frames += len(slots)
+                    worker.busy_seconds += seconds
+                    self._cond.notify_all()
+                if future is not None and not future.done():
+                    future.set_result((results, timings))
+        self._on_exit(worker, conn)
+
+    def _on_exit(self, worker: WorkerHandle, conn) -> None:
+        with self._cond:
+            if worker.conn is not conn:
+                return  # already replaced
+            pending, worker.pending = worker.pending, {}
+            worker.free_slots = list(range(self.slots_per_worker))
+            worker.outstanding = 0
+            was_ready = worker.state == "ready"
+            if worker.state != "failed":
+                worker.state = "exited"
+        for future, _ in pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError(f"Face worker {worker.index} exited"))
+        if was_ready and not self._closing:
+            print(f"⚠️ Face worker {worker.index} exited, restarting")
+            worker.restarts += 1
+            self._spawn(worker)
+        elif not was_ready:
+            self._spawn_remaining()  # the calibrating worker died while loading
+
+    def shutdown(self) -> None:
+        self._closing = True
+        for worker in self.workers:
+            if worker.conn is not None:
+                try:
+                    with worker.send_lock:
+                        worker.conn.send(None)
+                except (OSError, ValueError):
+                    pass
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+            if worker.shm is not None:
+                worker.shm.close()
+                worker.shm.unlink()
+                worker.shm = None
+
+    # ---- scheduling ------------------------------------------------
+
+    def home_worker(self, session_id: Optional[str]) -> Optional[int]:
+        """Index of the worker a session sticks to (None: no session, any worker)"""
+        if not session_id:
+            return None
+        return zlib.crc32(session_id.encode("utf-8")) % len(self.workers)
+
+    def _acquire(self, count: int, home: Optional[int] = None) -> Tuple[WorkerHandle, List[int]]:
+        """Reserve `count` slots on worker `home`, or the least-loaded ready worker if it is saturated.
+
+        Waits up to max_wait when no ready worker has enough free slots.
+        """
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            while True:
+                candidates = [w for w in self.workers if w.state == "ready" and len(w.free_slots) >= count]
+                if candidates:
+                    if home is not None and self.workers[home] in candidates:
+                        worker = self.workers[home]
+                        self.sticky_hits += 1
+                    else:
+                        worker = min(candidates, key=lambda w: (w.outstanding, w.busy_seconds))
+                        if home is not None:
+                            self.sticky_fallbacks += 1
+                    slots = [worker.free_slots.pop() for _ in range(count)]
+                    worker.outstanding += count
+                    return worker, slots
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not any(w.state in ("ready", "loading") for w in self.workers):
+                    raise Overloaded(503, "Face workers are busy, please retry shortly", max(1, int(self.max_wait)))
+                self._cond.wait(remaining)
+
+    def run_batch(self, jobs: List[FrameJob]) -> List[Any]:
+        """Blocking: analyse frames on one worker; one (emotion, confidence) or Exception per job"""
+        results: List[Any] = [None] * len(jobs)
+        frames: List[Tuple[int, bytes, Optional[str], Optional[str]]] = []
+        for i, (image, session_id, timings, detector) in enumerate(jobs):
+            try:
+                with stage_timer(timings, "b64decode"):
+                    raw = base64.b64decode(image.split(",")[1]) if isinstance(image, str) else image
+            except Exception as e:
+                results[i] = e
+                continue
+            if len(raw) > self.slot_bytes:
+                results[i] = ValueError(f"Frame exceeds the {self.slot_bytes} byte worker slot")
+                continue
+            frames.append((i, raw, session_id, detector))
+        if not frames:
+            return results
+
+        # One batch per home worker, so frames of different sessions still share a batch
+        by_home: Dict[Optional[int], List[Tuple[int, bytes, Optional[str], Optional[str]]]] = {}
+        for frame in frames:
+            by_home.setdefault(self.home_worker(frame[2]), []).append(frame)
+        chunks = [
+            (home, group[start:start + self.slots_per_worker])
+            for home, group in by_home.items()
+            for start in range(0, len(group), self.slots_per_worker)
+        ]
+
+        for home, chunk in chunks:
+            worker, slots = self._acquire(len(chunk), home)
+            for slot, (_, raw, _, _) in zip(slots, chunk):
+                offset = slot * self.slot_bytes
+                worker.shm.buf[offset:offset + len(raw)] = raw
+            batch_id = next(self._batch_ids)
+            future: Future = Future()
+            with self._cond:
+                # Slots go back to the pool when the worker replies, not on a timeout here
+                worker.pending[batch_id] = (future, slots)
+            try:
+                with worker.send_lock:
+                    worker.conn.send(("batch", batch_id, [(slot, len(raw), session_id, detector)
+                                                          for slot, (_, raw, session_id, detector) in zip(slots, chunk)]))
+                replies, worker_timings = future.result(timeout=self.reply_timeout)
+            except FutureTimeout:
+                replies = [TimeoutError(f"Face worker {worker.index} did not answer in {self.reply_timeout}s")] * len(chunk)
+                worker_timings = [{}] * len(chunk)
+            except (RuntimeError, OSError) as e:
+                replies, worker_timings = [e] * len(chunk), [{}] * len(chunk)
+            for (i, _, _, _), reply, frame_timings in zip(chunk, replies, worker_timings):
+                results[i] = ValueError(reply["error"]) if isinstance(reply, dict) else tuple(reply)
+                for stage, seconds in frame_timings.items():
+                    add_stage(jobs[i][2], stage, seconds)
+        return results
+
+    def analyze_job(self, job: FrameJob) -> Tuple[str, float]:
+        result = self.run_batch([job])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def drop_session(self, session_id: str) -> None:
+        """Forget a session's tracked face box in every worker"""
+        for worker in self.workers:
+            if worker.state == "ready":
+                try:
+                    with worker.send_lock:
+                        worker.conn.send(("drop", session_id))
+                except (OSError, ValueError):
+                    pass
+
+    # ---- reporting -------------------------------------------------
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "ready": self.is_ready,
+            "detector_backend": self.detector_backend,
+            "detector_selection": self.detector_selection,
+            "threads_per_worker": self.threads_per_worker,
+            "slots_per_worker": self.slots_per_worker,
+            "slot_bytes": self.slot_bytes,
+            "sticky_hits": self.sticky_hits,
+            "sticky_fallbacks": self.sticky_fallbacks,
+            "workers": [
+                {
+                    "index": w.index,
+                    "pid": w.info.get("pid"),
+                    "state": w.state,
+                    "error": w.error,
+                    "outstanding": w.outstanding,
+                    "batches": w.batches,
+                    "frames": w.frames,
+                    "busy_seconds": round(w.busy_seconds, 3),
+                    "restarts": w.restarts,
+                    "load_seconds": w.info.get("load_seconds"),
+                    "warmup_seconds": w.info.get("warmup_seconds"),
+                    "tracking": w.tracking,
+                }
+                for w in self.workers
+            ],
+        }
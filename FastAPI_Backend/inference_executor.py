@@ -0,0 +1,135 @@
+# backend/inference_executor.py
+"""
+Bounded executor for blocking model inference, shared by the face and
+speech services.
+
+Work runs on a dedicated thread pool with `concurrency` threads. Up to
+`max_queue` more requests may wait for a slot; beyond that, or when a
+request has waited longer than `max_wait`, submit() raises Overloaded so the
+endpoint can answer 429/503 immediately instead of timing out.
+submit_async() applies the same admission to a coroutine that runs on the
+event loop (an asyncio subprocess, for instance).
+"""
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict
+
+import numpy as np
+
+METRIC_WINDOW = 1024  # recent samples kept for wait/service-time percentiles
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be accepted; carries the HTTP status and Retry-After"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def percentiles_ms(samples) -> Dict[str, float]:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50": round(float(p50), 2), "p95": round(float(p95), 2), "p99": round(float(p99), 2),
+            "max": round(float(ms.max()), 2)}
+
+
+class InferenceExecutor:
+    """Thread pool with a bounded admission queue and queue/wait metrics"""
+
+    def __init__(self, concurrency: int = 2, max_queue: int = 16, max_wait: float = 5.0, name: str = "face-infer",
+                 label: str = "Face analysis"):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.label = label
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=name)
+        self._slots = None  # asyncio.Semaphore, created on the serving loop
+        self._loop = None  # the loop _slots belongs to
+
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.wait_times = deque(maxlen=METRIC_WINDOW)
+        self.service_times = deque(maxlen=METRIC_WINDOW)
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained (at least 1)"""
+        service = float(np.mean(self.service_times)) if self.service_times else 1.0
+        backlog = self.queued + self.in_flight
+        return max(1, int(np.ceil(backlog * service / self.concurrency)))
+
+    def check_admission(self) -> None:
+        """Raise Overloaded(429) if the queue is full (lets callers refuse before doing any work)"""
+        if self.queued + self.in_flight >= self.concurrency + self.max_queue:
+            self.rejected_full += 1
+            raise Overloaded(429, f"{self.label} queue is full, please retry shortly", self.retry_after())
+
+    async def submit(self, fn: Callable, *args) -> Any:
+        return await self._run(lambda: asyncio.get_running_loop().run_in_executor(self._pool, fn, *args))
+
+    async def submit_async(self, fn: Callable[..., Awaitable], *args) -> Any:
+        return await self._run(lambda: fn(*args))
+
+    async def _run(self, start: Callable[[], Awaitable]) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new loop (tests, scripts calling asyncio.run() repeatedly):
+            # a semaphore can only be awaited on the loop it was first used on
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        slots = self._slots
+
+        self.check_admission()
+
+        self.queued += 1
+        enqueued = time.perf_counter()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            raise Overloaded(503, f"{self.label} is overloaded, please retry shortly", self.retry_after())
+        finally:
+            self.queued -= 1
+
+        self.wait_times.append(time.perf_counter() - enqueued)
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            result = await start()
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.service_times.append(time.perf_counter() - started)
+            self.in_flight -= 1
+            slots.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "max_wait_s": self.max_wait,
+            "queue_depth": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected_queue_full": self.rejected_full,
+            "rejected_wait_timeout": self.rejected_timeout,
+            "wait_ms": percentiles_ms(self.wait_times),
+            "service_ms": percentiles_ms(self.service_times),
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
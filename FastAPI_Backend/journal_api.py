@@ -1,23 +1,39 @@
 # backend/journal_api.py
-from fastapi import FastAPI, APIRouter, HTTPException, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional, Any
-from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Any, Tuple
+from datetime import datetime, timedelta, timezone
 from bson import ObjectId
-from pymongo import MongoClient
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 from collections import Counter
+import numpy as np
 import re
 import random
 import os
+import bisect
+import csv
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import threading
+import zlib
 from dotenv import load_dotenv
-import sys
-from pymongo.errors import ConnectionFailure, ConfigurationError
 
 # -----------------------------
 # Shared Import: Text Emotion
 # -----------------------------
-from analysis_utils import analyze_text   # <-- reuse shared analyzer
+from analysis_utils import analyze_text, process_document, Document   # <-- reuse shared analyzer
+from journal_cache import ResponseCache, TTLCache, VersionTracker, make_etag, etag_matches
+from journal_series import DOWNSAMPLE_METHODS, lttb_indices, bucket_average
+from journal_similarity import SimilarityIndexStore, entry_vector
+from journal_db import MongoConnectionManager
+from journal_storage import JournalStore, MongoJournalStore, SQLiteJournalStore
+from journal_archive import JournalArchive, compact
 
 # -----------------------------
 # FastAPI Setup
@@ -26,85 +42,93 @@ app = FastAPI(title="Journal API", version="1.0.0")
 router = APIRouter(prefix="/journal", tags=["Journal"])
 
 # -----------------------------
-# MongoDB Setup - UPDATED TO USE MONGODB_URI
+# Storage Setup - MongoDB (default) or embedded SQLite
 # -----------------------------
 # Load environment variables
 load_dotenv()
 
+# "mongo" (default) or "sqlite" for single-node / local benchmark deployments
+JOURNAL_BACKEND = os.getenv("JOURNAL_BACKEND", "mongo").lower()
+SQLITE_PATH = os.getenv("JOURNAL_SQLITE_PATH", "journal.db")
+
 # Use the same environment variable name as main server
 MONGO_URI = os.getenv("MONGODB_URI")
 
-if not MONGO_URI:
-    print("ERROR: MONGODB_URI environment variable is not set")
-    sys.exit(1)
+# The active storage backend (None while MongoDB is unavailable)
+store: Optional[JournalStore] = None
 
-# Initialize client and database variables
-client = None
-db = None
-journal_collection = None
+JOURNAL_INDEXES = [
+    ("journals", [("user_id", 1), ("datetime", -1)], {}),
+    ("journals", [("datetime", -1)], {}),
+    ("journals", [("user_id", 1), ("created_at", -1)], {}),
+    ("journals", [("text", "text")], {}),
+    ("journal_versions", [("user_id", 1)], {"unique": True}),
+]
 
-def connect_to_mongodb():
-    """Initialize MongoDB connection with error handling"""
-    global client, db, journal_collection
-    
-    try:
-        print(f"Attempting to connect to MongoDB...")
-        
-        # Create client with timeout settings
-        client = MongoClient(
-            MONGO_URI,
-            serverSelectionTimeoutMS=10000,  # 10 second timeout
-            connectTimeoutMS=10000,
-            socketTimeoutMS=10000,
-            retryWrites=True,
-            w='majority'
-        )
-        
-        # Test the connection
-        client.admin.command('ping')
-        
-        # Initialize database and collection
-        db = client["feelwise_db"]
-        journal_collection = db["journals"]
-        
-        # Create indexes for better performance
-        journal_collection.create_index([("user_id", 1), ("datetime", -1)])
-        journal_collection.create_index([("datetime", -1)])
-        
-        print("✅ MongoDB connected successfully")
-        return True
-        
-    except (ConnectionFailure, ConfigurationError) as e:
-        print(f"❌ MongoDB connection failed: {e}")
-        print("⚠️  Server will run without database functionality")
-        client = None
-        db = None
-        journal_collection = None
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected MongoDB error: {e}")
-        client = None
-        db = None
-        journal_collection = None
-        return False
-
-# Try to connect at startup
-mongodb_connected = connect_to_mongodb()
-
-# Add a dependency to check if MongoDB is available
-def check_mongodb_connection():
-    """Check if MongoDB is connected before processing requests"""
-    if not mongodb_connected or journal_collection is None:
-        raise HTTPException(
-            status_code=503, 
-            detail="Database service temporarily unavailable. Please try again later."
-        )
+def on_mongodb_connected(database):
+    """Switch requests over to a freshly connected database"""
+    global store
+    store = MongoJournalStore(database)
+
+def on_mongodb_disconnected():
+    """Drop the store so requests fail fast with 503 instead of timing out"""
+    global store
+    store = None
+    print("⚠️  Server will run without database functionality until MongoDB is back")
+
+# Connects (and reconnects) in the background; the app starts immediately
+mongo_manager = None
+if JOURNAL_BACKEND == "mongo":
+    mongo_manager = MongoConnectionManager(
+        MONGO_URI,
+        "feelwise_db",
+        JOURNAL_INDEXES,
+        on_connect=on_mongodb_connected,
+        on_disconnect=on_mongodb_disconnected,
+        ping_interval=float(os.getenv("MONGODB_PING_INTERVAL", "10")),
+        backoff_max=float(os.getenv("MONGODB_BACKOFF_MAX", "30")),
+        breaker_threshold=int(os.getenv("MONGODB_BREAKER_THRESHOLD", "5")),
+        breaker_cooldown=float(os.getenv("MONGODB_BREAKER_COOLDOWN", "60")),
+    )
+
+@app.on_event("startup")
+def open_storage():
+    global store
+    if JOURNAL_BACKEND == "sqlite":
+        store = SQLiteJournalStore(SQLITE_PATH)
+        print(f"✅ Using SQLite journal storage at {SQLITE_PATH}")
+    else:
+        mongo_manager.start()
+
+@app.on_event("shutdown")
+def close_storage():
+    global store
+    if mongo_manager is not None:
+        mongo_manager.stop()
+    if store is not None:
+        store.close()
+        store = None
 
-# # Create indexes for better performance
-# journal_collection.create_index([("user_id", 1), ("datetime", -1)])
-# journal_collection.create_index([("datetime", -1)])
+def storage_status() -> Dict[str, Any]:
+    """Backend name plus connection state, for /health and /ready"""
+    if mongo_manager is not None:
+        return {"backend": "mongo", **mongo_manager.status()}
+    return {"backend": JOURNAL_BACKEND, "state": "connected" if store else "starting", "ready": store is not None}
 
+def report_storage_error(error: Exception) -> None:
+    """Let the connection monitor re-check MongoDB right away when a request hits a connection error"""
+    if mongo_manager is not None:
+        mongo_manager.report_failure(error)
 
+# Add a dependency to check if storage is available
+def check_storage_connection():
+    """Check if the database is available before processing requests"""
+    if store is None:
+        raise HTTPException(
+            status_code=503, 
+            detail="Database service temporarily unavailable. Please try again later.",
+            headers={"Retry-After": "5"}
+        )
 
 # -----------------------------
 # Constants
@@ -126,6 +150,53 @@ MOOD_EMOJIS = {
     "angry": "😠"
 }
 
+# Fields a caller may request from /journal/export (default: all of them)
+EXPORT_FIELDS = [
+    "_id", "datetime", "text", "mood", "prompt", "ai_summary", "dominant_mood",
+    "mood_scores", "keywords", "suggestion", "sentiment_score",
+    "emotion_distribution", "created_at"
+]
+# Incremental export watermarks stay this far behind the newest write, so a
+# save still in flight in another worker (created_at assigned, not yet
+# committed) is picked up by the next export instead of falling behind it
+EXPORT_SETTLE_SECONDS = float(os.getenv("JOURNAL_EXPORT_SETTLE_SECONDS", "5"))
+# Stop words ignored by keyword extraction
+KEYWORD_STOP_WORDS = frozenset({
+    'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'was', 'were',
+    'is', 'are', 'am', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will',
+    'would', 'could', 'should', 'may', 'might', 'must', 'can', 'a', 'an', 'this', 'that', 'these',
+    'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them', 'my',
+    'your', 'his', 'its', 'our', 'their'
+})
+NON_WORD_CHARS = re.compile(r'[^\w\s]')
+
+# Emotion-vector similarity index (memory-mapped, one folder per user)
+SIMILARITY_INDEX_DIR = os.getenv("JOURNAL_INDEX_DIR", "journal_index")
+SIMILARITY_FIELDS = ["_id", "datetime", "emotion_distribution", "mood_scores", "sentiment_score"]
+
+# Named ranges accepted by /insights
+INSIGHTS_RANGES = ("7d", "30d", "90d", "all")
+
+# Fields /insights needs from each entry
+INSIGHTS_FIELDS = ["datetime", "mood_scores", "dominant_mood", "sentiment_score", "keywords"]
+
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+# Response cache for /entries and /insights (invalidated by per-user versions)
+RESPONSE_CACHE_SIZE = int(os.getenv("JOURNAL_CACHE_SIZE", "1024"))
+VERSION_TTL_SECONDS = float(os.getenv("JOURNAL_VERSION_TTL", "2"))
+
+# Retention tiering: entries older than JOURNAL_ARCHIVE_AFTER_DAYS move to
+# compressed segments under JOURNAL_ARCHIVE_DIR (0 disables compaction)
+ARCHIVE_DIR = os.getenv("JOURNAL_ARCHIVE_DIR", "journal_archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("JOURNAL_ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("JOURNAL_ARCHIVE_INTERVAL", "21600"))
+ARCHIVE_COMPRESSION = os.getenv("JOURNAL_ARCHIVE_COMPRESSION", "zstd")
+
+# Preview analyses from /analyze kept for reuse by /entry
+ANALYSIS_CACHE_SIZE = int(os.getenv("JOURNAL_ANALYSIS_CACHE_SIZE", "512"))
+ANALYSIS_TTL_SECONDS = float(os.getenv("JOURNAL_ANALYSIS_TTL", "900"))
+
 PROMPTS = [
     "What was the best part of your day?",
     "What challenged you today and how did you respond?",
@@ -155,6 +226,7 @@ class JournalEntryRequest(BaseModel):
     mood: Optional[str] = "neutral"
     prompt: Optional[str] = ""
     datetime: Optional[str] = None
+    analysis_token: Optional[str] = None  # returned by /analyze for the same text
 
 class JournalEntryResponse(BaseModel):
     success: bool
@@ -171,11 +243,118 @@ class InsightsResponse(BaseModel):
     dates: List[str]
     scores: List[float]
     keywords: List[Dict[str, Any]]
+    timestamps: List[str] = []  # ISO 8601, parallel to dates/scores
+    average_score: Optional[float] = None
+
+class MultiRangeInsightsResponse(BaseModel):
+    ranges: Dict[str, InsightsResponse]
 
 # -----------------------------
 # Utility Functions
 # -----------------------------
 sentiment_analyzer = SentimentIntensityAnalyzer()
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_SIZE)
+version_tracker = VersionTracker(ttl_seconds=VERSION_TTL_SECONDS)
+analysis_cache = TTLCache(max_entries=ANALYSIS_CACHE_SIZE, ttl_seconds=ANALYSIS_TTL_SECONDS)
+similarity_store = SimilarityIndexStore(SIMILARITY_INDEX_DIR)
+archive = JournalArchive(ARCHIVE_DIR, compression=ARCHIVE_COMPRESSION)
+
+def text_hash(text: str) -> str:
+    """Content hash used to key preview analyses"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def get_or_analyze(text: str, analysis_token: Optional[str] = None) -> Dict[str, Any]:
+    """Reuse the /analyze preview for this exact text if the token matches, else recompute"""
+    if analysis_token and analysis_token == text_hash(text):
+        cached = analysis_cache.get(analysis_token)
+        if cached is not None:
+            return cached
+    return analyze_text_complete(text)
+
+def get_user_version(user_id: str, fresh: bool = False) -> int:
+    """Current write version for a user, shared across workers via the database"""
+    return version_tracker.current(user_id, store.get_version, fresh=fresh)
+
+def bump_user_version(user_id: str) -> int:
+    """Invalidate cached responses for a user after a write or delete"""
+    version = store.bump_version(user_id)
+    version_tracker.set(user_id, version)
+    return version
+
+def entry_day(dt_str: str) -> int:
+    """Calendar day of a stored datetime string, as a date ordinal"""
+    return datetime.fromisoformat(dt_str.replace('Z', '+00:00')).date().toordinal()
+
+def chain_entries(*cursors):
+    """Archived then hot entries as one closable stream"""
+    try:
+        for cursor in cursors:
+            yield from cursor
+    finally:
+        for cursor in cursors:
+            close = getattr(cursor, "close", None)
+            if close:
+                close()
+
+def get_similarity_index(user_id: str):
+    """The user's emotion index, rebuilt from storage if it lags the stored version.
+
+    Blocking (storage reads, an O(n) rebuild): call it through run_in_threadpool.
+    """
+    index = similarity_store.get(user_id)
+    version = get_user_version(user_id)
+    if index.current_version() != version:
+        rows = []
+        docs = chain_entries(
+            archive.iter_entries(user_id, fields=SIMILARITY_FIELDS),
+            store.find_range(user_id, fields=SIMILARITY_FIELDS)
+        )
+        for doc in docs:
+            try:
+                rows.append((bytes.fromhex(doc["_id"]), entry_vector(doc), entry_day(doc["datetime"])))
+            except (KeyError, ValueError, AttributeError):
+                continue
+        index.rebuild(rows, version)
+    return index
+
+def update_similarity_index(user_id: str, version: int, apply) -> None:
+    """Apply an incremental change if the index was current just before this write.
+
+    Otherwise (another worker wrote in between, or it was never built) it is
+    left stale and rebuilt on the next similarity query. The check and the
+    change happen under the index's inter-process lock, which may wait on
+    another worker's rebuild: call it through run_in_threadpool.
+    """
+    try:
+        similarity_store.get(user_id).apply_update(version, apply)
+    except Exception as e:
+        print(f"⚠️  Similarity index update failed for {user_id}: {e}")
+
+def cached_response(request: Request, user_id: str, endpoint: str, params: tuple, builder):
+    """Serve a user-scoped GET from the response cache, honouring If-None-Match.
+
+    The cache key includes the user's write version and today's date (streaks
+    and relative ranges roll over at midnight even without writes). A
+    revalidation reads the stored version, not this worker's copy, so another
+    worker's write is never answered with 304.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    version = get_user_version(user_id, fresh=bool(if_none_match))
+    key = (user_id, endpoint, params, version, datetime.now().date().isoformat())
+    etag = make_etag(*key)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag_matches(if_none_match, etag):
+        response_cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+
+    cached = response_cache.get(key)
+    if cached is not None:
+        return JSONResponse(content=cached[1], headers=headers)
+
+    payload = jsonable_encoder(builder())
+    response_cache.put(key, etag, payload)
+    return JSONResponse(content=payload, headers=headers)
 
 def convert_objectid_to_str(doc):
     """Convert MongoDB ObjectId to string for JSON serialization"""
@@ -191,9 +370,9 @@ def convert_objectid_to_str(doc):
                 doc[key] = [convert_objectid_to_str(item) if isinstance(item, dict) else item for item in value]
     return doc
 
-def summarize_text(text: str, max_words: int = 15) -> str:
+def summarize_text(text: str, max_words: int = 15, doc: Optional[Document] = None) -> str:
     """Create a concise summary of the text"""
-    sentences = re.split(r'[.!?]+', text.strip())
+    sentences = doc.sentences if doc is not None else re.split(r'[.!?]+', text.strip())
     if not sentences:
         return "No summary available"
     
@@ -206,14 +385,23 @@ def summarize_text(text: str, max_words: int = 15) -> str:
     else:
         return " ".join(words[:max_words]) + "..."
 
-def extract_keywords(text: str, top_n: int = 8) -> List[str]:
-    """Extract meaningful keywords from text"""
-    # Remove common stop words and short words
-    stop_words = {'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'was', 'were', 'is', 'are', 'am', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'a', 'an', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them', 'my', 'your', 'his', 'her', 'its', 'our', 'their'}
+def extract_keywords(text: str, top_n: int = 8, doc: Optional[Document] = None) -> List[str]:
+    """Extract meaningful keywords from text (from the shared tokens when `doc` is given)"""
+    if doc is None:
+        # Strip punctuation before splitting, so contractions stay one keyword: "don't" -> "dont"
+        candidates = NON_WORD_CHARS.sub('', text.lower()).split()
+    else:
+        # word_tokenize splits contractions ("do", "n't"); glue the clitic back on
+        candidates = []
+        for token in doc.tokens:
+            word = NON_WORD_CHARS.sub('', token)
+            if candidates and (token == "n't" or (token.startswith("'") and word)):
+                candidates[-1] += word
+            elif word:
+                candidates.append(word)
     
-    # Clean and tokenize
-    clean_text = re.sub(r'[^\w\s]', '', text.lower())
-    words = [w for w in clean_text.split() if len(w) > 3 and w not in stop_words]
+    # Remove common stop words and short words
+    words = [w for w in candidates if len(w) > 3 and w not in KEYWORD_STOP_WORDS]
     
     # Get most common words
     most_common = Counter(words).most_common(top_n)
@@ -280,52 +468,87 @@ def calculate_mood_score(emotion: str, sentiment_score: float) -> float:
     final_score = (emotion_score * 0.6) + (sentiment_normalized * 0.4)
     return round(max(0, min(1, final_score)), 2)
 
+def entry_mood_score(entry: Dict[str, Any]) -> float:
+    """Mood score plotted by /insights for one stored entry"""
+    mood_scores = entry.get("mood_scores", {})
+    if mood_scores:
+        # Average of positive emotions
+        return mood_scores.get(entry.get("dominant_mood", "neutral"), 0.5)
+    # Fallback to sentiment
+    sentiment = entry.get("sentiment_score", 0)
+    return (sentiment + 1) / 2  # Convert -1,1 to 0,1
+
 def get_user_streak(user_id: str = "default_user") -> int:
     """Calculate current streak of consecutive journaling days"""
-    entries = list(journal_collection.find(
-        {"user_id": user_id}
-    ).sort("datetime", -1).limit(30))
-    
-    if not entries:
-        return 0
-    
-    # Convert datetime strings to dates
-    entry_dates = []
-    for entry in entries:
-        dt_str = entry.get('datetime', '')
-        try:
-            dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
-            entry_dates.append(dt.date())
-        except:
-            continue
-    
-    if not entry_dates:
-        return 0
-    
-    # Remove duplicates and sort
-    unique_dates = sorted(set(entry_dates), reverse=True)
-    
-    # Count consecutive days from today
-    today = datetime.now().date()
-    streak = 0
-    
-    for i, date in enumerate(unique_dates):
-        expected_date = today - timedelta(days=i)
-        if date == expected_date:
-            streak += 1
-        else:
-            break
-    
-    return streak
+    return store.streak(user_id, datetime.now().date())
+
+def export_value(value):
+    """Convert a stored value into something JSON/CSV can serialize"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def drain_export_buffer(buffer: io.StringIO, compressor) -> bytes:
+    """Take everything written to the buffer so far, gzip it if requested"""
+    chunk = buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate(0)
+    if compressor is not None:
+        chunk = compressor.compress(chunk)
+    return chunk
+
+def stream_export(cursor, fields: List[str], fmt: str, compress: bool):
+    """Yield an export body chunk by chunk straight off a MongoDB cursor.
+
+    Only one flush buffer (~EXPORT_FLUSH_BYTES) is held in memory at a time,
+    no matter how many entries the user has.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits=31 -> gzip framing
+    buffer = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+
+    try:
+        for doc in cursor:
+            values = [export_value(doc.get(field)) for field in fields]
+            if writer is not None:
+                writer.writerow([
+                    json.dumps(v, default=str, ensure_ascii=False) if isinstance(v, (dict, list))
+                    else ("" if v is None else v)
+                    for v in values
+                ])
+            else:
+                buffer.write(json.dumps(dict(zip(fields, values)), default=str, ensure_ascii=False))
+                buffer.write("\n")
+
+            if buffer.tell() >= EXPORT_FLUSH_BYTES:
+                chunk = drain_export_buffer(buffer, compressor)
+                if chunk:
+                    yield chunk
+
+        chunk = drain_export_buffer(buffer, compressor)
+        if chunk:
+            yield chunk
+        if compressor is not None:
+            yield compressor.flush()
+    finally:
+        cursor.close()
 
 def analyze_text_complete(text: str) -> Dict[str, Any]:
     """Complete text analysis combining multiple approaches"""
-    # Sentiment analysis
+    # Normalize, split and tokenize once; every stage below reuses it
+    doc = process_document(text)
+    
+    # Sentiment analysis (VADER needs the raw text for its caps/punctuation cues)
     sentiment = sentiment_analyzer.polarity_scores(text)
     sentiment_score = sentiment["compound"]
     
     # Emotion analysis (reuse shared analyzer)
-    emotion_result = analyze_text(text)
+    emotion_result = analyze_text(text, doc)
     dominant_emotion = emotion_result["emotion"]
     
     # Map emotion to mood
@@ -335,10 +558,10 @@ def analyze_text_complete(text: str) -> Dict[str, Any]:
     mood_score = calculate_mood_score(dominant_emotion, sentiment_score)
     
     # Extract keywords
-    keywords = extract_keywords(text)
+    keywords = extract_keywords(text, doc=doc)
     
     # Generate summary
-    summary = summarize_text(text)
+    summary = summarize_text(text, doc=doc)
     
     # Generate suggestion
     suggestion = generate_suggestions(dominant_emotion, mapped_mood, sentiment_score)
@@ -378,7 +601,9 @@ async def analyze_text_endpoint(req: AnalyzeRequest):
         raise HTTPException(status_code=400, detail="Text is required for analysis")
     try:
         analysis = analyze_text_complete(req.text)
-        return analysis
+        token = text_hash(req.text)
+        analysis_cache.put(token, analysis)
+        return {**analysis, "analysis_token": token}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
@@ -386,14 +611,14 @@ async def analyze_text_endpoint(req: AnalyzeRequest):
 @router.post("/entry")
 async def save_entry(entry: JournalEntryRequest, user_id: str = Query(default="default_user")):
     """Save a new journal entry"""
-    check_mongodb_connection()  # Add this line
+    check_storage_connection()  # Add this line
     
     if not entry.text.strip():
         raise HTTPException(status_code=400, detail="Entry text cannot be empty")
     
     try:
-        # Analyze the text
-        analysis = analyze_text_complete(entry.text)
+        # Analyze the text (or reuse the preview from /analyze)
+        analysis = get_or_analyze(entry.text, entry.analysis_token)
         
         # Parse datetime
         entry_datetime = datetime.now()
@@ -421,12 +646,17 @@ async def save_entry(entry: JournalEntryRequest, user_id: str = Query(default="d
         }
         
         # Save to database
-        result = journal_collection.insert_one(doc)
-        doc["_id"] = str(result.inserted_id)
+        entry_id = store.insert_entry(doc)
+        doc["_id"] = entry_id
+        version = bump_user_version(user_id)
+        await run_in_threadpool(
+            update_similarity_index, user_id, version,
+            lambda index: index.add(bytes.fromhex(entry_id), entry_vector(doc), entry_datetime.date().toordinal())
+        )
         
         # Calculate streak and count
         streak_count = get_user_streak(user_id)
-        entries_count = journal_collection.count_documents({"user_id": user_id})
+        entries_count = store.count_entries(user_id)
         
         return JournalEntryResponse(
             success=True,
@@ -438,163 +668,506 @@ async def save_entry(entry: JournalEntryRequest, user_id: str = Query(default="d
     except HTTPException:
         raise  # Re-raise HTTP exceptions
     except Exception as e:
+        report_storage_error(e)
         raise HTTPException(status_code=500, detail=f"Failed to save entry: {str(e)}")
 
+def build_entries_response(range: str, user_id: str) -> EntriesResponse:
+    """Query entries, count and streak for /entries"""
+    # Calculate date filter
+    now = datetime.now()
+    if range == "7d":
+        start_date = now - timedelta(days=7)
+    elif range == "30d":
+        start_date = now - timedelta(days=30)
+    elif range == "90d":
+        start_date = now - timedelta(days=90)
+    elif range.startswith("search:"):
+        # Simple search functionality
+        search_term = range.replace("search:", "").strip()
+        if search_term:
+            entries = store.search(user_id, search_term, limit=50)
+            if len(entries) < 50:
+                entries += archive.search(user_id, search_term, limit=50 - len(entries))
+        else:
+            entries = []
+    else:  # "all"
+        start_date = datetime.min
+    
+    if not range.startswith("search:"):
+        # Date range query
+        entries = list(store.find_range(user_id, start=start_date.isoformat(), descending=True, limit=100))
+        if len(entries) < 100:
+            # Older history continues in the archive; skip ids a crashed compaction left in both tiers
+            seen = {str(entry.get("_id")) for entry in entries}
+            older = (
+                doc for doc in archive.iter_entries(user_id, start=start_date.isoformat(), descending=True)
+                if doc["_id"] not in seen
+            )
+            entries += itertools.islice(older, 100 - len(entries))
+    
+    # Convert ObjectIds to strings
+    for entry in entries:
+        convert_objectid_to_str(entry)
+    
+    # Calculate stats
+    entries_count = store.count_entries(user_id) + archive.count(user_id)
+    streak_count = get_user_streak(user_id)
+    
+    return EntriesResponse(
+        entries=entries,
+        entries_count=entries_count,
+        streak_count=streak_count
+    )
+
 @router.get("/entries")
 async def get_entries(
+    request: Request,
     range: str = Query(default="30d"),
     user_id: str = Query(default="default_user")
 ):
     """Get journal entries for a user within a date range"""
-    check_mongodb_connection()  # Add this line
+    check_storage_connection()  # Add this line
     
     try:
-        # Calculate date filter
-        now = datetime.now()
-        if range == "7d":
-            start_date = now - timedelta(days=7)
-        elif range == "30d":
-            start_date = now - timedelta(days=30)
-        elif range == "90d":
-            start_date = now - timedelta(days=90)
-        elif range.startswith("search:"):
-            # Simple search functionality
-            search_term = range.replace("search:", "").strip()
-            if search_term:
-                entries = list(journal_collection.find({
-                    "user_id": user_id,
-                    "$text": {"$search": search_term}
-                }).sort("datetime", -1).limit(50))
-            else:
-                entries = []
-        else:  # "all"
-            start_date = datetime.min
-        
-        if not range.startswith("search:"):
-            # Date range query
-            entries = list(journal_collection.find({
-                "user_id": user_id,
-                "datetime": {"$gte": start_date.isoformat()}
-            }).sort("datetime", -1).limit(100))
-        
-        # Convert ObjectIds to strings
-        for entry in entries:
-            convert_objectid_to_str(entry)
-        
-        # Calculate stats
-        entries_count = journal_collection.count_documents({"user_id": user_id})
-        streak_count = get_user_streak(user_id)
-        
-        return EntriesResponse(
-            entries=entries,
-            entries_count=entries_count,
-            streak_count=streak_count
+        return cached_response(
+            request, user_id, "entries", (range,),
+            lambda: build_entries_response(range, user_id)
         )
-        
     except HTTPException:
         raise  # Re-raise HTTP exceptions
     except Exception as e:
+        report_storage_error(e)
         raise HTTPException(status_code=500, detail=f"Failed to get entries: {str(e)}")
 
-@router.get("/insights")
-async def get_insights(
-    range: str = Query(default="30d"),
-    user_id: str = Query(default="default_user")
-):
-    """Get mood trends and keyword insights"""
-    check_mongodb_connection()  # Add this line
+def downsample_series(
+    points: List[datetime], scores: List[float], max_points: int, method: str = "lttb"
+) -> Tuple[List[datetime], List[float]]:
+    """Reduce a mood series to at most `max_points` points"""
+    if len(scores) <= max_points:
+        return points, scores
+    x = np.fromiter((p.timestamp() for p in points), dtype=np.float64, count=len(points))
+    y = np.asarray(scores, dtype=np.float64)
+    if method == "bucket":
+        bx, by = bucket_average(x, y, max_points)
+        return [datetime.fromtimestamp(t) for t in bx], [round(float(v), 2) for v in by]
+    keep = lttb_indices(x, y, max_points)
+    return [points[i] for i in keep], [scores[i] for i in keep]
+
+def format_trend_labels(points: List[datetime]) -> List[str]:
+    """Short chart labels; include the year once the series spans more than one"""
+    if points and points[0].year != points[-1].year:
+        return [p.strftime("%Y/%m/%d") for p in points]
+    return [p.strftime("%m/%d") for p in points]
+
+def range_start_date(range: str, now: datetime) -> datetime:
+    """Start of a named insights range ("7d", "30d", "90d" or "all")"""
+    if range == "7d":
+        return now - timedelta(days=7)
+    elif range == "30d":
+        return now - timedelta(days=30)
+    elif range == "90d":
+        return now - timedelta(days=90)
+    else:  # "all"
+        return datetime.min
+
+def load_trend_points(user_id: str, start_date: datetime):
+    """Fetch the mood series for a user since `start_date` in one projected, sorted query.
+
+    Returns parallel lists: raw datetime strings (as stored, ascending),
+    parsed datetimes, mood scores, weights and each entry's keywords.
+    Archived history comes first as one point per day from the archive
+    rollups, weighted by that day's entry count, with keyword counts.
+    """
+    start = start_date.isoformat()
+    entries = store.find_range(user_id, start=start, fields=INSIGHTS_FIELDS)
     
-    try:
-        # Calculate date filter
-        now = datetime.now()
-        if range == "7d":
-            start_date = now - timedelta(days=7)
-        elif range == "30d":
-            start_date = now - timedelta(days=30)
-        elif range == "90d":
-            start_date = now - timedelta(days=90)
-        else:  # "all"
-            start_date = datetime.min
-        
-        # Get entries in date range
-        entries = list(journal_collection.find({
-            "user_id": user_id,
-            "datetime": {"$gte": start_date.isoformat()}
-        }).sort("datetime", 1))
+    raw_dates = []
+    points = []
+    scores = []
+    weights = []
+    keywords = []
+    
+    for day_start, score, count, day_keywords in archive.rollup_points(user_id, start):
+        raw_dates.append(day_start)
+        points.append(datetime.fromisoformat(day_start))
+        scores.append(score)
+        weights.append(count)
+        keywords.append(day_keywords)
+    
+    for entry in entries:
+        try:
+            dt = datetime.fromisoformat(entry["datetime"].replace('Z', '+00:00'))
+            score = entry_mood_score(entry)
+            
+            raw_dates.append(entry["datetime"])
+            points.append(dt)
+            scores.append(score)
+            weights.append(1)
+            keywords.append(entry.get("keywords", []))
+            
+        except:
+            continue
+    
+    return raw_dates, points, scores, weights, keywords
+
+def build_multi_range_insights(
+    ranges: List[str], user_id: str, max_points: Optional[int] = None, method: str = "lttb"
+) -> Dict[str, InsightsResponse]:
+    """Compute insights for several ranges from a single scan of the widest one.
+
+    All ranges end "now", so each is a suffix of the widest series: its start
+    is found by binary search, its average comes from prefix sums over the
+    scores, and keyword counts grow narrowest-to-widest so every entry's
+    keywords are counted exactly once.
+    """
+    now = datetime.now()
+    starts = {r: range_start_date(r, now) for r in ranges}
+    raw_dates, points, scores, weights, keywords = load_trend_points(user_id, min(starts.values()))
+    
+    weight_array = np.asarray(weights, dtype=np.float64)
+    prefix = np.concatenate(([0.0], np.cumsum(np.asarray(scores, dtype=np.float64) * weight_array)))
+    weight_prefix = np.concatenate(([0.0], np.cumsum(weight_array)))
+    total = len(scores)
+    
+    keyword_counter = Counter()
+    counted_from = total
+    results = {}
+    for r in sorted(set(ranges), key=lambda name: starts[name], reverse=True):
+        lo = bisect.bisect_left(raw_dates, starts[r].isoformat())
+        for entry_keywords in keywords[lo:counted_from]:
+            keyword_counter.update(entry_keywords)
+        counted_from = min(counted_from, lo)
         
-        # Prepare mood trend data
-        dates = []
-        scores = []
-        all_keywords = []
+        count = weight_prefix[total] - weight_prefix[lo]
+        average = round(float((prefix[total] - prefix[lo]) / count), 3) if count else None
         
-        for entry in entries:
-            try:
-                dt = datetime.fromisoformat(entry["datetime"].replace('Z', '+00:00'))
-                dates.append(dt.strftime("%m/%d"))
-                
-                # Get mood score (fallback to sentiment-based calculation)
-                mood_scores = entry.get("mood_scores", {})
-                if mood_scores:
-                    # Average of positive emotions
-                    score = mood_scores.get(entry.get("dominant_mood", "neutral"), 0.5)
-                else:
-                    # Fallback to sentiment
-                    sentiment = entry.get("sentiment_score", 0)
-                    score = (sentiment + 1) / 2  # Convert -1,1 to 0,1
-                
-                scores.append(score)
-                
-                # Collect keywords
-                entry_keywords = entry.get("keywords", [])
-                all_keywords.extend(entry_keywords)
-                
-            except:
-                continue
-        
-        # Generate keyword frequency data
-        keyword_counter = Counter(all_keywords)
+        # Generate keyword frequency data (ties broken alphabetically so the
+        # result does not depend on the order ranges were accumulated in)
         keyword_data = [
-            {"word": word, "count": count}
-            for word, count in keyword_counter.most_common(20)
+            {"word": word, "count": n}
+            for word, n in heapq.nsmallest(20, keyword_counter.items(), key=lambda kv: (-kv[1], kv[0]))
         ]
         
-        return InsightsResponse(
-            dates=dates,
-            scores=scores,
-            keywords=keyword_data
-        )
+        range_points, range_scores = points[lo:], scores[lo:]
+        if max_points:
+            range_points, range_scores = downsample_series(range_points, range_scores, max_points, method)
         
+        results[r] = InsightsResponse(
+            dates=format_trend_labels(range_points),
+            scores=range_scores,
+            keywords=keyword_data,
+            timestamps=[p.isoformat() for p in range_points],
+            average_score=average
+        )
+    
+    return results
+
+def build_insights_response(
+    range: str, user_id: str, max_points: Optional[int] = None, method: str = "lttb"
+) -> InsightsResponse:
+    """Compute mood trend and keyword data for /insights"""
+    return build_multi_range_insights([range], user_id, max_points, method)[range]
+
+@router.get("/insights")
+async def get_insights(
+    request: Request,
+    range: str = Query(default="30d"),
+    user_id: str = Query(default="default_user"),
+    max_points: Optional[int] = Query(default=None, ge=2, le=5000),
+    downsample: str = Query(default="lttb"),
+    ranges: Optional[str] = Query(default=None)
+):
+    """Get mood trends and keyword insights
+
+    With `max_points`, the trend series is downsampled server-side using
+    `downsample=lttb` (shape-preserving) or `downsample=bucket` (time-bucket means).
+    With `ranges=7d,30d,90d`, every listed range is computed from one query
+    and returned together as {"ranges": {...}}.
+    """
+    check_storage_connection()  # Add this line
+    
+    if downsample not in DOWNSAMPLE_METHODS:
+        raise HTTPException(status_code=400, detail=f"downsample must be one of: {', '.join(DOWNSAMPLE_METHODS)}")
+    
+    if ranges:
+        requested = list(dict.fromkeys(r.strip() for r in ranges.split(",") if r.strip()))
+        unknown = [r for r in requested if r not in INSIGHTS_RANGES]
+        if unknown or not requested:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown ranges: {', '.join(unknown)}. Allowed: {', '.join(INSIGHTS_RANGES)}"
+            )
+    
+    try:
+        if ranges:
+            return cached_response(
+                request, user_id, "insights-multi", (tuple(requested), max_points, downsample),
+                lambda: MultiRangeInsightsResponse(
+                    ranges=build_multi_range_insights(requested, user_id, max_points, downsample)
+                )
+            )
+        return cached_response(
+            request, user_id, "insights", (range, max_points, downsample),
+            lambda: build_insights_response(range, user_id, max_points, downsample)
+        )
     except HTTPException:
         raise  # Re-raise HTTP exceptions
     except Exception as e:
+        report_storage_error(e)
         raise HTTPException(status_code=500, detail=f"Failed to get insights: {str(e)}")
 
+@router.get("/export")
+async def export_entries(
+    format: str = Query(default="ndjson"),
+    fields: Optional[str] = Query(default=None),
+    since: Optional[str] = Query(default=None),
+    gzip: bool = Query(default=False),
+    user_id: str = Query(default="default_user")
+):
+    """Stream a user's full journal history as NDJSON or CSV.
+
+    `since` is a watermark on the server-assigned `created_at` (write time),
+    not on the client-supplied `datetime`: only entries written after it are
+    exported, whatever date they carry. The response carries
+    `X-Export-Watermark`, which the caller passes back as `since` on the next
+    incremental export. Entries written in the last EXPORT_SETTLE_SECONDS may
+    be exported twice across consecutive exports; dedupe on `_id`.
+    """
+    check_storage_connection()
+
+    fmt = format.lower()
+    if fmt not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in selected if f not in EXPORT_FIELDS]
+        if unknown or not selected:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown export fields: {', '.join(unknown)}. Allowed: {', '.join(EXPORT_FIELDS)}"
+            )
+    else:
+        selected = list(EXPORT_FIELDS)
+
+    since_iso = None
+    if since:
+        try:
+            since_dt = datetime.fromisoformat(since.replace('Z', '+00:00'))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="since must be an ISO 8601 datetime")
+        if since_dt.tzinfo is not None:
+            since_dt = since_dt.astimezone(timezone.utc).replace(tzinfo=None)  # created_at is naive UTC
+        since_iso = since_dt.isoformat()
+
+    try:
+        # Pin the upper bound up front so the export is a consistent snapshot
+        latest = max(filter(None, (store.latest_created(user_id), archive.latest(user_id, "created_at"))), default=None)
+        until = latest if latest and (since_iso is None or latest > since_iso) else since_iso
+        settled = (datetime.utcnow() - timedelta(seconds=EXPORT_SETTLE_SECONDS)).isoformat()
+        watermark = max(filter(None, (since_iso, min(until, settled) if until else None)), default="")
+
+        # Archived (older) entries are rehydrated first so the stream stays in datetime order
+        window = dict(created_after=since_iso, created_until=until, fields=selected)
+        cursor = chain_entries(archive.iter_entries(user_id, **window), store.find_range(user_id, **window))
+    except Exception as e:
+        report_storage_error(e)
+        raise HTTPException(status_code=500, detail=f"Failed to export entries: {str(e)}")
+
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    headers = {
+        "Content-Disposition": f'attachment; filename="journal_export.{fmt}"',
+        "X-Export-Watermark": watermark,
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        stream_export(cursor, selected, fmt, gzip),
+        media_type=media_type,
+        headers=headers
+    )
+
+@router.get("/similar")
+async def get_similar_entries(
+    entry_id: str = Query(...),
+    k: int = Query(default=5, ge=1, le=50),
+    user_id: str = Query(default="default_user")
+):
+    """Find past entries whose emotional profile is closest to the given entry"""
+    check_storage_connection()
+    
+    try:
+        target = bytes.fromhex(entry_id)
+        if len(target) != 12:
+            raise ValueError(entry_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid entry_id")
+    
+    try:
+        index = await run_in_threadpool(get_similarity_index, user_id)
+        query = index.vector_for(target)
+        if query is None:
+            raise HTTPException(status_code=404, detail="Entry not found")
+        
+        neighbours = index.nearest(query, k, exclude=target)
+        ids = [raw.hex() for raw, _ in neighbours]
+        docs = store.get_entries(ids, ["datetime", "ai_summary", "dominant_mood"])
+        missing = [i for i in ids if i not in docs]
+        if missing:
+            docs.update(archive.get_entries(user_id, missing, ["datetime", "ai_summary", "dominant_mood"]))
+        results = []
+        for neighbour_id, (_, similarity) in zip(ids, neighbours):
+            doc = docs.get(neighbour_id)
+            if doc is None:
+                continue
+            results.append({
+                "entry_id": neighbour_id,
+                "similarity": round(similarity, 4),
+                "datetime": doc.get("datetime"),
+                "ai_summary": doc.get("ai_summary"),
+                "dominant_mood": doc.get("dominant_mood")
+            })
+        return {"entry_id": entry_id, "similar": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        report_storage_error(e)
+        raise HTTPException(status_code=500, detail=f"Failed to find similar entries: {str(e)}")
+
+@router.get("/similar-days")
+async def get_similar_days(
+    date: Optional[str] = Query(default=None),
+    k: int = Query(default=5, ge=1, le=50),
+    user_id: str = Query(default="default_user")
+):
+    """Find days whose average emotional profile is closest to `date` (default: today)"""
+    check_storage_connection()
+    
+    try:
+        day = datetime.fromisoformat(date).date() if date else datetime.now().date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+    
+    try:
+        index = await run_in_threadpool(get_similarity_index, user_id)
+        similar = await run_in_threadpool(index.similar_days, day.toordinal(), k)
+        return {
+            "date": day.isoformat(),
+            "similar_days": [
+                {"date": datetime.fromordinal(ordinal).date().isoformat(), "similarity": round(sim, 4)}
+                for ordinal, sim in similar
+            ]
+        }
+    except Exception as e:
+        report_storage_error(e)
+        raise HTTPException(status_code=500, detail=f"Failed to find similar days: {str(e)}")
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters for the /entries and /insights response cache"""
+    return response_cache.stats()
+
 @router.delete("/entry/{entry_id}")
-async def delete_entry(entry_id: str):
-    """Delete a journal entry"""
-    check_mongodb_connection()  # Add this line
+async def delete_entry(entry_id: str, user_id: Optional[str] = Query(default=None)):
+    """Delete a journal entry (archived entries need the owner's user_id)"""
+    check_storage_connection()  # Add this line
     
     try:
-        result = journal_collection.delete_one({"_id": ObjectId(entry_id)})
-        if result.deleted_count == 0:
+        owner = store.delete_entry(entry_id)
+        # Also tombstone an archived copy: compaction may have archived the
+        # entry just before it was deleted hot
+        archived = (owner or user_id) and archive.delete(owner or user_id, entry_id, entry_mood_score)
+        if owner is None and archived:
+            owner = user_id
+        if owner is None:
             raise HTTPException(status_code=404, detail="Entry not found")
+        version = bump_user_version(owner)
+        await run_in_threadpool(
+            update_similarity_index, owner, version, lambda index: index.remove(bytes.fromhex(entry_id))
+        )
         return {"message": "Entry deleted successfully"}
     except HTTPException:
         raise  # Re-raise HTTP exceptions
     except Exception as e:
         if "not found" in str(e):
             raise HTTPException(status_code=404, detail="Entry not found")
+        report_storage_error(e)
         raise HTTPException(status_code=500, detail=f"Failed to delete entry: {str(e)}")
 
+# -----------------------------
+# Retention: compaction into the cold archive
+# -----------------------------
+compaction_stop = threading.Event()
+compaction_status: Dict[str, Any] = {
+    "enabled": ARCHIVE_AFTER_DAYS > 0,
+    "after_days": ARCHIVE_AFTER_DAYS,
+    "compression": archive.compression,
+    "last_run": None,
+    "last_result": None,
+}
+
+def on_user_compacted(user_id: str) -> None:
+    """Entries left the hot store: invalidate caches (the similarity index rebuilds lazily)"""
+    bump_user_version(user_id)
+
+def run_compaction() -> Dict[str, Any]:
+    """Archive every entry older than the retention age, once"""
+    active = store
+    if active is None:
+        return {"skipped": "storage unavailable"}
+    cutoff = (datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+    result = compact(active, archive, cutoff, entry_mood_score, on_user_compacted)
+    compaction_status["last_run"] = datetime.now().isoformat()
+    compaction_status["last_result"] = result
+    if result.get("archived"):
+        print(f"🗄️  Archived {result['archived']} journal entries older than {cutoff}")
+    return result
+
+def compaction_loop() -> None:
+    compaction_stop.wait(10)  # let storage come up first
+    while not compaction_stop.is_set():
+        try:
+            run_compaction()
+        except Exception as e:
+            compaction_status["last_result"] = {"error": str(e)}
+            print(f"⚠️  Journal compaction failed: {e}")
+        # Retry soon while the database is down, otherwise wait a full interval
+        compaction_stop.wait(ARCHIVE_INTERVAL_SECONDS if store is not None else 60)
+
+@app.on_event("startup")
+def start_compaction():
+    if ARCHIVE_AFTER_DAYS > 0:
+        compaction_stop.clear()
+        threading.Thread(target=compaction_loop, name="journal-compaction", daemon=True).start()
+
+@app.on_event("shutdown")
+def stop_compaction():
+    compaction_stop.set()
+
 # -----------------------------
 # Mount Router & Run
 # -----------------------------
 app.include_router(router)
 
-# Health check
+# Health check (liveness: the process is up, whatever the database state)
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "service": "journal_api"}
+    return {
+        "status": "ok",
+        "service": "journal_api",
+        "database": storage_status(),
+        "response_cache": response_cache.stats(),
+        "archive": compaction_status
+    }
+
+# Readiness: only accept traffic once the database is connected
+@app.get("/ready")
+async def readiness_check():
+    status = storage_status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "not_ready", "database": status})
+    return {"status": "ready", "database": status}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,428 @@
+# backend/journal_archive.py
+"""
+Cold-tier archive for old journal entries.
+
+Compaction moves entries older than a retention age out of the hot store
+into immutable, compressed NDJSON segments (zstd when the `zstandard`
+package is installed, gzip otherwise). The hot side of the archive is one
+small JSON file per user (meta.json) holding:
+
+  segments    [{file, start, end, count, created_end}] sorted by time
+  entries     entry_id -> segment file (for deletes and dedupe)
+  rollups     day -> {count, score_sum, keywords} for insights
+  postings    word -> [entry_id, ...] for search
+  tombstones  ids deleted after they were archived
+
+Reads (history, export, search) rehydrate from the segments on demand.
+Every meta.json update (compaction, deletes) is a read-modify-write under a
+per-user lock that holds across threads and worker processes.
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from journal_similarity import file_lock
+from journal_storage import created_iso
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+SEGMENT_MAX_ENTRIES = 5000
+DELETE_BATCH_SIZE = 500  # ids per hot-store lookup/delete during compaction
+POSTING_WORD = re.compile(r"\w{3,}")
+LOCK_STALE_SECONDS = 3600
+
+
+def posting_terms(text: str) -> set:
+    """Words indexed for archived-entry search"""
+    return set(POSTING_WORD.findall((text or "").lower()))
+
+
+def json_default(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def project(doc: Dict[str, Any], fields: Optional[Iterable[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return doc
+    return {f: doc[f] for f in fields if f in doc}
+
+
+class JournalArchive:
+    """Per-user compressed segments plus hot metadata, under `root`"""
+
+    def __init__(self, root: str, compression: str = "zstd"):
+        self.root = root
+        self.compression = "zstd" if compression == "zstd" and ZSTD_AVAILABLE else "gzip"
+        self._meta_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.RLock()
+        self._user_locks: Dict[str, threading.Lock] = {}
+
+    # ---------- files ----------
+    def _user_dir(self, user_id: str) -> str:
+        return os.path.join(self.root, hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:20])
+
+    def _meta_path(self, user_id: str) -> str:
+        return os.path.join(self._user_dir(user_id), "meta.json")
+
+    @contextmanager
+    def _user_lock(self, user_id: str) -> Iterator[None]:
+        """Serialise meta.json updates for one user across threads and processes"""
+        with self._lock:
+            lock = self._user_locks.setdefault(user_id, threading.Lock())
+        os.makedirs(self._user_dir(user_id), exist_ok=True)
+        with lock, file_lock(os.path.join(self._user_dir(user_id), "meta.lock")):
+            yield
+
+    def _load_meta(self, user_id: str, fresh: bool = False) -> Dict[str, Any]:
+        """Cached meta.json; `fresh` re-reads the file (writers, under the user lock)"""
+        path = self._meta_path(user_id)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return {"segments": [], "entries": {}, "rollups": {}, "postings": {}, "tombstones": []}
+        with self._lock:
+            cached = self._meta_cache.get(user_id)
+            if cached and cached[0] == mtime and not fresh:
+                return cached[1]
+        with open(path, encoding="utf-8") as f:
+            meta = json.load(f)
+        with self._lock:
+            self._meta_cache[user_id] = (mtime, meta)
+        return meta
+
+    def _save_meta(self, user_id: str, meta: Dict[str, Any]) -> None:
+        path = self._meta_path(user_id)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+        with self._lock:
+            self._meta_cache[user_id] = (os.path.getmtime(path), meta)
+
+    def _write_segment(self, user_id: str, docs: List[Dict[str, Any]]) -> str:
+        suffix = ".ndjson.zst" if self.compression == "zstd" else ".ndjson.gz"
+        name = f"seg-{int(time.time() * 1000)}-{len(docs)}{suffix}"
+        path = os.path.join(self._user_dir(user_id), name)
+        payload = "".join(json.dumps(d, ensure_ascii=False, default=json_default) + "\n" for d in docs).encode("utf-8")
+        if self.compression == "zstd":
+            payload = zstandard.ZstdCompressor(level=10).compress(payload)
+        else:
+            payload = gzip.compress(payload, compresslevel=9)
+        with open(path + ".tmp", "wb") as f:
+            f.write(payload)
+        os.replace(path + ".tmp", path)
+        return name
+
+    def _read_segment(self, user_id: str, name: str) -> Iterator[Dict[str, Any]]:
+        path = os.path.join(self._user_dir(user_id), name)
+        with open(path, "rb") as raw:
+            if name.endswith(".zst"):
+                if not ZSTD_AVAILABLE:
+                    raise RuntimeError("zstandard is required to read archived segment " + name)
+                stream = zstandard.ZstdDecompressor().stream_reader(raw)
+            else:
+                stream = gzip.GzipFile(fileobj=raw)
+            for line in io.TextIOWrapper(stream, encoding="utf-8"):
+                if line.strip():
+                    yield json.loads(line)
+
+    # ---------- compaction ----------
+    def try_lock(self) -> Optional[str]:
+        """Cross-process compaction lock (one worker compacts at a time)"""
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, "compaction.lock")
+        try:
+            if time.time() - os.path.getmtime(path) > LOCK_STALE_SECONDS:
+                os.remove(path)  # left behind by a crashed worker
+        except OSError:
+            pass
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return path
+
+    @staticmethod
+    def release_lock(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def compact_user(
+        self, user_id: str, docs: Iterable[Dict[str, Any]], scorer: Callable[[Dict[str, Any]], float]
+    ) -> List[str]:
+        """Archive `docs` (ascending by datetime, with "_id") and return the ids now safe to delete hot.
+
+        Segments and metadata are written before returning, so a crash before
+        the caller deletes leaves duplicates that the next run skips.
+        """
+        with self._user_lock(user_id):
+            return self._compact_user(user_id, docs, scorer)
+
+    def _compact_user(self, user_id, docs, scorer) -> List[str]:
+        meta = self._load_meta(user_id, fresh=True)
+        meta = json.loads(json.dumps(meta))  # work on a copy; cached meta stays consistent
+        archived: List[str] = []
+        batch: List[Dict[str, Any]] = []
+
+        def flush_batch():
+            if not batch:
+                return
+            name = self._write_segment(user_id, batch)
+            segment = {
+                "file": name,
+                "start": batch[0]["datetime"],
+                "end": batch[-1]["datetime"],
+                "count": len(batch)
+            }
+            created = [c for c in (created_iso(doc.get("created_at")) for doc in batch) if c]
+            if created:
+                segment["created_end"] = max(created)
+            meta["segments"].append(segment)
+            for doc in batch:
+                entry_id = doc["_id"]
+                meta["entries"][entry_id] = name
+                self._add_rollup(meta, doc, scorer, +1)
+                for term in posting_terms(doc.get("text")):
+                    meta["postings"].setdefault(term, []).append(entry_id)
+            batch.clear()
+
+        for doc in docs:
+            archived.append(doc["_id"])
+            if doc["_id"] in meta["entries"]:
+                continue  # archived by an earlier, interrupted run
+            batch.append(doc)
+            if len(batch) >= SEGMENT_MAX_ENTRIES:
+                flush_batch()
+        flush_batch()
+
+        if archived:
+            meta["segments"].sort(key=lambda seg: seg["start"])
+            self._save_meta(user_id, meta)
+        return archived
+
+    @staticmethod
+    def _add_rollup(meta: Dict[str, Any], doc: Dict[str, Any], scorer, sign: int) -> None:
+        try:
+            day = datetime.fromisoformat(doc["datetime"].replace('Z', '+00:00')).date().isoformat()
+            score = float(scorer(doc))
+        except (KeyError, ValueError, AttributeError, TypeError):
+            return
+        rollup = meta["rollups"].setdefault(day, {"count": 0, "score_sum": 0.0, "keywords": {}})
+        rollup["count"] += sign
+        rollup["score_sum"] += sign * score
+        keywords = rollup["keywords"]
+        for word in doc.get("keywords") or []:
+            keywords[word] = keywords.get(word, 0) + sign
+            if keywords[word] <= 0:
+                del keywords[word]
+        if rollup["count"] <= 0:
+            del meta["rollups"][day]
+
+    # ---------- reads ----------
+    def count(self, user_id: str) -> int:
+        meta = self._load_meta(user_id)
+        return len(meta["entries"]) - len(meta["tombstones"])
+
+    def has_entries(self, user_id: str) -> bool:
+        return self.count(user_id) > 0
+
+    def latest(self, user_id: str, field: str = "datetime", after: Optional[str] = None) -> Optional[str]:
+        """Newest `field` ("datetime" or "created_at") of a live (not tombstoned) archived entry.
+
+        Only values strictly after `after` count, if it is given.
+        """
+        meta = self._load_meta(user_id)
+        bound = "end" if field == "datetime" else "created_end"
+        tombstones = set(meta["tombstones"])
+
+        def value(doc):
+            return doc.get("datetime", "") if field == "datetime" else created_iso(doc.get("created_at")) or ""
+
+        # Segments written before created_end was recorded have no bound: read them first
+        segments = sorted((s for s in meta["segments"] if after is None or s.get(bound, after + "~") > after),
+                          key=lambda seg: seg.get(bound, "~"), reverse=True)
+        if not tombstones and all(bound in seg for seg in segments):
+            return segments[0][bound] if segments else None
+        best = None
+        for segment in segments:
+            if best is not None and bound in segment and segment[bound] <= best:
+                break
+            for doc in self._read_segment(user_id, segment["file"]):
+                v = value(doc)
+                if doc["_id"] not in tombstones and v and (after is None or v > after) and (best is None or v > best):
+                    best = v
+        return best
+
+    def iter_entries(
+        self,
+        user_id: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
+        descending: bool = False,
+        start_inclusive: bool = True,
+        created_after: Optional[str] = None,
+        created_until: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Archived entries in a datetime window, same contract as JournalStore.find_range"""
+        meta = self._load_meta(user_id)
+        tombstones = set(meta["tombstones"])
+        fields = list(fields) if fields is not None else None
+        segments = [
+            s for s in meta["segments"]
+            if (start is None or s["end"] >= start) and (end is None or s["start"] <= end)
+            and (created_after is None or s.get("created_end", "~") > created_after)
+        ]
+        if descending:
+            segments = segments[::-1]
+
+        for segment in segments:
+            docs = self._read_segment(user_id, segment["file"])
+            if descending:
+                docs = reversed(list(docs))  # segments are bounded in size
+            for doc in docs:
+                dt = doc.get("datetime", "")
+                if start is not None and (dt < start if start_inclusive else dt <= start):
+                    continue
+                if end is not None and dt > end:
+                    continue
+                if doc["_id"] in tombstones:
+                    continue
+                if created_after is not None or created_until is not None:
+                    created = created_iso(doc.get("created_at"))
+                    if created is None or (created_after is not None and created <= created_after):
+                        continue
+                    if created_until is not None and created > created_until:
+                        continue
+                yield project(doc, fields)
+
+    def rollup_points(self, user_id: str, start: Optional[str] = None) -> List[Tuple[str, float, int, Dict[str, int]]]:
+        """(day ISO datetime, mean score, entry count, keyword counts) per archived day, ascending"""
+        meta = self._load_meta(user_id)
+        points = []
+        for day in sorted(meta["rollups"]):
+            day_start = day + "T00:00:00"
+            if start is not None and day_start < start:
+                continue
+            rollup = meta["rollups"][day]
+            points.append((day_start, rollup["score_sum"] / rollup["count"], rollup["count"], rollup["keywords"]))
+        return points
+
+    def search(self, user_id: str, term: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Archived entries containing every word of `term`, newest first"""
+        meta = self._load_meta(user_id)
+        words = posting_terms(term)
+        if not words:
+            return []
+        matches = None
+        for word in words:
+            ids = set(meta["postings"].get(word, ()))
+            matches = ids if matches is None else matches & ids
+            if not matches:
+                return []
+        matches -= set(meta["tombstones"])
+
+        results = []
+        for name in {meta["entries"][i] for i in matches if i in meta["entries"]}:
+            for doc in self._read_segment(user_id, name):
+                if doc["_id"] in matches:
+                    results.append(doc)
+        results.sort(key=lambda d: d.get("datetime", ""), reverse=True)
+        return results[:limit]
+
+    def get_entries(self, user_id: str, entry_ids: Iterable[str], fields: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch specific archived entries by id, keyed by id"""
+        meta = self._load_meta(user_id)
+        tombstones = set(meta["tombstones"])
+        wanted = {i for i in entry_ids if i in meta["entries"] and i not in tombstones}
+        fields = ["_id"] + [f for f in fields if f != "_id"]
+        found = {}
+        for name in {meta["entries"][i] for i in wanted}:
+            for doc in self._read_segment(user_id, name):
+                if doc["_id"] in wanted:
+                    found[doc["_id"]] = project(doc, fields)
+        return found
+
+    def delete(self, user_id: str, entry_id: str, scorer: Callable[[Dict[str, Any]], float]) -> bool:
+        """Tombstone an archived entry and take it out of the rollups"""
+        return self.delete_many(user_id, [entry_id], scorer) == 1
+
+    def delete_many(self, user_id: str, entry_ids: Iterable[str], scorer: Callable[[Dict[str, Any]], float]) -> int:
+        """Tombstone archived entries (skipping unknown or already deleted ids); return how many"""
+        entry_ids = list(entry_ids)
+        meta = self._load_meta(user_id)
+        if not any(i in meta["entries"] for i in entry_ids):
+            return 0  # nothing archived to delete; skip the lock
+        with self._user_lock(user_id):
+            meta = self._load_meta(user_id, fresh=True)
+            tombstones = set(meta["tombstones"])
+            wanted = {i for i in entry_ids if i in meta["entries"] and i not in tombstones}
+            if not wanted:
+                return 0
+            meta = json.loads(json.dumps(meta))
+            for name in {meta["entries"][i] for i in wanted}:
+                for doc in self._read_segment(user_id, name):
+                    if doc["_id"] in wanted:
+                        self._add_rollup(meta, doc, scorer, -1)
+            meta["tombstones"].extend(sorted(wanted))
+            self._save_meta(user_id, meta)
+            return len(wanted)
+
+def compact(
+    store,
+    archive: JournalArchive,
+    before: str,
+    scorer: Callable[[Dict[str, Any]], float],
+    on_user_compacted: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """Move every entry with datetime < `before` from `store` (a JournalStore) into `archive`.
+
+    Returns run stats. Holds the cross-process lock so only one worker runs it.
+    """
+    lock = archive.try_lock()
+    if lock is None:
+        return {"skipped": "another worker is compacting"}
+    started = time.monotonic()
+    stats = {"users": 0, "archived": 0, "deleted": 0, "tombstoned": 0}
+    try:
+        for user_id in store.users_before(before):
+            # end is inclusive in find_range; drop the entries that sit exactly on the cutoff
+            docs = (d for d in store.find_range(user_id, end=before) if d.get("datetime", "") < before)
+            archived = archive.compact_user(user_id, docs, scorer)
+            if not archived:
+                continue
+            stats["users"] += 1
+            stats["archived"] += len(archived)
+            # Entries deleted hot since find_range must not come back from the
+            # archive: tombstone whatever is no longer there to delete. Batches
+            # keep each $in / IN (...) list bounded for users with long histories.
+            missing = []
+            for start in range(0, len(archived), DELETE_BATCH_SIZE):
+                batch = archived[start:start + DELETE_BATCH_SIZE]
+                present = store.get_entries(batch, ["_id"])
+                stats["deleted"] += store.delete_entries(batch)
+                missing.extend(i for i in batch if i not in present)
+            stats["tombstoned"] += archive.delete_many(user_id, missing, scorer)
+            if on_user_compacted:
+                on_user_compacted(user_id)
+    finally:
+        archive.release_lock(lock)
+    stats["seconds"] = round(time.monotonic() - started, 3)
+    return stats
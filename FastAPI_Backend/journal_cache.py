@@ -0,0 +1,153 @@
+# backend/journal_cache.py
+"""
+Caching helpers for the Journal API.
+
+Every user has a version number stored in MongoDB that is bumped on each
+write/delete. Cached responses and ETags are keyed on that version, so a
+change made through any uvicorn worker invalidates every worker's cache
+as soon as they re-read the stored version. Workers re-read it at most every
+VersionTracker.ttl_seconds, so a plain GET on another worker can serve the
+previous body for up to that long; If-None-Match revalidations always read
+the stored version, so a 304 is never sent for data that has changed.
+
+TTLCache holds short-lived values such as /analyze previews that /entry
+can reuse instead of re-running the analysis.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+def make_etag(*parts: Any) -> str:
+    """Build a strong ETag from the values that fully determine a response"""
+    encoded = json.dumps(list(parts), sort_keys=True, default=str)
+    digest = hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against our ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in candidates:
+        return True
+    # Weak comparison is what RFC 7232 asks for on If-None-Match
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class ResponseCache:
+    """Thread-safe in-process LRU of encoded response payloads"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key: Tuple) -> Optional[Tuple[str, Any]]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key: Tuple, etag: str, payload: Any) -> None:
+        with self._lock:
+            self._entries[key] = (etag, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class VersionTracker:
+    """Per-user write version, read from the shared store at most every `ttl_seconds`.
+
+    Writes made by this worker update the local copy immediately; writes made
+    by other workers become visible once the local copy expires, or at once
+    with `fresh=True`.
+    """
+
+    def __init__(self, ttl_seconds: float = 2.0, max_users: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._versions: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def current(self, user_id: str, loader: Callable[[str], int], fresh: bool = False) -> int:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(user_id)
+            if not fresh and cached is not None and now - cached[1] < self.ttl_seconds:
+                return cached[0]
+        version = loader(user_id)
+        self.set(user_id, version)
+        return version
+
+    def set(self, user_id: str, version: int) -> None:
+        with self._lock:
+            self._versions[user_id] = (version, time.monotonic())
+            self._versions.move_to_end(user_id)
+            while len(self._versions) > self.max_users:
+                self._versions.popitem(last=False)
+
+
+class TTLCache:
+    """Thread-safe bounded cache whose entries expire after `ttl_seconds`"""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] <= now:
+                del self._entries[key]
+                return None
+            return item[1]
+
+    def put(self, key: str, value: Any) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            # Oldest-inserted entries expire first, so trim from the front
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or next(iter(self._entries.values()))[0] <= now
+            ):
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,196 @@
+# backend/journal_db.py
+"""
+MongoDB connection manager for the Journal API.
+
+The app starts without waiting for MongoDB. A background thread connects,
+verifies indexes, pings periodically and reconnects with exponential
+backoff. After repeated failures a circuit breaker stops hammering the
+server for a cool-down period before trying again (half-open).
+"""
+import random
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+# (collection name, [(field, direction), ...], extra create_index options)
+IndexSpec = Tuple[str, List[Tuple[str, int]], dict]
+
+
+class MongoConnectionManager:
+    """Owns the MongoClient and reports liveness/readiness of the database"""
+
+    def __init__(
+        self,
+        uri: Optional[str],
+        db_name: str,
+        indexes: List[IndexSpec],
+        on_connect: Callable = None,
+        on_disconnect: Callable = None,
+        ping_interval: float = 10.0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 60.0,
+        timeout_ms: int = 5000,
+    ):
+        self.uri = uri
+        self.db_name = db_name
+        self.indexes = indexes
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.ping_interval = ping_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.timeout_ms = timeout_ms
+
+        self.client = None
+        self.db = None
+        self.state = "unconfigured" if not uri else "starting"
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.connected_at: Optional[float] = None
+        self.next_attempt_at: Optional[float] = None
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- lifecycle ----------
+    def start(self) -> None:
+        """Start the background connect/monitor loop (returns immediately)"""
+        if not self.uri:
+            print("ERROR: MONGODB_URI environment variable is not set; database features disabled")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mongo-connection", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._drop_client()
+
+    def report_failure(self, error: Optional[Exception] = None) -> None:
+        """Ask the monitor to re-check the connection now (e.g. after a request error).
+
+        Errors that are not connection failures (bad queries, duplicate keys)
+        say nothing about the connection and are ignored.
+        """
+        if error is None or isinstance(error, ConnectionFailure):
+            self._wake.set()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == "connected" and self.db is not None
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "ready": self.is_ready,
+            "consecutive_failures": self.failures,
+            "last_error": self.last_error,
+            "connected_for_s": round(time.monotonic() - self.connected_at, 1) if self.connected_at else None,
+            "next_attempt_in_s": (
+                max(0.0, round(self.next_attempt_at - time.monotonic(), 1))
+                if self.next_attempt_at and not self.is_ready else None
+            ),
+        }
+
+    # ---------- internals ----------
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if self.is_ready:
+                delay = self.ping_interval
+                try:
+                    self.client.admin.command("ping")
+                except PyMongoError as e:
+                    print(f"❌ MongoDB ping failed: {e}")
+                    self._mark_down(e)
+                    delay = self._retry_delay()
+            else:
+                delay = self._retry_delay() if not self._connect() else self.ping_interval
+
+            self.next_attempt_at = time.monotonic() + delay
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _connect(self) -> bool:
+        self.state = "connecting"
+        client = None
+        try:
+            print("Attempting to connect to MongoDB...")
+            client = MongoClient(
+                self.uri,
+                serverSelectionTimeoutMS=self.timeout_ms,
+                connectTimeoutMS=self.timeout_ms,
+                socketTimeoutMS=10000,
+                retryWrites=True,
+                w='majority'
+            )
+            client.admin.command('ping')
+            db = client[self.db_name]
+            self._ensure_indexes(db)
+        except Exception as e:
+            print(f"❌ MongoDB connection failed: {e}")
+            if client is not None:
+                try:
+                    client.close()
+                except Exception:
+                    pass
+            self._mark_down(e)
+            return False
+
+        self.client = client
+        self.db = db
+        self.failures = 0
+        self.last_error = None
+        self.connected_at = time.monotonic()
+        self.state = "connected"
+        if self.on_connect:
+            self.on_connect(db)
+        print("✅ MongoDB connected successfully")
+        return True
+
+    def _ensure_indexes(self, db) -> None:
+        """Create only the indexes that are missing, instead of re-issuing all of them"""
+        for collection_name, keys, options in self.indexes:
+            collection = db[collection_name]
+            # Same default naming as pymongo ("user_id_1_datetime_-1", "text_text", ...)
+            name = options.get("name") or "_".join(f"{field}_{direction}" for field, direction in keys)
+            if name not in collection.index_information():
+                collection.create_index(keys, name=name, **{k: v for k, v in options.items() if k != "name"})
+
+    def _mark_down(self, error: Exception) -> None:
+        was_ready = self.is_ready
+        self.failures += 1
+        self.last_error = str(error)
+        self.connected_at = None
+        self.state = "circuit_open" if self.failures >= self.breaker_threshold else "disconnected"
+        self._drop_client()
+        if was_ready and self.on_disconnect:
+            self.on_disconnect()
+
+    def _drop_client(self) -> None:
+        if self.client is not None:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+        self.client = None
+        self.db = None
+
+    def _retry_delay(self) -> float:
+        if self.failures >= self.breaker_threshold:
+            # Circuit open: one half-open attempt per cool-down period
+            return self.breaker_cooldown
+        delay = min(self.backoff_max, self.backoff_base * (2 ** max(0, self.failures - 1)))
+        return delay * random.uniform(0.8, 1.2)
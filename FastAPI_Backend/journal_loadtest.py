@@ -0,0 +1,413 @@
+# backend/journal_loadtest.py
+"""
+Local load test for the Journal API.
+
+Starts journal_api against a throwaway local backend (embedded SQLite by
+default, or mongomock), seeds synthetic users with months of entries, then
+drives a weighted mix of save/list/insights/search/delete calls from many
+concurrent asyncio clients and prints a JSON report: throughput, latency
+percentiles and error rates per endpoint. Percentiles cover successful
+requests only; any failed request makes the run exit with status 1.
+
+    python journal_loadtest.py --users 20 --days 180 --clients 32 --duration 30
+    python journal_loadtest.py --backend mongomock --mix save=1,list=3,insights=3 --output run.json
+    python journal_loadtest.py --baseline run.json      # adds deltas vs. an earlier report
+
+Needs httpx (already used by FastAPI's TestClient); --transport http also
+needs uvicorn, --backend mongomock needs mongomock. mongomock has no $text
+support, so search is dropped from the mix there; use the sqlite backend when
+search latency matters.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_MIX = "save=15,list=35,insights=30,search=15,delete=5"
+OPERATIONS = ("save", "list", "insights", "search", "delete")
+
+ENTRY_TEMPLATES = [
+    "Went hiking with my family this morning and felt really grateful for the fresh air.",
+    "Work was stressful today, the deadline keeps moving and I feel overwhelmed.",
+    "Had a quiet evening reading a book, pretty calm and relaxed overall.",
+    "I'm frustrated that the meeting ran late again and nobody listened.",
+    "Spent time with friends, laughed a lot and felt loved and supported.",
+    "Couldn't sleep well, anxious about the exam next week.",
+    "Cooked a new recipe and it turned out great, proud of myself.",
+    "Nothing special happened, just a normal day at the office.",
+    "Missed my parents today, feeling a bit lonely and sad.",
+    "Finished the project finally! Excited about what comes next.",
+]
+SEARCH_TERMS = ["hiking", "work", "friends", "sleep", "project", "family", "recipe", "meeting"]
+INSIGHTS_RANGES = ["7d", "30d", "90d", "all"]
+LIST_RANGES = ["7d", "30d", "90d", "all"]
+
+
+# -----------------------------
+# App Setup
+# -----------------------------
+def load_app(backend: str, workdir: str):
+    """Import journal_api configured for a local backend under `workdir`"""
+    os.environ["JOURNAL_INDEX_DIR"] = os.path.join(workdir, "journal_index")
+    os.environ["JOURNAL_ARCHIVE_DIR"] = os.path.join(workdir, "journal_archive")
+    if backend == "sqlite":
+        os.environ["JOURNAL_BACKEND"] = "sqlite"
+        os.environ["JOURNAL_SQLITE_PATH"] = os.path.join(workdir, "journal.db")
+    elif backend == "mongomock":
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("--backend mongomock requires the mongomock package (pip install mongomock)")
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient  # before journal_db imports it
+        os.environ["JOURNAL_BACKEND"] = "mongo"
+        os.environ["MONGODB_URI"] = "mongodb://loadtest.invalid:27017"
+    else:
+        sys.exit(f"Unknown backend: {backend}")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import journal_api
+    return journal_api
+
+
+def wait_for_store(journal_api, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while journal_api.store is None:
+        if time.monotonic() > deadline:
+            sys.exit("Journal storage did not become ready")
+        time.sleep(0.05)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_http_server(app, port: int):
+    """Run uvicorn in a background thread and return the server"""
+    import uvicorn
+    # lifespan is off: main() already ran the startup hooks
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, name="loadtest-uvicorn", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 15
+    while not server.started:
+        if time.monotonic() > deadline or not thread.is_alive():
+            sys.exit("uvicorn failed to start")
+        time.sleep(0.05)
+    return server
+
+
+# -----------------------------
+# Seeding
+# -----------------------------
+def seed_users(journal_api, users: int, days: int, per_day: float, seed: int) -> Dict[str, List[str]]:
+    """Insert synthetic histories straight into the store; returns entry ids per user"""
+    rng = random.Random(seed)
+    counts = np.random.default_rng(seed).poisson(per_day, size=(users, days))
+    analyses = {text: journal_api.analyze_text_complete(text) for text in ENTRY_TEMPLATES}
+    now = datetime.now()
+    ids: Dict[str, List[str]] = {}
+    for u in range(users):
+        user_id = f"loadtest_user_{u}"
+        docs = []
+        for day in range(days):
+            # Poisson arrivals: some days skipped, some with several entries
+            for _ in range(counts[u, day]):
+                text = rng.choice(ENTRY_TEMPLATES)
+                analysis = analyses[text]
+                dt = now - timedelta(days=day, minutes=rng.randint(0, 24 * 60 - 1))
+                docs.append({
+                    "user_id": user_id,
+                    "text": text,
+                    "mood": analysis["dominant_mood"],
+                    "prompt": "",
+                    "datetime": dt.isoformat(),
+                    "ai_summary": analysis["ai_summary"],
+                    "dominant_mood": analysis["dominant_mood"],
+                    "mood_scores": analysis["mood_scores"],
+                    "keywords": analysis["keywords"],
+                    "suggestion": analysis["suggestion"],
+                    "sentiment_score": analysis["sentiment_score"],
+                    "emotion_distribution": analysis["emotion_distribution"],
+                    "created_at": dt.isoformat(),
+                })
+        ids[user_id] = journal_api.store.insert_entries(docs) if docs else []
+        journal_api.bump_user_version(user_id)
+    return ids
+
+
+# -----------------------------
+# Load Generation
+# -----------------------------
+class Recorder:
+    """Status codes per operation, and latency samples of the successful calls"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, op: str, seconds: float, status: Optional[int]) -> None:
+        self.requests[op] += 1
+        self.statuses[op][str(status) if status is not None else "exception"] += 1
+        if status is None or status >= 400:
+            self.errors[op] += 1  # a fast failure would skew the percentiles
+        else:
+            self.latencies[op].append(seconds)
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            sys.exit(f"Unknown operation in --mix: {name} (choose from {', '.join(OPERATIONS)})")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+async def run_operation(client, op: str, user_id: str, ids: Dict[str, List[str]], rng: random.Random) -> int:
+    if op == "save":
+        resp = await client.post(
+            f"/journal/entry?user_id={user_id}",
+            json={"text": rng.choice(ENTRY_TEMPLATES), "mood": "neutral"}
+        )
+        if resp.status_code == 200:
+            ids[user_id].append(resp.json()["saved_entry"]["_id"])
+        return resp.status_code
+    if op == "list":
+        resp = await client.get("/journal/entries", params={"range": rng.choice(LIST_RANGES), "user_id": user_id})
+        return resp.status_code
+    if op == "insights":
+        resp = await client.get("/journal/insights", params={"range": rng.choice(INSIGHTS_RANGES), "user_id": user_id})
+        return resp.status_code
+    if op == "search":
+        term = rng.choice(SEARCH_TERMS)
+        resp = await client.get("/journal/entries", params={"range": f"search:{term}", "user_id": user_id})
+        return resp.status_code
+    # delete: a random entry this user still has
+    pool = ids[user_id]
+    if not pool:
+        resp = await client.get("/journal/entries", params={"range": "all", "user_id": user_id})
+        return resp.status_code
+    entry_id = pool.pop(rng.randrange(len(pool)))
+    resp = await client.delete(f"/journal/entry/{entry_id}", params={"user_id": user_id})
+    return resp.status_code
+
+
+async def client_loop(client, weights, ids, recorder: Recorder, deadline: float, budget: List[int], seed: int):
+    rng = random.Random(seed)
+    ops = list(weights)
+    op_weights = [weights[o] for o in ops]
+    users = list(ids)
+    while time.monotonic() < deadline:
+        if budget[0] <= 0:
+            return
+        budget[0] -= 1
+        op = rng.choices(ops, op_weights)[0]
+        user_id = rng.choice(users)
+        started = time.perf_counter()
+        try:
+            status = await run_operation(client, op, user_id, ids, rng)
+        except Exception:
+            status = None
+        recorder.record(op, time.perf_counter() - started, status)
+
+
+async def drive_load(base_url: Optional[str], app, weights, ids, clients: int, duration: float,
+                     max_requests: int, seed: int) -> Tuple[Recorder, float]:
+    import httpx
+    if base_url:
+        transport = httpx.AsyncHTTPTransport(retries=0)
+        limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+        client = httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits, timeout=60)
+    else:
+        client = httpx.AsyncClient(base_url="http://loadtest", transport=httpx.ASGITransport(app=app), timeout=60)
+
+    recorder = Recorder()
+    budget = [max_requests if max_requests > 0 else float("inf")]
+    async with client:
+        started = time.perf_counter()
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(
+            client_loop(client, weights, ids, recorder, deadline, budget, seed + i) for i in range(clients)
+        ))
+        elapsed = time.perf_counter() - started
+    return recorder, elapsed
+
+
+# -----------------------------
+# Reporting
+# -----------------------------
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    p50, p90, p95, p99 = np.percentile(ms, [50, 90, 95, 99])
+    return {
+        "min": round(float(ms.min()), 3),
+        "mean": round(float(ms.mean()), 3),
+        "p50": round(float(p50), 3),
+        "p90": round(float(p90), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(ms.max()), 3),
+    }
+
+
+def build_report(recorder: Recorder, elapsed: float, config: Dict[str, Any]) -> Dict[str, Any]:
+    endpoints = {}
+    all_samples = []
+    total = total_errors = 0
+    for op in OPERATIONS:
+        requests = recorder.requests.get(op)
+        if not requests:
+            continue
+        samples = recorder.latencies.get(op, [])
+        all_samples.extend(samples)
+        total += requests
+        total_errors += recorder.errors[op]
+        endpoints[op] = {
+            "requests": requests,
+            "throughput_rps": round(requests / elapsed, 2),
+            "errors": recorder.errors[op],
+            "error_rate": round(recorder.errors[op] / requests, 4),
+            "status_codes": dict(recorder.statuses[op]),
+            "latency_ms": latency_summary(samples) if samples else {},
+        }
+    return {
+        "config": config,
+        "elapsed_s": round(elapsed, 3),
+        "total": {
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "errors": total_errors,
+            "error_rate": round(total_errors / total, 4) if total else 0.0,
+            "latency_ms": latency_summary(all_samples) if all_samples else {},
+        },
+        "endpoints": endpoints,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change in throughput and p50/p95/p99 against a previous report"""
+    def delta(new, old):
+        return round((new - old) / old, 4) if old else None
+
+    result = {}
+    for name in list(report["endpoints"]) + ["total"]:
+        new = report["total"] if name == "total" else report["endpoints"][name]
+        old = baseline["total"] if name == "total" else baseline.get("endpoints", {}).get(name)
+        if not old or not new.get("latency_ms") or not old.get("latency_ms"):
+            continue
+        result[name] = {
+            "throughput_rps": delta(new["throughput_rps"], old["throughput_rps"]),
+            "error_rate": round(new["error_rate"] - old["error_rate"], 4),
+            **{p: delta(new["latency_ms"][p], old["latency_ms"][p]) for p in ("p50", "p95", "p99")},
+        }
+    return result
+
+
+# -----------------------------
+# Entry Point
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Journal API against a local backend")
+    parser.add_argument("--backend", choices=["sqlite", "mongomock"], default="sqlite")
+    parser.add_argument("--transport", choices=["asgi", "http"], default="asgi",
+                        help="asgi calls the app in-process; http goes through uvicorn on a local port")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=180, help="days of history per seeded user")
+    parser.add_argument("--entries-per-day", type=float, default=1.2)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent asyncio clients")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests (0 = no limit)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation weights, e.g. save=1,list=3")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", default=None, help="data directory (default: a temporary one)")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", default=None, help="earlier report to compare against")
+    args = parser.parse_args(argv)
+
+    weights = parse_mix(args.mix)
+    if args.backend == "mongomock" and weights.pop("search", None):
+        print("mongomock has no $text index: search dropped from the mix", file=sys.stderr)
+        if not weights:
+            sys.exit("Nothing left to run in --mix")
+    workdir = args.workdir or tempfile.mkdtemp(prefix="journal_loadtest_")
+    journal_api = load_app(args.backend, workdir)
+
+    # Run the app's startup hooks (storage, background jobs) as a server would
+    journal_api.open_storage()
+    wait_for_store(journal_api)
+
+    seed_started = time.perf_counter()
+    ids = seed_users(journal_api, args.users, args.days, args.entries_per_day, args.seed)
+    seed_seconds = time.perf_counter() - seed_started
+    seeded = sum(len(v) for v in ids.values())
+    print(f"Seeded {seeded} entries for {len(ids)} users "
+          f"in {seed_seconds:.1f}s ({args.backend}, {workdir})", file=sys.stderr)
+
+    server = None
+    base_url = None
+    if args.transport == "http":
+        port = free_port()
+        server = start_http_server(journal_api.app, port)
+        base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        recorder, elapsed = asyncio.run(drive_load(
+            base_url, journal_api.app, weights, ids, args.clients, args.duration, args.requests, args.seed
+        ))
+    finally:
+        if server is not None:
+            server.should_exit = True
+        journal_api.close_storage()
+
+    config = {
+        "backend": args.backend,
+        "transport": args.transport,
+        "users": args.users,
+        "days": args.days,
+        "entries_per_day": args.entries_per_day,
+        "seeded_entries": seeded,
+        "seed_s": round(seed_seconds, 3),
+        "clients": args.clients,
+        "duration_s": args.duration,
+        "mix": weights,
+        "seed": args.seed,
+        "started_at": datetime.now().isoformat(),
+    }
+    report = build_report(recorder, elapsed, config)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["vs_baseline"] = compare(report, json.load(f))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if report["total"]["errors"]:
+        sys.exit(f"{report['total']['errors']} of {report['total']['requests']} requests failed "
+                 f"(error rate {report['total']['error_rate']:.2%})")
+
+
+if __name__ == "__main__":
+    main()
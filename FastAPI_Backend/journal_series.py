@@ -0,0 +1,64 @@
+# backend/journal_series.py
+"""
+Downsampling of mood-trend series for the Journal API.
+
+Both functions take parallel NumPy arrays of epoch seconds (x) and scores (y)
+sorted by time, so they work the same on raw entries and on pre-aggregated
+rollups.
+"""
+from typing import Tuple
+
+import numpy as np
+
+DOWNSAMPLE_METHODS = ("lttb", "bucket")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: pick `n_out` indices that keep the series' shape.
+
+    The first and last points are always kept. Every bucket in between keeps
+    the point that forms the largest triangle with the previously kept point
+    and the average of the next bucket.
+    """
+    size = len(x)
+    if n_out >= size:
+        return np.arange(size)
+    if n_out < 3:
+        return np.array([0, size - 1])[:max(n_out, 1)]
+
+    # n_out - 2 buckets over the interior points, plus a final one-point bucket
+    edges = np.linspace(1, size - 1, n_out - 1).astype(np.int64)
+    edges = np.append(edges, size)
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = size - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2]
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bx = x[start:end]
+        by = y[start:end]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def bucket_average(x: np.ndarray, y: np.ndarray, n_out: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Average points into `n_out` equal-width time buckets, dropping empty ones"""
+    if len(x) <= n_out:
+        return x, y
+    span = x[-1] - x[0]
+    if span <= 0:
+        return x[:1], np.array([y.mean()])
+
+    bins = np.minimum(((x - x[0]) / span * n_out).astype(np.int64), n_out - 1)
+    counts = np.bincount(bins, minlength=n_out)
+    sum_x = np.bincount(bins, weights=x, minlength=n_out)
+    sum_y = np.bincount(bins, weights=y, minlength=n_out)
+    filled = counts > 0
+    return sum_x[filled] / counts[filled], sum_y[filled] / counts[filled]
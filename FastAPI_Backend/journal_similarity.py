@@ -0,0 +1,319 @@
+# backend/journal_similarity.py
+"""
+Per-user emotion-vector index for "entries/days that felt like this one".
+
+Each user's index is a directory of memory-mapped arrays:
+  vectors.f32  (capacity x VECTOR_DIM) unit-length float32 emotion vectors
+  ids.bin      (capacity,) raw 12-byte ObjectIds of the entries
+  days.i32     (capacity,) proleptic ordinal of each entry's date
+  meta.json    row count, capacity, the user data version it reflects and a
+               write generation
+  index.lock   inter-process lock file
+
+Rows are kept dense: deleting an entry moves the last row into its slot, so
+queries are one matrix-vector product over `vectors[:count]`.
+
+Several API worker processes may share the files: every read and write holds
+the index's file lock and first re-reads meta.json, reopening the arrays if
+another process changed them since.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+EMOTION_DIMS = ("joy", "sadness", "anger", "fear", "surprise", "love", "neutral")
+MOOD_DIMS = ("positive", "negative", "neutral")
+VECTOR_DIM = len(EMOTION_DIMS) + len(MOOD_DIMS) + 1  # + sentiment_score
+
+INITIAL_CAPACITY = 256
+
+
+def entry_vector(doc: Dict[str, Any]) -> np.ndarray:
+    """Emotion distribution + mood scores + sentiment of an entry as a unit vector"""
+    distribution = doc.get("emotion_distribution") or {}
+    mood_scores = doc.get("mood_scores") or {}
+    values = [float(distribution.get(e, 0) or 0) / 100.0 for e in EMOTION_DIMS]
+    values += [float(mood_scores.get(m, 0) or 0) for m in MOOD_DIMS]
+    values.append(float(doc.get("sentiment_score", 0) or 0))
+    return normalize(np.asarray(values, dtype=np.float32))
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Exclusive lock on `path` across processes (flock, or msvcrt on Windows)"""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """Scale rows (or a single vector) to unit length; zero rows stay zero"""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+class EmotionIndex:
+    """Memory-mapped emotion vectors for one user"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self._depth = 0  # nesting of locked() in the thread holding it
+        self.count = 0
+        self.capacity = 0
+        self.version = -1  # unknown until loaded/rebuilt
+        self.generation = 0  # bumped by every meta.json write, from any process
+        self.vectors = None
+        self.ids = None
+        self.days = None
+        self.rows: Dict[bytes, int] = {}
+        self._load()
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Thread and file lock, with the in-memory view synced to meta.json (re-entrant)"""
+        with self.lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            os.makedirs(self.path, exist_ok=True)
+            with file_lock(self._file("index.lock")):
+                self._depth = 1
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    self._depth = 0
+
+    # ---------- storage ----------
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open(self, capacity: int, mode: str) -> None:
+        self.vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode=mode, shape=(capacity, VECTOR_DIM))
+        self.ids = np.memmap(self._file("ids.bin"), dtype="S12", mode=mode, shape=(capacity,))
+        self.days = np.memmap(self._file("days.i32"), dtype=np.int32, mode=mode, shape=(capacity,))
+        self.capacity = capacity
+
+    def _read_meta(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._file("meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _load(self, meta: Optional[Dict[str, Any]] = None) -> None:
+        meta = meta or self._read_meta()
+        self.vectors = self.ids = self.days = None
+        self.capacity = 0
+        self.rows = {}
+        try:
+            if meta is None or meta.get("dim") != VECTOR_DIM:
+                raise ValueError("no usable index")  # missing or layout changed; rebuilt on next query
+            self._open(meta["capacity"], "r+")
+            self.count = meta["count"]
+            self.version = meta["version"]
+            self.generation = meta.get("generation", 0)
+            self.rows = {bytes(self.ids[i]).ljust(12, b"\0"): i for i in range(self.count)}
+        except (OSError, ValueError, KeyError):
+            self.count = 0
+            self.version = -1
+
+    def _refresh(self) -> None:
+        """Reopen from disk if another process wrote since we last read or wrote meta.json"""
+        meta = self._read_meta()
+        if meta is None:
+            if self.version != -1 or self.count:
+                self._load(meta)
+        elif meta.get("generation", 0) != self.generation or meta.get("version") != self.version:
+            self._load(meta)
+
+    def _grow(self, needed: int) -> None:
+        if needed <= self.capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, self.capacity)
+        while capacity < needed:
+            capacity *= 2
+        os.makedirs(self.path, exist_ok=True)
+        self.flush_arrays()
+        self.vectors = self.ids = self.days = None
+        for name, itemsize in (("vectors.f32", 4 * VECTOR_DIM), ("ids.bin", 12), ("days.i32", 4)):
+            with open(self._file(name), "ab") as f:
+                f.truncate(capacity * itemsize)
+        self._open(capacity, "r+")
+
+    def flush_arrays(self) -> None:
+        for arr in (self.vectors, self.ids, self.days):
+            if arr is not None:
+                arr.flush()
+
+    def flush(self) -> None:
+        with self.locked():
+            self.flush_arrays()
+            self.generation += 1
+            tmp = self._file(f"meta.json.{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump({"count": self.count, "capacity": self.capacity, "dim": VECTOR_DIM,
+                           "version": self.version, "generation": self.generation}, f)
+            os.replace(tmp, self._file("meta.json"))
+
+    def current_version(self) -> int:
+        """The user data version the index on disk reflects (-1: none)"""
+        with self.locked():
+            return self.version
+
+    # ---------- updates ----------
+    def rebuild(self, rows: List[Tuple[bytes, np.ndarray, int]], version: int) -> None:
+        """Replace the whole index with `rows` of (entry_id, vector, day_ordinal)"""
+        with self.locked():
+            if self.version == version:
+                return  # another worker rebuilt it meanwhile
+            self.count = 0
+            self.rows = {}
+            self._grow(max(len(rows), 1))
+            for entry_id, vector, day in rows:
+                self._append(entry_id, vector, day)
+            self.version = version
+            self.flush()
+
+    def _append(self, entry_id: bytes, vector: np.ndarray, day: int) -> None:
+        self._grow(self.count + 1)
+        row = self.count
+        self.vectors[row] = vector
+        self.ids[row] = entry_id
+        self.days[row] = day
+        self.rows[entry_id] = row
+        self.count += 1
+
+    def apply_update(self, version: int, change: Callable[["EmotionIndex"], Any]) -> bool:
+        """Run `change` and move to `version` if the index is at `version - 1`; False if it is not"""
+        with self.locked():
+            if self.version != version - 1:
+                return False
+            change(self)
+            self.version = version
+            self.flush()
+            return True
+
+    def add(self, entry_id: bytes, vector: np.ndarray, day: int) -> None:
+        with self.locked():
+            if entry_id in self.rows:
+                row = self.rows[entry_id]
+                self.vectors[row] = vector
+                self.days[row] = day
+            else:
+                self._append(entry_id, vector, day)
+
+    def remove(self, entry_id: bytes) -> bool:
+        with self.locked():
+            row = self.rows.pop(entry_id, None)
+            if row is None:
+                return False
+            last = self.count - 1
+            if row != last:
+                moved = bytes(self.ids[last]).ljust(12, b"\0")
+                self.vectors[row] = self.vectors[last]
+                self.ids[row] = self.ids[last]
+                self.days[row] = self.days[last]
+                self.rows[moved] = row
+            self.count = last
+            return True
+
+    # ---------- queries ----------
+    def vector_for(self, entry_id: bytes) -> Optional[np.ndarray]:
+        with self.locked():
+            row = self.rows.get(entry_id)
+            return None if row is None else np.array(self.vectors[row])
+
+    def nearest(self, query: np.ndarray, k: int, exclude: Optional[bytes] = None) -> List[Tuple[bytes, float]]:
+        """k most similar entries by cosine similarity"""
+        with self.locked():
+            n = self.count
+            if n == 0:
+                return []
+            sims = self.vectors[:n] @ normalize(query.astype(np.float32))
+            if exclude is not None and exclude in self.rows:
+                sims[self.rows[exclude]] = -np.inf
+            k = min(k, n)
+            top = np.argpartition(-sims, k - 1)[:k]
+            top = top[np.argsort(-sims[top])]
+            return [
+                (bytes(self.ids[i]).ljust(12, b"\0"), float(sims[i]))
+                for i in top if np.isfinite(sims[i])
+            ]
+
+    def day_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Unique day ordinals and the normalized mean vector of each day"""
+        with self.locked():
+            n = self.count
+            days, inverse = np.unique(self.days[:n], return_inverse=True)
+            sums = np.empty((len(days), VECTOR_DIM), dtype=np.float32)
+            vectors = self.vectors[:n]
+            for d in range(VECTOR_DIM):
+                sums[:, d] = np.bincount(inverse, weights=vectors[:, d], minlength=len(days))
+            return days, normalize(sums)
+
+    def similar_days(self, day: int, k: int) -> List[Tuple[int, float]]:
+        """k days whose average emotional profile is closest to `day`'s"""
+        days, means = self.day_vectors()
+        match = np.searchsorted(days, day)
+        if match >= len(days) or days[match] != day:
+            return []
+        sims = means @ means[match]
+        sims[match] = -np.inf
+        k = min(k, len(days) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(int(days[i]), float(sims[i])) for i in top]
+
+
+class SimilarityIndexStore:
+    """Keeps recently used per-user indexes open, bounded by `max_open`"""
+
+    def __init__(self, root: str, max_open: int = 64):
+        self.root = root
+        self.max_open = max_open
+        self._open: "OrderedDict[str, EmotionIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> EmotionIndex:
+        with self._lock:
+            index = self._open.get(user_id)
+            if index is None:
+                folder = hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:20]
+                index = EmotionIndex(os.path.join(self.root, folder))
+                self._open[user_id] = index
+                while len(self._open) > self.max_open:
+                    _, evicted = self._open.popitem(last=False)
+                    evicted.flush_arrays()
+            self._open.move_to_end(user_id)
+            return index
@@ -0,0 +1,551 @@
+# backend/journal_storage.py
+"""
+Storage backends for the Journal API.
+
+JournalStore is the interface journal_api talks to. Two implementations:
+  - MongoJournalStore:  the production MongoDB collections
+  - SQLiteJournalStore: an embedded SQLite database in WAL mode, for
+                        single-node/edge deployments and local benchmarks
+
+Entry ids are always 24-character hex strings (ObjectId format) and stored
+datetimes are ISO 8601 strings, so range filters compare the same way on
+both backends. `created_at` is the server's write time (naive UTC); it is
+the only ordering clients cannot back-date, so incremental exports use it.
+"""
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+
+ENTRY_FIELDS = (
+    "user_id", "datetime", "text", "mood", "prompt", "ai_summary", "dominant_mood",
+    "mood_scores", "keywords", "suggestion", "sentiment_score",
+    "emotion_distribution", "created_at"
+)
+JSON_FIELDS = {"mood_scores", "keywords", "emotion_distribution"}
+
+STREAK_LOOKBACK = 30
+
+
+def created_iso(value: Any) -> Optional[str]:
+    """A stored created_at (datetime, ISO string or str(datetime)) as a naive-UTC ISO string"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat()
+    if isinstance(value, str) and value:
+        return value.replace(" ", "T", 1)
+    return None
+
+
+class JournalStore(ABC):
+    """Operations journal_api needs from a storage backend"""
+
+    backend = "abstract"
+
+    @abstractmethod
+    def insert_entry(self, doc: Dict[str, Any]) -> str:
+        """Store one entry and return its id"""
+
+    @abstractmethod
+    def insert_entries(self, docs: List[Dict[str, Any]]) -> List[str]:
+        """Store many entries in one batch and return their ids"""
+
+    @abstractmethod
+    def delete_entry(self, entry_id: str) -> Optional[str]:
+        """Delete an entry; return the owner's user_id, or None if it did not exist"""
+
+    @abstractmethod
+    def delete_entries(self, entry_ids: List[str]) -> int:
+        """Delete many entries by id in one batch; return how many were removed"""
+
+    @abstractmethod
+    def users_before(self, before: str) -> List[str]:
+        """Users that have at least one entry with datetime < `before`"""
+
+    @abstractmethod
+    def find_range(
+        self,
+        user_id: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
+        descending: bool = False,
+        limit: Optional[int] = None,
+        start_inclusive: bool = True,
+        created_after: Optional[str] = None,
+        created_until: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream a user's entries with start <= datetime <= end, sorted by datetime.
+
+        `created_after` < created_at <= `created_until` (naive-UTC ISO strings)
+        further restricts the entries by write time. `fields` limits the
+        returned keys ("_id" is included only if listed, unless `fields` is
+        None). The iterator should be closed (or exhausted) to release the
+        underlying cursor.
+        """
+
+    @abstractmethod
+    def latest_created(self, user_id: str) -> Optional[str]:
+        """Newest created_at of a user's entries, as a naive-UTC ISO string"""
+
+    @abstractmethod
+    def count_entries(self, user_id: str) -> int:
+        """Number of entries a user has"""
+
+    @abstractmethod
+    def recent_datetimes(self, user_id: str, limit: int) -> List[str]:
+        """The user's `limit` newest datetimes, newest first"""
+
+    @abstractmethod
+    def search(self, user_id: str, term: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Full-text search over a user's entry text, newest first"""
+
+    @abstractmethod
+    def get_entries(self, entry_ids: List[str], fields: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch specific entries by id, keyed by id"""
+
+    @abstractmethod
+    def get_version(self, user_id: str) -> int:
+        """Stored write version for a user (0 if never written)"""
+
+    @abstractmethod
+    def bump_version(self, user_id: str) -> int:
+        """Atomically increment and return a user's write version"""
+
+    def streak(self, user_id: str, today: Optional[date] = None) -> int:
+        """Current streak of consecutive journaling days ending today"""
+        entry_dates = set()
+        for dt_str in self.recent_datetimes(user_id, STREAK_LOOKBACK):
+            try:
+                entry_dates.add(datetime.fromisoformat(dt_str.replace('Z', '+00:00')).date())
+            except (AttributeError, ValueError):
+                continue
+
+        # Count consecutive days from today
+        today = today or datetime.now().date()
+        streak = 0
+        for i, entry_date in enumerate(sorted(entry_dates, reverse=True)):
+            if entry_date == today - timedelta(days=i):
+                streak += 1
+            else:
+                break
+        return streak
+
+    def close(self) -> None:
+        pass
+
+
+# -----------------------------
+# MongoDB
+# -----------------------------
+class MongoJournalStore(JournalStore):
+    backend = "mongo"
+    batch_size = 500
+
+    def __init__(self, database):
+        self.db = database
+        self.entries = database["journals"]
+        self.versions = database["journal_versions"]
+
+    @staticmethod
+    def _projection(fields: Optional[Iterable[str]]) -> Optional[Dict[str, int]]:
+        if fields is None:
+            return None
+        fields = list(fields)
+        projection = {f: 1 for f in fields}
+        if "_id" not in fields:
+            projection["_id"] = 0
+        return projection
+
+    @staticmethod
+    def _stringify(cursor) -> Iterator[Dict[str, Any]]:
+        try:
+            for doc in cursor:
+                if "_id" in doc:
+                    doc["_id"] = str(doc["_id"])
+                yield doc
+        finally:
+            cursor.close()
+
+    def insert_entry(self, doc):
+        result = self.entries.insert_one(doc)
+        doc.pop("_id", None)  # insert_one adds the ObjectId in place
+        return str(result.inserted_id)
+
+    def insert_entries(self, docs):
+        if not docs:
+            return []
+        result = self.entries.insert_many(docs, ordered=False)
+        for doc in docs:
+            doc.pop("_id", None)
+        return [str(i) for i in result.inserted_ids]
+
+    def delete_entry(self, entry_id):
+        deleted = self.entries.find_one_and_delete({"_id": ObjectId(entry_id)}, projection={"user_id": 1})
+        if deleted is None:
+            return None
+        return deleted.get("user_id", "default_user")
+
+    def delete_entries(self, entry_ids):
+        ids = [ObjectId(entry_id) for entry_id in entry_ids]
+        if not ids:
+            return 0
+        return self.entries.delete_many({"_id": {"$in": ids}}).deleted_count
+
+    def users_before(self, before):
+        return list(self.entries.distinct("user_id", {"datetime": {"$lt": before}}))
+
+    def find_range(self, user_id, start=None, end=None, fields=None, descending=False, limit=None, start_inclusive=True,
+                   created_after=None, created_until=None):
+        query: Dict[str, Any] = {"user_id": user_id}
+        bounds = {}
+        if start is not None:
+            bounds["$gte" if start_inclusive else "$gt"] = start
+        if end is not None:
+            bounds["$lte"] = end
+        if bounds:
+            query["datetime"] = bounds
+        created = {}
+        if created_after is not None:
+            created["$gt"] = datetime.fromisoformat(created_after)
+        if created_until is not None:
+            created["$lte"] = datetime.fromisoformat(created_until)
+        if created:
+            query["created_at"] = created
+        cursor = self.entries.find(query, self._projection(fields)).sort("datetime", -1 if descending else 1)
+        cursor = cursor.batch_size(self.batch_size)
+        if limit:
+            cursor = cursor.limit(limit)
+        return self._stringify(cursor)
+
+    def latest_created(self, user_id):
+        doc = self.entries.find_one({"user_id": user_id, "created_at": {"$ne": None}}, {"created_at": 1, "_id": 0},
+                                    sort=[("created_at", -1)])
+        return created_iso(doc["created_at"]) if doc else None
+
+    def count_entries(self, user_id):
+        return self.entries.count_documents({"user_id": user_id})
+
+    def recent_datetimes(self, user_id, limit):
+        cursor = self.entries.find({"user_id": user_id}, {"datetime": 1, "_id": 0}).sort("datetime", -1).limit(limit)
+        return [doc.get("datetime", "") for doc in cursor]
+
+    def search(self, user_id, term, limit=50):
+        cursor = self.entries.find({
+            "user_id": user_id,
+            "$text": {"$search": term}
+        }).sort("datetime", -1).limit(limit)
+        return list(self._stringify(cursor))
+
+    def get_entries(self, entry_ids, fields):
+        ids = []
+        for entry_id in entry_ids:
+            try:
+                ids.append(ObjectId(entry_id))
+            except (InvalidId, TypeError):
+                continue
+        projection = self._projection(list(fields) + ["_id"])
+        return {doc["_id"]: doc for doc in self._stringify(self.entries.find({"_id": {"$in": ids}}, projection))}
+
+    def get_version(self, user_id):
+        doc = self.versions.find_one({"user_id": user_id}, {"version": 1, "_id": 0})
+        return doc["version"] if doc else 0
+
+    def bump_version(self, user_id):
+        doc = self.versions.find_one_and_update(
+            {"user_id": user_id},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            projection={"version": 1, "_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["version"]
+
+
+# -----------------------------
+# SQLite (WAL)
+# -----------------------------
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal_entries (
+    id                   TEXT PRIMARY KEY,
+    user_id              TEXT NOT NULL,
+    datetime             TEXT NOT NULL,
+    text                 TEXT,
+    mood                 TEXT,
+    prompt               TEXT,
+    ai_summary           TEXT,
+    dominant_mood        TEXT,
+    mood_scores          TEXT,
+    keywords             TEXT,
+    suggestion           TEXT,
+    sentiment_score      REAL,
+    emotion_distribution TEXT,
+    created_at           TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_entries_user_datetime ON journal_entries (user_id, datetime);
+CREATE INDEX IF NOT EXISTS idx_entries_user_created ON journal_entries (user_id, created_at);
+CREATE TABLE IF NOT EXISTS journal_versions (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+SQLITE_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS journal_fts USING fts5(
+    text, content='journal_entries', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS journal_fts_insert AFTER INSERT ON journal_entries BEGIN
+    INSERT INTO journal_fts(rowid, text) VALUES (new.rowid, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS journal_fts_delete AFTER DELETE ON journal_entries BEGIN
+    INSERT INTO journal_fts(journal_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+END;
+"""
+
+# Statements are fixed strings so sqlite3's statement cache compiles each once
+SQL_INSERT = (
+    "INSERT INTO journal_entries (id, " + ", ".join(ENTRY_FIELDS) + ") "
+    "VALUES (?, " + ", ".join("?" for _ in ENTRY_FIELDS) + ")"
+)
+SQL_DELETE = "DELETE FROM journal_entries WHERE id = ? RETURNING user_id"
+SQL_OWNER = "SELECT user_id FROM journal_entries WHERE id = ?"
+SQL_DELETE_LEGACY = "DELETE FROM journal_entries WHERE id = ?"
+SQL_USERS_BEFORE = "SELECT DISTINCT user_id FROM journal_entries WHERE datetime < ?"
+SQL_LATEST_CREATED = "SELECT MAX(created_at) FROM journal_entries WHERE user_id = ?"
+SQL_COUNT = "SELECT COUNT(*) FROM journal_entries WHERE user_id = ?"
+SQL_RECENT = "SELECT datetime FROM journal_entries WHERE user_id = ? ORDER BY datetime DESC LIMIT ?"
+SQL_GET_VERSION = "SELECT version FROM journal_versions WHERE user_id = ?"
+SQL_BUMP_VERSION = (
+    "INSERT INTO journal_versions (user_id, version) VALUES (?, 1) "
+    "ON CONFLICT(user_id) DO UPDATE SET version = version + 1"
+)
+
+
+class SQLiteJournalStore(JournalStore):
+    """Embedded backend: one connection per thread, WAL for concurrent readers"""
+
+    backend = "sqlite"
+    fetch_size = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self.has_fts = False
+        self.has_returning = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(SQLITE_SCHEMA)
+        try:
+            conn.executescript(SQLITE_FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            pass  # SQLite built without FTS5: search falls back to LIKE
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _row_values(entry_id: str, doc: Dict[str, Any]) -> tuple:
+        values = [entry_id]
+        for field in ENTRY_FIELDS:
+            value = doc.get(field)
+            if field in JSON_FIELDS and value is not None:
+                value = json.dumps(value, ensure_ascii=False)
+            elif field == "created_at":
+                value = created_iso(value)
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            values.append(value)
+        return tuple(values)
+
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> Dict[str, Any]:
+        doc = {}
+        for key in row.keys():
+            value = row[key]
+            if key == "id":
+                doc["_id"] = value
+            elif key in JSON_FIELDS and value is not None:
+                doc[key] = json.loads(value)
+            else:
+                doc[key] = value
+        return doc
+
+    @staticmethod
+    def _columns(fields: Optional[Iterable[str]]) -> str:
+        if fields is None:
+            return "id, " + ", ".join(ENTRY_FIELDS)
+        columns = []
+        for field in fields:
+            if field == "_id":
+                columns.append("id")
+            elif field in ENTRY_FIELDS:
+                columns.append(field)
+        return ", ".join(columns) or "id"
+
+    def insert_entry(self, doc):
+        return self.insert_entries([doc])[0]
+
+    def insert_entries(self, docs):
+        ids = [str(ObjectId()) for _ in docs]
+        rows = [self._row_values(entry_id, doc) for entry_id, doc in zip(ids, docs)]
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(SQL_INSERT, rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return ids
+
+    def delete_entry(self, entry_id):
+        conn = self._conn()
+        with self._write_lock:
+            if self.has_returning:
+                row = conn.execute(SQL_DELETE, (entry_id,)).fetchone()
+                return row[0] if row else None
+            row = conn.execute(SQL_OWNER, (entry_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute(SQL_DELETE_LEGACY, (entry_id,))
+            return row[0]
+
+    def delete_entries(self, entry_ids):
+        if not entry_ids:
+            return 0
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = conn.executemany(SQL_DELETE_LEGACY, [(entry_id,) for entry_id in entry_ids]).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return removed
+
+    def users_before(self, before):
+        return [row[0] for row in self._conn().execute(SQL_USERS_BEFORE, (before,))]
+
+    def find_range(self, user_id, start=None, end=None, fields=None, descending=False, limit=None, start_inclusive=True,
+                   created_after=None, created_until=None):
+        sql = f"SELECT {self._columns(fields)} FROM journal_entries WHERE user_id = ?"
+        params: List[Any] = [user_id]
+        if start is not None:
+            sql += " AND datetime >= ?" if start_inclusive else " AND datetime > ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND datetime <= ?"
+            params.append(end)
+        if created_after is not None:
+            sql += " AND created_at > ?"
+            params.append(created_after)
+        if created_until is not None:
+            sql += " AND created_at <= ?"
+            params.append(created_until)
+        sql += " ORDER BY datetime DESC" if descending else " ORDER BY datetime ASC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._stream(sql, params)
+
+    def _stream(self, sql: str, params: List[Any]) -> Iterator[Dict[str, Any]]:
+        cursor = self._conn().execute(sql, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(self.fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._decode(row)
+        finally:
+            cursor.close()
+
+    def latest_created(self, user_id):
+        row = self._conn().execute(SQL_LATEST_CREATED, (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def count_entries(self, user_id):
+        return self._conn().execute(SQL_COUNT, (user_id,)).fetchone()[0]
+
+    def recent_datetimes(self, user_id, limit):
+        return [row[0] for row in self._conn().execute(SQL_RECENT, (user_id, limit))]
+
+    def search(self, user_id, term, limit=50):
+        columns = ", ".join("e." + c for c in ("id",) + ENTRY_FIELDS)
+        if self.has_fts:
+            # Quote each word so user input is never parsed as FTS5 syntax
+            query = " ".join('"' + word.replace('"', '""') + '"' for word in term.split())
+            sql = (
+                f"SELECT {columns} FROM journal_fts f JOIN journal_entries e ON e.rowid = f.rowid "
+                "WHERE journal_fts MATCH ? AND e.user_id = ? ORDER BY e.datetime DESC LIMIT ?"
+            )
+            params = (query, user_id, limit)
+        else:
+            sql = (
+                f"SELECT {columns} FROM journal_entries e "
+                "WHERE e.user_id = ? AND e.text LIKE ? ORDER BY e.datetime DESC LIMIT ?"
+            )
+            params = (user_id, f"%{term}%", limit)
+        return [self._decode(row) for row in self._conn().execute(sql, params)]
+
+    def get_entries(self, entry_ids, fields):
+        if not entry_ids:
+            return {}
+        columns = self._columns(["_id"] + list(fields))
+        placeholders = ", ".join("?" for _ in entry_ids)
+        sql = f"SELECT {columns} FROM journal_entries WHERE id IN ({placeholders})"
+        return {doc["_id"]: doc for doc in (self._decode(r) for r in self._conn().execute(sql, list(entry_ids)))}
+
+    def get_version(self, user_id):
+        row = self._conn().execute(SQL_GET_VERSION, (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_version(self, user_id):
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(SQL_BUMP_VERSION, (user_id,))
+                version = conn.execute(SQL_GET_VERSION, (user_id,)).fetchone()[0]
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return version
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = []
+        self._local = threading.local()
@@ -166,6 +166,38 @@ app.post("/analyze-face", async (req, res) => {
   await proxyRequest(`${SERVICES.face}/analyze_face`, req, res);
 });
 
+// Binary frames (image/jpeg, image/png or multipart): stream the body through
+// untouched instead of re-serializing base64 JSON
+app.post("/analyze-face/upload", async (req, res) => {
+  const rid = req._rid;
+  try {
+    const headers = { "Content-Type": req.headers["content-type"] || "application/octet-stream", "X-Request-Id": rid };
+    if (req.headers["content-length"]) headers["Content-Length"] = req.headers["content-length"];
+    const query = new URLSearchParams();
+    if (req.query.session_id) query.set("session_id", req.query.session_id);
+    if (req.query.user_id) query.set("user_id", req.query.user_id);
+    const response = await fetch(`${SERVICES.face}/analyze_face/upload?${query}`, { method: "POST", headers, body: req });
+    const text = await response.text();
+    const retryAfter = response.headers.get("retry-after");
+    if (retryAfter) res.set("Retry-After", retryAfter);
+    return res.status(response.status).type("application/json").send(text);
+  } catch (err) {
+    console.error(`🟥 [${rid}] Proxy error: ${err.message}`);
+    return res.status(500).json({ error: "Proxy error", details: err.message });
+  }
+});
+
+// Per-user face emotion trend kept by the face service
+app.get("/face-trend/:userId", async (req, res) => {
+  const queryParams = new URLSearchParams({
+    period: req.query.period || "daily",
+    points: req.query.points || "7",
+    recent: req.query.recent || "0"
+  });
+  const url = `${SERVICES.face}/trend/${encodeURIComponent(req.params.userId)}?${queryParams}`;
+  await proxyRequest(url, req, res);
+});
+
 // ---------------------------
 // Proxy route for Speech Analysis
 // ---------------------------
@@ -223,7 +255,9 @@ app.get("/journal/insights", async (req, res) => {
 
 // Delete journal entry
 app.delete("/journal/entry/:id", async (req, res) => {
-  const url = `${SERVICES.journal}/journal/entry/${encodeURIComponent(req.params.id)}`;
+  // user_id lets the journal service find entries that were moved to the archive
+  const user_id = req.query.user_id || "default_user";
+  const url = `${SERVICES.journal}/journal/entry/${encodeURIComponent(req.params.id)}?user_id=${encodeURIComponent(user_id)}`;
   await proxyRequest(url, req, res);
 });
 
@@ -280,6 +314,8 @@ app.get("/", (req, res) => {
       // Analysis endpoints
       "POST /analyze - Text analysis",
       "POST /analyze-face - Face emotion analysis", 
+      "POST /analyze-face/upload - Face emotion analysis (binary image body)",
+      "GET /face-trend/:userId - Hourly/daily face emotion trend",
       "POST /analyze-speech - Speech emotion analysis",
       
       // Journal endpoints
@@ -8,23 +8,36 @@ os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
 import time
 import base64
 import uuid
-import wave
 import subprocess
 import warnings
 import logging
-from typing import Tuple
 
 import numpy as np
 from fastapi import FastAPI, HTTPException, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
+from inference_executor import InferenceExecutor, Overloaded
+from speech_audio import AudioDecodeError, TARGET_RATE, decode_audio_async, ffmpeg_available, probe_ffmpeg
+
 warnings.filterwarnings("ignore")
 
 # -------- Logging setup --------
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("speech-api")
 
+# -------- Concurrency --------
+# Model forward passes run on their own threads (bounded queue, 429/503 beyond it)
+# and share one process-wide pool of TORCH_THREADS intra-op threads, sized so the
+# concurrent passes don't oversubscribe the cores; decoding (ffmpeg subprocesses,
+# WAV parsing/resampling) has a separate, larger budget
+INFERENCE_CONCURRENCY = int(os.getenv("SPEECH_INFERENCE_CONCURRENCY", "1"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("SPEECH_INFERENCE_QUEUE_SIZE", "8"))
+INFERENCE_MAX_WAIT_SECONDS = float(os.getenv("SPEECH_INFERENCE_MAX_WAIT", "10"))
+TORCH_THREADS = int(os.getenv("SPEECH_TORCH_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, INFERENCE_CONCURRENCY)))))
+DECODE_CONCURRENCY = int(os.getenv("SPEECH_DECODE_CONCURRENCY", str(max(2, os.cpu_count() or 1))))
+DECODE_QUEUE_SIZE = int(os.getenv("SPEECH_DECODE_QUEUE_SIZE", "16"))
+
 # -------- Transformers / Torch --------
 try:
     import torch
@@ -75,50 +88,65 @@ if TRANSFORMERS_AVAILABLE:
         feature_extractor = None
         model = None
 
+inference_executor = InferenceExecutor(
+    concurrency=INFERENCE_CONCURRENCY,
+    max_queue=INFERENCE_QUEUE_SIZE,
+    max_wait=INFERENCE_MAX_WAIT_SECONDS,
+    name="speech-infer",
+    label="Speech analysis"
+)
+decode_executor = InferenceExecutor(
+    concurrency=DECODE_CONCURRENCY,
+    max_queue=DECODE_QUEUE_SIZE,
+    max_wait=INFERENCE_MAX_WAIT_SECONDS,
+    name="speech-decode",
+    label="Audio decoding"
+)
+
+@app.on_event("startup")
+def set_torch_threads():
+    # torch.set_num_threads is process-global: set it once, before any inference
+    if torch is not None:
+        torch.set_num_threads(TORCH_THREADS)
+
+@app.on_event("startup")
+def probe_audio_tools():
+    # One ffmpeg check per process instead of one subprocess per request
+    probe_ffmpeg()
+
+@app.on_event("shutdown")
+def stop_executors():
+    inference_executor.shutdown()
+    decode_executor.shutdown()
+
 # -------- Schemas --------
 class SpeechInput(BaseModel):
     transcript: str = ""
     audio: str = ""  # base64 string (may include data URL prefix)
 
 # -------- Helpers --------
-def check_ffmpeg() -> bool:
-    try:
-        r = subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-        return r.returncode == 0
-    except Exception:
-        return False
-
 def strip_data_url_prefix(b64: str) -> str:
     if b64.startswith("data:"):
         parts = b64.split(",", 1)
         return parts[1] if len(parts) == 2 else b64
     return b64
 
-def load_audio_with_wave(file_path: str) -> Tuple[np.ndarray, int]:
-    with wave.open(file_path, 'rb') as wav_file:
-        n_channels = wav_file.getnchannels()
-        sample_width = wav_file.getsampwidth()
-        frame_rate = wav_file.getframerate()
-        n_frames = wav_file.getnframes()
-
-        frames = wav_file.readframes(n_frames)
-        dtype = {1: np.uint8, 2: np.int16, 4: np.int32}.get(sample_width)
-        if dtype is None:
-            raise ValueError(f"Unsupported sample width: {sample_width}")
-
-        audio = np.frombuffer(frames, dtype=dtype)
-        # Normalize to float32 -1..1
-        if sample_width == 1:
-            audio = audio.astype(np.float32) / 128.0 - 1.0
-        elif sample_width == 2:
-            audio = audio.astype(np.float32) / 32768.0
-        elif sample_width == 4:
-            audio = audio.astype(np.float32) / 2147483648.0
+def overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
 
-        if n_channels > 1:
-            audio = audio.reshape(-1, n_channels).mean(axis=1)
-
-        return audio, frame_rate
+async def decode_upload(raw: bytes) -> np.ndarray:
+    """16 kHz mono samples of an uploaded clip (in memory: WAV fast path, else ffmpeg pipes)"""
+    t0 = time.perf_counter()
+    # Refuse early when inference is already saturated: no point decoding
+    inference_executor.check_admission()
+    try:
+        audio, decoder = await decode_audio_async(raw, decode_executor)
+    except AudioDecodeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except subprocess.TimeoutExpired:
+        raise HTTPException(status_code=500, detail="FFmpeg conversion timed out")
+    logger.debug(f"Decoded {len(raw)} bytes via {decoder} in {(time.perf_counter() - t0) * 1000:.1f}ms")
+    return audio
 
 def standardize_emotion(label: str) -> str:
     mapping = {
@@ -172,19 +200,32 @@ def get_daily_tip(emotion: str) -> str:
         "surprise": "Be open to new opportunities that come your way.",
     }.get(emotion, "Check in with yourself regularly.")
 
-def analyze_audio(audio_base64: str):
+def predict_emotion(audio: np.ndarray, sr: int = TARGET_RATE):
+    """Blocking wav2vec2 forward pass (runs on the inference executor): raw label, probabilities, top-3"""
+    # normalize audio
+    if np.max(np.abs(audio)) > 0:
+        audio = audio / np.max(np.abs(audio))
+
+    # feature extraction + inference
+    inputs = feature_extractor(audio, sampling_rate=sr, return_tensors="pt", padding="longest")
+    with torch.no_grad():
+        logits = model(**inputs).logits
+        probs = torch.nn.functional.softmax(logits, dim=-1)[0]
+
+    id2label = getattr(model.config, "id2label", {})
+    prob_dict = {id2label[i]: float(probs[i]) for i in range(len(probs))}
+    top3 = sorted(prob_dict.items(), key=lambda x: x[1], reverse=True)[:3]
+
+    # Pick top prediction
+    emotion_idx = int(torch.argmax(probs).item())
+    raw_label = id2label.get(emotion_idx, "unknown")
+    return raw_label, prob_dict, top3
+
+async def analyze_audio(audio_base64: str):
     if model is None or feature_extractor is None:
         logger.warning("Model/feature_extractor not loaded; returning neutral")
         return "neutral", {}, []
 
-    if not check_ffmpeg():
-        logger.error("FFmpeg not installed or not in PATH")
-        raise HTTPException(status_code=500, detail="FFmpeg not installed")
-
-    uid = uuid.uuid4().hex
-    temp_input = f"tmp_{uid}.webm"
-    temp_output = f"tmp_{uid}.wav"
-
     # decode base64
     audio_base64 = strip_data_url_prefix(audio_base64)
     try:
@@ -196,58 +237,20 @@ def analyze_audio(audio_base64: str):
     if len(raw) < 1000:
         raise HTTPException(status_code=400, detail="Audio too short (<1KB decoded)")
 
-    with open(temp_input, "wb") as f:
-        f.write(raw)
-
-    # convert to WAV (16kHz mono)
-    cmd = [
-        "ffmpeg", "-hide_banner", "-loglevel", "error",
-        "-y", "-i", temp_input, "-vn",
-        "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1",
-        temp_output
-    ]
-    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=45)
-    if proc.returncode != 0 or not os.path.exists(temp_output):
-        raise HTTPException(status_code=500, detail="FFmpeg conversion failed")
-
-    # read wav
-    audio, sr = load_audio_with_wave(temp_output)
-
-    # cleanup temp files
-    for p in (temp_input, temp_output):
-        try:
-            if os.path.exists(p):
-                os.remove(p)
-        except Exception:
-            pass
+    # decode to 16kHz mono in memory
+    audio = await decode_upload(raw)
+    sr = TARGET_RATE
 
     dur_sec = len(audio) / float(sr) if sr else 0.0
     if dur_sec < 1.5:
         raise HTTPException(status_code=400, detail="Audio too short (<1.5s for analysis)")
 
-    # normalize audio
-    if np.max(np.abs(audio)) > 0:
-        audio = audio / np.max(np.abs(audio))
-
-    # feature extraction + inference
-    inputs = feature_extractor(audio, sampling_rate=sr, return_tensors="pt", padding="longest")
-    with torch.no_grad():
-        logits = model(**inputs).logits
-        probs = torch.nn.functional.softmax(logits, dim=-1)[0]
+    # wav2vec2 off the event loop
+    raw_label, prob_dict, top3 = await inference_executor.submit(predict_emotion, audio, sr)
 
     # Debug: log all probabilities
-    id2label = getattr(model.config, "id2label", {})
-    prob_dict = {id2label[i]: float(probs[i]) for i in range(len(probs))}
     logger.info("Raw emotion probabilities: %s", prob_dict)
-
-    # Also show top-3 sorted
-    top3 = sorted(prob_dict.items(), key=lambda x: x[1], reverse=True)[:3]
     logger.info("Top-3 emotions (raw): %s", top3)
-
-    # Pick top prediction
-    emotion_idx = int(torch.argmax(probs).item())
-    raw_label = id2label.get(emotion_idx, "unknown")
-
     logger.debug(f"Raw model label: {raw_label}")
 
     return raw_label, prob_dict, top3
@@ -260,7 +263,10 @@ async def analyze_speech_endpoint(input: SpeechInput, request: Request):
     if not input.audio:
         raise HTTPException(status_code=400, detail="Field 'audio' is required")
 
-    raw_label, prob_dict, top3 = analyze_audio(input.audio)
+    try:
+        raw_label, prob_dict, top3 = await analyze_audio(input.audio)
+    except Overloaded as e:
+        raise overloaded(e)
     emotion = standardize_emotion(raw_label)
 
     logger.info(f"Mapped emotion: {emotion} (from raw label: {raw_label})")
@@ -281,8 +287,12 @@ async def health_check():
     return {
         "status": "ok",
         "model_loaded": model is not None and feature_extractor is not None,
-        "ffmpeg_available": check_ffmpeg(),
-        "transformers_available": TRANSFORMERS_AVAILABLE
+        "ffmpeg_available": ffmpeg_available(),
+        "ffmpeg_version": probe_ffmpeg()["version"],
+        "transformers_available": TRANSFORMERS_AVAILABLE,
+        "torch_threads": TORCH_THREADS,
+        "inference": inference_executor.metrics(),
+        "decoding": decode_executor.metrics()
     }
 
 @app.post("/upload_test")
@@ -294,59 +304,13 @@ async def upload_test(file: UploadFile = File(...)):
     if model is None or feature_extractor is None:
         raise HTTPException(status_code=500, detail="Model not loaded")
 
-    uid = uuid.uuid4().hex
-    temp_input = f"tmp_{uid}_{file.filename}"
-    temp_output = f"tmp_{uid}.wav"
-
-    # Save uploaded file
-    with open(temp_input, "wb") as buffer:
-        buffer.write(await file.read())
-
-    # Convert to WAV 16kHz mono using ffmpeg
-    cmd = [
-        "ffmpeg", "-hide_banner", "-loglevel", "error",
-        "-y", "-i", temp_input, "-vn",
-        "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1",
-        temp_output
-    ]
-    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=45)
-    if proc.returncode != 0 or not os.path.exists(temp_output):
-        raise HTTPException(status_code=500, detail="FFmpeg conversion failed")
-
-    # Read wav
-    audio, sr = load_audio_with_wave(temp_output)
-
-    # Clean up input
+    # Decode to 16kHz mono in memory (WAV files skip ffmpeg), then run the model off the event loop
     try:
-        os.remove(temp_input)
-    except Exception:
-        pass
-
-    # Normalize audio
-    if np.max(np.abs(audio)) > 0:
-        audio = audio / np.max(np.abs(audio))
-
-    # Run model
-    inputs = feature_extractor(audio, sampling_rate=sr, return_tensors="pt", padding="longest")
-    with torch.no_grad():
-        logits = model(**inputs).logits
-        probs = torch.nn.functional.softmax(logits, dim=-1)[0]
-
-    # Map labels
-    id2label = getattr(model.config, "id2label", {})
-    prob_dict = {id2label[i]: float(probs[i]) for i in range(len(probs))}
-    top3 = sorted(prob_dict.items(), key=lambda x: x[1], reverse=True)[:3]
-
-    emotion_idx = int(torch.argmax(probs).item())
-    raw_label = id2label.get(emotion_idx, "unknown")
+        audio = await decode_upload(await file.read())
+        raw_label, prob_dict, top3 = await inference_executor.submit(predict_emotion, audio, TARGET_RATE)
+    except Overloaded as e:
+        raise overloaded(e)
     emotion = standardize_emotion(raw_label)
-    
-
-    # Clean up output wav
-    try:
-        os.remove(temp_output)
-    except Exception:
-        pass
 
     # Log info
     logger.info(f"File {file.filename} → Raw: {raw_label}, Mapped: {emotion}")
@@ -0,0 +1,208 @@
+# backend/speech_audio.py
+"""
+Audio decoding for the speech analysis service, without temp files.
+
+decode_audio() turns an uploaded clip into mono float32 samples at 16 kHz:
+
+- PCM / float WAV is parsed with NumPy (no subprocess) and resampled in
+  process when it is not already at 16 kHz.
+- Everything else (browser webm/ogg recordings, mp3, ...) is piped through
+  ffmpeg: the encoded bytes go to its stdin and raw s16le PCM comes back on
+  stdout. Containers that need a seekable input (mp4/m4a with the index at
+  the end) cannot be decoded this way.
+
+probe_ffmpeg() runs `ffmpeg -version` once; the service calls it at startup
+instead of before every request.
+
+decode_audio_async() is the non-blocking variant used by the service: ffmpeg
+runs as an asyncio subprocess and the in-process WAV work goes to an
+executor, both under that executor's admission limits.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import subprocess
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("speech-api")
+
+TARGET_RATE = 16000
+FFMPEG_BIN = os.getenv("SPEECH_FFMPEG", "ffmpeg")
+FFMPEG_TIMEOUT_SECONDS = float(os.getenv("SPEECH_FFMPEG_TIMEOUT", "45"))
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioDecodeError(ValueError):
+    """The clip could not be decoded (bad data, or no decoder for it)"""
+
+
+# -------- ffmpeg --------
+_ffmpeg: Dict[str, Any] = {"available": False, "path": None, "version": None, "probed": False}
+
+
+def probe_ffmpeg() -> Dict[str, Any]:
+    """Find ffmpeg and read its version once; later calls return the cached result"""
+    if _ffmpeg["probed"]:
+        return dict(_ffmpeg)
+    path = shutil.which(FFMPEG_BIN)
+    _ffmpeg.update({"probed": True, "path": path})
+    if path:
+        try:
+            r = subprocess.run([path, "-hide_banner", "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               timeout=10, check=True)
+            first_line = r.stdout.decode("utf-8", "replace").splitlines()[0] if r.stdout else ""
+            _ffmpeg.update({"available": True, "version": first_line.strip()})
+        except Exception as e:
+            logger.error(f"FFmpeg at {path} is not usable: {e}")
+    if _ffmpeg["available"]:
+        logger.info(f"FFmpeg found: {_ffmpeg['version']} ({path})")
+    else:
+        logger.warning("FFmpeg not installed or not in PATH; only WAV uploads can be decoded")
+    return dict(_ffmpeg)
+
+
+def ffmpeg_available() -> bool:
+    return probe_ffmpeg()["available"]
+
+
+def ffmpeg_command(rate: int = TARGET_RATE):
+    """Encoded audio on stdin -> raw mono s16le PCM at `rate` on stdout"""
+    return [
+        _ffmpeg["path"] or FFMPEG_BIN, "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0", "-vn",
+        "-acodec", "pcm_s16le", "-f", "s16le", "-ar", str(rate), "-ac", "1",
+        "pipe:1"
+    ]
+
+
+def pcm16_to_float(pcm: bytes) -> np.ndarray:
+    return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def decode_with_ffmpeg(raw: bytes, rate: int = TARGET_RATE) -> np.ndarray:
+    """Decode any ffmpeg-readable clip through stdin/stdout pipes"""
+    if not ffmpeg_available():
+        raise AudioDecodeError("FFmpeg not installed")
+    proc = subprocess.run(ffmpeg_command(rate), input=raw, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          timeout=FFMPEG_TIMEOUT_SECONDS)
+    if proc.returncode != 0 or not proc.stdout:
+        logger.error("FFmpeg conversion failed: %s", proc.stderr.decode("utf-8", "replace").strip()[:500])
+        raise AudioDecodeError("FFmpeg conversion failed")
+    return pcm16_to_float(proc.stdout)
+
+
+async def decode_with_ffmpeg_async(raw: bytes, rate: int = TARGET_RATE) -> np.ndarray:
+    """decode_with_ffmpeg() as an asyncio subprocess: the event loop keeps serving while ffmpeg runs"""
+    if not ffmpeg_available():
+        raise AudioDecodeError("FFmpeg not installed")
+    proc = await asyncio.create_subprocess_exec(*ffmpeg_command(rate), stdin=asyncio.subprocess.PIPE,
+                                                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(raw), timeout=FFMPEG_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise AudioDecodeError("FFmpeg conversion timed out")
+    if proc.returncode != 0 or not out:
+        logger.error("FFmpeg conversion failed: %s", err.decode("utf-8", "replace").strip()[:500])
+        raise AudioDecodeError("FFmpeg conversion failed")
+    return pcm16_to_float(out)
+
+
+def loop_can_spawn() -> bool:
+    """False on Windows selector loops (uvicorn --reload), which cannot run asyncio subprocesses"""
+    if sys.platform != "win32":
+        return True
+    return isinstance(asyncio.get_running_loop(), getattr(asyncio, "ProactorEventLoop", ()))
+
+
+# -------- WAV fast path --------
+def parse_wav(raw: bytes) -> Optional[Tuple[np.ndarray, int]]:
+    """(mono float32 samples in -1..1, sample rate) of a PCM/float WAV; None if it is not one we can read"""
+    if len(raw) < 12 or raw[:4] != b"RIFF" or raw[8:12] != b"WAVE":
+        return None
+    fmt = None
+    data = None
+    pos = 12
+    while pos + 8 <= len(raw):
+        chunk_id = raw[pos:pos + 4]
+        size = int.from_bytes(raw[pos + 4:pos + 8], "little")
+        body = pos + 8
+        if chunk_id == b"fmt " and size >= 16:
+            fmt = raw[body:body + size]
+        elif chunk_id == b"data":
+            # Streaming writers leave the size at 0 or 0xFFFFFFFF: take the rest of the file
+            end = len(raw) if size in (0, 0xFFFFFFFF) else min(len(raw), body + size)
+            data = memoryview(raw)[body:end]
+            break
+        pos = body + size + (size & 1)  # chunks are word aligned
+    if fmt is None or data is None:
+        return None
+
+    format_tag = int.from_bytes(fmt[0:2], "little")
+    channels = int.from_bytes(fmt[2:4], "little")
+    rate = int.from_bytes(fmt[4:8], "little")
+    bits = int.from_bytes(fmt[14:16], "little")
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        format_tag = int.from_bytes(fmt[24:26], "little")  # first two bytes of the SubFormat GUID
+    if channels < 1 or rate <= 0:
+        return None
+
+    width = bits // 8
+    usable = len(data) - len(data) % (width * channels) if width else 0
+    data = data[:usable]
+    if format_tag == WAVE_FORMAT_PCM and bits == 8:
+        audio = np.frombuffer(data, dtype=np.uint8).astype(np.float32) / 128.0 - 1.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 16:
+        audio = np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 24:
+        b = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        audio = ((b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8 >> 8).astype(np.float32) / 8388608.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 32:
+        audio = np.frombuffer(data, dtype="<i4").astype(np.float32) / 2147483648.0
+    elif format_tag == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        audio = np.frombuffer(data, dtype="<f4" if bits == 32 else "<f8").astype(np.float32)
+    else:
+        return None  # a-law, mu-law, ADPCM, ...: let ffmpeg handle it
+
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    return audio, rate
+
+
+def resample(audio: np.ndarray, rate: int, target: int = TARGET_RATE) -> np.ndarray:
+    """Band-limited resampling of a whole clip with one real FFT"""
+    if rate == target or len(audio) == 0:
+        return audio
+    n_out = max(1, int(round(len(audio) * target / rate)))
+    spectrum = np.fft.rfft(audio)
+    # Truncating the spectrum low-passes at the new Nyquist when downsampling;
+    # irfft zero-pads it when upsampling
+    out = np.fft.irfft(spectrum[:n_out // 2 + 1], n_out)
+    return (out * (n_out / len(audio))).astype(np.float32)
+
+
+# -------- Entry point --------
+def decode_audio(raw: bytes) -> Tuple[np.ndarray, str]:
+    """(mono float32 samples at TARGET_RATE, decoder used): WAV is decoded in process, the rest by ffmpeg"""
+    wav = parse_wav(raw)
+    if wav is None:
+        return decode_with_ffmpeg(raw, TARGET_RATE), "ffmpeg"
+    audio, rate = wav
+    if rate == TARGET_RATE:
+        return audio, "wav"
+    return resample(audio, rate, TARGET_RATE), "wav_resampled"
+
+
+async def decode_audio_async(raw: bytes, executor) -> Tuple[np.ndarray, str]:
+    """decode_audio() through `executor` (an InferenceExecutor): WAV on its threads, ffmpeg as a subprocess"""
+    if raw[:4] == b"RIFF" or not loop_can_spawn():
+        return await executor.submit(decode_audio, raw)
+    return await executor.submit_async(decode_with_ffmpeg_async, raw, TARGET_RATE), "ffmpeg"
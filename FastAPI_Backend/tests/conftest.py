@@ -0,0 +1,73 @@
+# backend/tests/conftest.py
+"""
+Shared pytest setup for the backend modules (run from FastAPI_Backend/:
+`python -m pytest -q tests`).
+"""
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture
+def offline_nltk(monkeypatch):
+    """analysis_utils with NLTK data when it is installed, else equivalent offline stand-ins.
+
+    word_tokenize needs the punkt model and the stopword list a corpus download;
+    the Treebank tokenizer (what word_tokenize applies per sentence) and a small
+    stopword set keep the tests runnable without network access.
+    """
+    import nltk
+    import analysis_utils
+
+    try:
+        nltk.data.find("tokenizers/punkt")
+        nltk.data.find("corpora/stopwords")
+    except LookupError:
+        from nltk.tokenize import TreebankWordTokenizer
+        monkeypatch.setattr(analysis_utils, "word_tokenize", TreebankWordTokenizer().tokenize)
+        monkeypatch.setattr(analysis_utils, "_stop_words", {
+            "i", "me", "my", "am", "is", "was", "a", "an", "the", "and", "but", "to", "of", "today", "now",
+            "about", "feel", "be", "it", "this", "that",
+        })
+    return analysis_utils
+
+
+class FakeDetector:
+    """DeepFace.extract_faces stand-in: the face is the box of bright pixels, if any.
+
+    Set `gate` to a threading.Event to hold every detection until it is set.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.gate = None
+
+    def extract_faces(self, img_path, detector_backend="opencv", enforce_detection=True, align=True):
+        import numpy as np
+
+        if self.gate is not None:
+            self.gate.wait(5)
+        img = np.asarray(img_path)
+        h, w = img.shape[:2]
+        self.calls.append((detector_backend, (w, h)))
+        ys, xs = np.nonzero(img[:, :, 0] > 200)
+        if not len(ys):
+            return [{"face": img / 255.0, "facial_area": {"x": 0, "y": 0, "w": w, "h": h}, "confidence": 0}]
+        x0, y0, x1, y1 = int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1
+        return [{"face": img[y0:y1, x0:x1] / 255.0, "confidence": 0.9,
+                 "facial_area": {"x": x0, "y": y0, "w": x1 - x0, "h": y1 - y0}}]
+
+
+@pytest.fixture
+def face_detector(monkeypatch):
+    """face_pipeline with DeepFace's detector replaced by a FakeDetector (skips without deepface)"""
+    face_pipeline = pytest.importorskip("face_pipeline")
+    detector = FakeDetector()
+    monkeypatch.setattr(face_pipeline, "DeepFace", detector)
+    monkeypatch.setattr(face_pipeline, "build_deepface_model", lambda name, task: None)
+    return detector
@@ -0,0 +1,21 @@
+# backend/tests/test_analysis_utils.py
+
+
+def test_document_tokenizes_once(offline_nltk):
+    doc = offline_nltk.process_document("I am  Happy today. Really!")
+    assert doc.lower == "i am  happy today. really!"
+    assert "happy" in doc.tokens
+    assert len(doc.stop_mask) == len(doc.tokens)
+    assert "happy" in doc.content_tokens()
+
+
+def test_but_clause_boosts_the_clause_after_the_first_inner_but(offline_nltk):
+    # A leading "But" is not the clause break: the old split(" but ") semantics
+    # boost only "i feel sad"
+    result = offline_nltk.analyze_text_with_context("But I am happy today but I feel sad")
+    assert result["emotion"] == "sadness"
+
+
+def test_but_clause_without_leading_but(offline_nltk):
+    result = offline_nltk.analyze_text_with_context("I feel sad today but I am happy")
+    assert result["emotion"] == "joy"
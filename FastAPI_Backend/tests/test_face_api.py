@@ -0,0 +1,163 @@
+# backend/tests/test_face_api.py
+import asyncio
+import base64
+import importlib.util
+import os
+import threading
+import time
+
+import cv2
+import httpx
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from face_backends import create_backend
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def jpeg(seed: int = 0, size=(160, 120)) -> bytes:
+    """A frame with one bright square (what FakeDetector calls a face)"""
+    width, height = size
+    image = np.random.default_rng(seed).integers(0, 120, (height, width, 3), dtype=np.uint8)
+    image[height // 4:height // 4 + 40, width // 3:width // 3 + 40] = 230
+    ok, encoded = cv2.imencode(".jpg", image)
+    assert ok
+    return encoded.tobytes()
+
+
+@pytest.fixture
+def face_api(monkeypatch, face_detector):
+    """Loader for face-analysis-api.py under the given env, on the random emotion backend"""
+    loaded = []
+
+    def load(ready: bool = True, **env):
+        settings = {"FACE_TREND_DIR": "", "FACE_WORKERS": "0", "FACE_CACHE_THRESHOLD": "-1",
+                    "FACE_READY_WAIT_SECONDS": "0.1", **env}
+        for name, value in settings.items():
+            monkeypatch.setenv(name, value)
+        spec = importlib.util.spec_from_file_location("face_analysis_api", os.path.join(BACKEND_DIR, "face-analysis-api.py"))
+        api = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(api)
+        api.face_models = api.FaceModels(detector_backend="opencv", warmup_runs=1, tracker=api.face_tracker,
+                                         backend=create_backend("random"))
+        if ready:
+            api.face_models.load()
+        loaded.append(api)
+        return api
+
+    yield load
+    for api in loaded:
+        api.inference_executor.shutdown()
+
+
+def test_requests_wait_for_warm_models(face_api):
+    api = face_api(ready=False)
+    client = TestClient(api.app)  # startup hooks not run: the models never load
+    assert client.get("/ready").status_code == 503
+    refused = client.post("/analyze_face/upload", content=jpeg(), headers={"Content-Type": "image/jpeg"})
+    assert refused.status_code == 503 and refused.headers["Retry-After"] == "5"
+    assert "not_loaded" in refused.json()["detail"]
+
+    with TestClient(api.app) as client:  # startup loads and warms them in the background
+        assert api.face_models.ready_event.wait(5)
+        assert client.get("/ready").json()["status"] == "ready"
+        assert client.post("/analyze_face/upload", content=jpeg(),
+                           headers={"Content-Type": "image/jpeg"}).status_code == 200
+
+
+@pytest.mark.parametrize("queue, status", [("0", 429), ("1", 503)])
+def test_overloaded_requests_are_refused_with_retry_after(face_api, face_detector, queue, status):
+    api = face_api(FACE_BATCH_MAX_SIZE="1", FACE_INFERENCE_CONCURRENCY="1", FACE_INFERENCE_QUEUE_SIZE=queue,
+                   FACE_INFERENCE_MAX_WAIT="0.1")
+    face_detector.gate = threading.Event()  # the first request holds the only inference slot
+
+    async def main():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://face") as client:
+            def post():
+                return client.post("/analyze_face/upload", content=jpeg(), headers={"Content-Type": "image/jpeg"})
+
+            first = asyncio.ensure_future(post())
+            await asyncio.sleep(0.1)
+            refused = await post()
+            face_detector.gate.set()
+            return await first, refused
+
+    first, refused = asyncio.run(main())
+    assert first.status_code == 200
+    assert refused.status_code == status and int(refused.headers["Retry-After"]) >= 1
+    executor = api.inference_executor.metrics()
+    assert (executor["rejected_queue_full"], executor["rejected_wait_timeout"]) == ((1, 0) if status == 429 else (0, 1))
+
+
+def test_binary_uploads_match_the_base64_endpoint(face_api):
+    api = face_api(FACE_MAX_UPLOAD_BYTES="20000")
+    client = TestClient(api.app)
+    frame = jpeg(3)
+    as_json = client.post("/analyze_face", json={"image": "data:image/jpeg;base64," + base64.b64encode(frame).decode()})
+    raw = client.post("/analyze_face/upload", content=frame, headers={"Content-Type": "image/jpeg"})
+    multipart = client.post("/analyze_face/upload", files={"image": ("frame.jpg", frame, "image/jpeg")})
+    assert as_json.status_code == raw.status_code == multipart.status_code == 200
+    assert as_json.json()["emotion"] == raw.json()["emotion"] == multipart.json()["emotion"]
+    assert as_json.json()["confidence"] == raw.json()["confidence"] == multipart.json()["confidence"]
+
+    def upload(body, content_type="image/jpeg"):
+        return client.post("/analyze_face/upload", content=body, headers={"Content-Type": content_type}).status_code
+
+    assert upload(b"") == 400
+    assert upload(frame, "application/json") == 415
+    assert upload(b"\xff" * 20001) == 413
+    assert upload(b"not an image") == 500
+    assert client.post("/analyze_face/upload", files={"other": ("a.txt", b"", "text/plain")}).status_code == 400
+
+
+def test_stream_analyses_the_newest_frame_and_drops_superseded_ones(face_api, face_detector):
+    api = face_api(FACE_STREAM_MIN_INTERVAL="0", FACE_STREAM_HEARTBEAT="0")
+    with TestClient(api.app) as client:
+        with client.websocket_connect("/ws/analyze_face?session_id=s1&user_id=alice") as ws:
+            face_detector.gate = threading.Event()
+            ws.send_bytes(jpeg(1))
+            time.sleep(0.2)  # frame 1 is in inference
+            ws.send_text('{"image": "data:image/jpeg;base64,%s"}' % base64.b64encode(jpeg(2)).decode())
+            ws.send_bytes(jpeg(3))  # replaces frame 2 before inference gets to it
+            time.sleep(0.2)
+            face_detector.gate.set()
+
+            first, latest = ws.receive_json(), ws.receive_json()
+            assert (first["type"], first["frame"]) == ("emotion", 1) and "recommendation" in first
+            assert (latest["frame"], latest["received"], latest["dropped"], latest["processed"]) == (3, 3, 1, 2)
+            assert set(latest["distribution"]) <= set(api.EMOTION_LABELS)
+            assert api.face_tracker.metrics()["sessions"] == 1
+        time.sleep(0.2)
+        assert api.face_tracker.metrics()["sessions"] == 0  # dropped on disconnect
+        assert [frame["emotion"] for frame in api.trend_store.recent("alice")] == [latest["emotion"], first["emotion"]]
+
+        with client.websocket_connect("/ws/analyze_face?detector=nope") as ws:
+            assert ws.receive_json()["type"] == "error"
+
+
+def test_stage_timings_reach_the_header_metrics_and_benchmark(face_api):
+    from face_benchmark import run_cell, summarize
+    from face_profiling import parse_server_timing
+
+    api = face_api()
+    client = TestClient(api.app)
+    plain = client.post("/analyze_face/upload", content=jpeg(), headers={"Content-Type": "image/jpeg"})
+    assert "server-timing" not in plain.headers
+    debug = client.post("/analyze_face/upload", content=jpeg(),
+                        headers={"Content-Type": "image/jpeg", "X-Debug-Timing": "1"})
+    stages = parse_server_timing(debug.headers["server-timing"])
+    assert {"imdecode", "detect", "classify", "respond", "total"} <= set(stages)
+    assert stages["total"] >= stages["detect"] + stages["classify"]
+
+    profile = client.get("/metrics").json()["stages"]
+    assert profile["requests"] == 2
+    assert profile["stages"]["total"]["count"] == 2 and profile["stages"]["detect"]["buckets"]["+Inf"] == 2
+
+    result, elapsed = asyncio.run(run_cell(api.app, [jpeg(1), jpeg(2)], concurrency=2, requests=6, endpoint="json"))
+    cell = summarize(result, elapsed, 6)
+    assert cell["ok"] == 6 and cell["throughput_rps"] > 0
+    assert {"client", "b64decode", "detect", "total"} <= set(cell["stages_ms"])
+    assert cell["stages_ms"]["detect"]["p50"] <= cell["stages_ms"]["detect"]["p99"]
@@ -0,0 +1,63 @@
+# backend/tests/test_face_backends.py
+import numpy as np
+import pytest
+
+from face_backends import (BACKENDS, NUM_EMOTIONS, OnnxBackend, TinyRandomBackend, create_backend, run_benchmark,
+                           tiny_onnx_model)
+
+
+def faces(n: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).random((n, 48, 48, 1), dtype=np.float32)
+
+
+def test_create_backend_by_name():
+    assert isinstance(create_backend("random", seed=3), TinyRandomBackend)
+    assert set(BACKENDS) == {"deepface", "onnx", "random"}
+    with pytest.raises(ValueError, match="Unknown emotion backend"):
+        create_backend("tflite")
+
+
+def test_random_backend_is_a_seeded_probability_model():
+    backend, same, other = create_backend("random", seed=1), create_backend("random", seed=1), create_backend("random", seed=2)
+    for b in (backend, same, other):
+        b.load()
+    batch = faces(5)
+    probabilities = backend.predict(batch)
+    assert probabilities.shape == (5, NUM_EMOTIONS)
+    assert np.allclose(probabilities.sum(axis=1), 1.0) and (probabilities >= 0).all()
+    assert np.array_equal(probabilities, same.predict(batch))
+    assert not np.allclose(probabilities, other.predict(batch))
+    # Batching does not change a frame's answer
+    assert np.allclose(backend.predict(batch[2:3]), probabilities[2:3], atol=1e-6)
+
+    info = backend.info()
+    assert (info["name"], info["frames"], info["seed"]) == ("random", 6, 1)
+
+
+def test_onnx_backend_reports_what_is_missing(tmp_path):
+    with pytest.raises((RuntimeError, FileNotFoundError), match="onnxruntime|not found"):
+        OnnxBackend(str(tmp_path / "missing.onnx"), intra_op_threads=1).load()
+
+
+def test_benchmark_reports_agreement_with_the_reference():
+    class Reseeded(TinyRandomBackend):
+        name = "reseeded"
+
+    report = run_benchmark([TinyRandomBackend(seed=0), Reseeded(seed=5)], faces(12), batch_size=4, reference="random")
+    assert report["frames"] == 12
+    reference, candidate = report["backends"]["random"], report["backends"]["reseeded"]
+    assert reference["frames"] == 12 and reference["agreement"]["mean_abs_diff"] == 0.0
+    assert reference["agreement"]["dominant_match"] == 1.0
+    assert candidate["agreement"]["mean_abs_diff"] > 0
+
+
+def test_tiny_onnx_twin_matches_the_random_backend(tmp_path):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    path = str(tmp_path / "tiny.onnx")
+    tiny_onnx_model(path, seed=4)
+    onnx_backend, numpy_backend = OnnxBackend(path, intra_op_threads=1), TinyRandomBackend(seed=4)
+    onnx_backend.load()
+    numpy_backend.load()
+    batch = faces(6, seed=1)
+    assert np.allclose(onnx_backend.predict(batch), numpy_backend.predict(batch), atol=1e-5)
@@ -0,0 +1,90 @@
+# backend/tests/test_face_cache.py
+import cv2
+import numpy as np
+import pytest
+
+from face_cache import FrameHashCache, hamming_distances, perceptual_hash
+
+
+def frame(seed: int, noise: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    image = cv2.resize(rng.integers(0, 256, (8, 8, 3), dtype=np.uint8), (64, 64), interpolation=cv2.INTER_NEAREST)
+    if noise:
+        image = np.clip(image.astype(np.int16) + np.random.default_rng(99).integers(-noise, noise, image.shape), 0, 255)
+    ok, encoded = cv2.imencode(".png", image.astype(np.uint8))
+    assert ok
+    return encoded.tobytes()
+
+
+def test_hamming_distances():
+    hashes = np.array([0, 0b1011, 2 ** 64 - 1], dtype=np.uint64)
+    assert hamming_distances(hashes, 0).tolist() == [0, 3, 64]
+
+
+def test_near_identical_frames_hash_close():
+    cache = FrameHashCache()
+    base, noisy, other = (cache.hash_frame(frame(1)), cache.hash_frame(frame(1, noise=3)),
+                          cache.hash_frame(frame(2)))
+    assert hamming_distances(np.array([noisy], dtype=np.uint64), base)[0] <= 5
+    assert hamming_distances(np.array([other], dtype=np.uint64), base)[0] > 5
+    assert cache.hash_frame(b"not an image") is None
+    assert perceptual_hash(np.zeros((16, 16), np.uint8)) == 0
+
+
+def test_session_scope_needs_a_session_id():
+    cache = FrameHashCache(scope="session")
+    assert cache.scope_key(None) is None
+    assert cache.scope_key("") is None
+    assert cache.scope_key("a") != cache.scope_key("b")
+    assert cache.scope_key("global") != FrameHashCache(scope="global").scope_key(None)
+    assert FrameHashCache(scope="global").scope_key("a") == "global"
+
+
+@pytest.mark.parametrize("algorithm", ["dhash", "ahash"])
+def test_lookup_store_and_threshold(algorithm):
+    cache = FrameHashCache(threshold=5, algorithm=algorithm)
+    key = cache.scope_key("s1")
+    value = cache.hash_frame(frame(1))
+    assert cache.lookup(key, value) is None
+    cache.store(key, value, "happy", 0.05)
+
+    assert cache.lookup(key, value ^ 0b111) == "happy"
+    assert cache.lookup(key, value ^ 0b111111) is None
+    assert cache.lookup(cache.scope_key("s2"), value) is None
+    metrics = cache.metrics()
+    assert (metrics["lookups"], metrics["hits"]) == (4, 1)
+
+
+def test_entries_expire_after_ttl():
+    cache = FrameHashCache(ttl=0.0)
+    cache.store("k", 42, "sad", 0.01)
+    assert cache.lookup("k", 42) is None
+
+
+def test_rings_and_scopes_are_bounded():
+    cache = FrameHashCache(threshold=0, entries_per_scope=2, max_scopes=2)
+    for value in (1, 2, 3):
+        cache.store("k", value, value, 0.0)
+    assert cache.lookup("k", 1) is None
+    assert cache.lookup("k", 3) == 3
+
+    cache.store("a", 7, "a", 0.0)
+    cache.store("b", 7, "b", 0.0)
+    assert cache.lookup("k", 3) is None  # least recently used scope evicted
+    assert cache.metrics()["scopes"] == 2
+
+
+def test_drop_session_removes_detector_variants():
+    cache = FrameHashCache(threshold=0)
+    key = cache.scope_key("s1")
+    cache.store(key, 1, "x", 0.0)
+    cache.store(f"{key}|opencv", 1, "y", 0.0)
+    cache.store(cache.scope_key("s10"), 1, "z", 0.0)
+    cache.drop_session("s1")
+    assert cache.lookup(key, 1) is None and cache.lookup(f"{key}|opencv", 1) is None
+    assert cache.lookup(cache.scope_key("s10"), 1) == "z"
+
+    shared = FrameHashCache(threshold=0, scope="global")
+    shared.store("global", 1, "x", 0.0)
+    shared.drop_session("s1")
+    assert shared.lookup("global", 1) == "x"
@@ -0,0 +1,130 @@
+# backend/tests/test_face_detectors.py
+import time
+
+import numpy as np
+import pytest
+
+import face_detectors
+from face_detectors import box_iou, calibrate, frame_size_for, select
+
+
+def test_frame_size_matches_the_decode_budget():
+    width, height = frame_size_for(640 * 480)
+    assert (width, height) == (640, 480)
+    width, height = frame_size_for(1_000_000)
+    assert abs(width * height - 1_000_000) < 2000 and height == width * 3 // 4
+
+
+def test_box_iou():
+    assert box_iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert box_iou((0, 0, 10, 10), (5, 0, 10, 10)) == pytest.approx(1 / 3)
+    assert box_iou((0, 0, 10, 10), (20, 20, 5, 5)) == 0.0
+    assert box_iou((0, 0, 0, 0), (0, 0, 0, 0)) == 0.0
+
+
+def square(x, y, side=20, size=(80, 60)):
+    img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+    img[y:y + side, x:x + side] = 255
+    return img, (x, y, side, side)
+
+
+def extract(img, backend):
+    """Per-backend behaviour: exact, slow but exact, wrong place, nothing, cannot run"""
+    if backend == "broken":
+        raise ImportError("no module named 'mtcnn'")
+    h, w = img.shape[:2]
+    if backend == "blind":
+        return {"facial_area": {"x": 0, "y": 0, "w": w, "h": h}, "confidence": 0}
+    if backend == "slow":
+        time.sleep(0.005)
+    ys, xs = np.nonzero(img[:, :, 0])
+    x, y = int(xs.min()), int(ys.min())
+    if backend == "misplaced":
+        x, y = (x + 40) % w, (y + 30) % h
+    return {"facial_area": {"x": x, "y": y, "w": 20, "h": 20}, "confidence": 0.9}
+
+
+def found(face, img):
+    return bool(face["confidence"])
+
+
+def test_calibration_table_measures_latency_and_detection_rate():
+    frames = [square(5 + i, 10) for i in range(4)] + [(square(30, 30)[0], None)]  # last one: a photo, box unknown
+    table = {row["backend"]: row for row in calibrate(["fast", "slow", "misplaced", "blind", "broken"], frames,
+                                                      extract, found)}
+    assert table["fast"]["available"] and table["fast"]["frames"] == 5
+    assert table["fast"]["detection_rate"] == table["slow"]["detection_rate"] == 1.0
+    assert table["slow"]["p50_ms"] > table["fast"]["p50_ms"]
+    assert table["misplaced"]["detection_rate"] == 0.2  # only the frame without a known box counts
+    assert table["blind"]["detection_rate"] == 0.0
+    assert not table["broken"]["available"] and "mtcnn" in table["broken"]["error"]
+
+
+def row(backend, p50, rate):
+    return {"backend": backend, "available": True, "p50_ms": p50, "detection_rate": rate}
+
+
+def test_select_the_fastest_backend_above_the_quality_floor():
+    table = [row("mtcnn", 40.0, 1.0), row("opencv", 5.0, 0.5), row("ssd", 12.0, 0.9),
+             {"backend": "retinaface", "available": False}]
+    assert select(table, min_rate=0.8)[0] == "ssd"
+    assert select(table, min_rate=0.4)[0] == "opencv"
+
+    backend, reason = select(table, min_rate=1.1)  # nobody passes: best detection rate
+    assert backend == "mtcnn" and "highest detection rate" in reason
+    backend, reason = select([row("mtcnn", 40.0, 0.0), row("ssd", 12.0, 0.0)], min_rate=0.8, fallback="opencv")
+    assert backend == "ssd" and "fallback" in reason  # the fallback itself did not run
+    assert select([row("opencv", 9.0, 0.0), row("ssd", 1.0, 0.0)])[0] == "opencv"
+    assert select([{"backend": "mtcnn", "available": False}], fallback="opencv")[0] == "opencv"
+
+
+def test_calibration_frames_are_synthetic_faces_or_photos(tmp_path):
+    pytest.importorskip("face_pipeline")  # synthetic faces come from the pipeline's warm-up image
+    import cv2
+
+    frames = face_detectors.calibration_frames(320, 240, 3, directory="")
+    assert len(frames) == 3
+    for img, (x, y, w, h) in frames:
+        assert img.shape == (240, 320, 3) and 0 <= x and x + w <= 320 and 0 <= y and y + h <= 240
+
+    cv2.imwrite(str(tmp_path / "a.png"), np.zeros((960, 1280, 3), dtype=np.uint8))
+    (tmp_path / "notes.txt").write_text("not an image")
+    photos = face_detectors.calibration_frames(320, 240, 3, directory=str(tmp_path))
+    assert [(img.shape, box) for img, box in photos] == [((240, 320, 3), None)]  # downscaled to the budget
+
+
+def test_auto_mode_selects_and_reports_the_calibrated_detector(face_detector, monkeypatch):
+    from face_backends import create_backend
+    import face_pipeline
+
+    real_extract = face_detector.extract_faces
+
+    def per_backend(img_path, detector_backend="opencv", **kwargs):
+        if detector_backend == "retinaface":
+            raise ImportError("retinaface is not installed")
+        if detector_backend == "opencv":  # finds nothing: DeepFace's whole-image fallback
+            h, w = np.asarray(img_path).shape[:2]
+            face_detector.calls.append((detector_backend, (w, h)))
+            return [{"face": img_path, "facial_area": {"x": 0, "y": 0, "w": w, "h": h}, "confidence": 0}]
+        return real_extract(img_path, detector_backend, **kwargs)
+
+    monkeypatch.setattr(face_detector, "extract_faces", per_backend)
+    monkeypatch.setattr(face_detectors, "DETECTOR_CANDIDATES", ["opencv", "mtcnn", "retinaface"])
+    monkeypatch.setattr(face_detectors, "calibration_frames",
+                        lambda width, height, count: [square(10 * i, 5, size=(width, height)) for i in range(count)])
+
+    models = face_pipeline.FaceModels(detector_backend="auto", warmup_runs=1, backend=create_backend("random"))
+    assert models.detector_backend == "opencv"  # until calibrated
+    models.load()
+    assert models.is_ready and models.detector_backend == "mtcnn"
+
+    selection = models.status()["detector_selection"]
+    assert selection["mode"] == "auto" and selection["synthetic_frames"]
+    table = {row["backend"]: row for row in selection["calibration"]}
+    assert table["opencv"]["detection_rate"] == 0.0 and table["mtcnn"]["detection_rate"] == 1.0
+    assert not table["retinaface"]["available"]
+
+    # Warm-up and later requests use the selected backend unless a frame overrides it
+    assert face_detector.calls[-1][0] == "mtcnn"
+    models.detect_face(square(10, 10)[0], detector="opencv")
+    assert face_detector.calls[-1][0] == "opencv"
@@ -0,0 +1,129 @@
+# backend/tests/test_face_executor.py
+import asyncio
+import gc
+import threading
+
+import pytest
+
+from face_executor import MicroBatcher
+from inference_executor import InferenceExecutor, Overloaded
+
+
+@pytest.fixture
+def executor():
+    executor = InferenceExecutor(concurrency=1, max_queue=2, max_wait=2.0)
+    yield executor
+    executor.shutdown()
+
+
+def doubled(items):
+    return [ValueError("odd one out") if item == "bad" else item * 2 for item in items]
+
+
+def test_every_future_resolves_and_full_batches_flush_at_once(executor):
+    seen = []
+
+    def run_batch(items):
+        seen.append(list(items))
+        return doubled(items)
+
+    batcher = MicroBatcher(executor, run_batch, max_batch=4, window_ms=10_000, max_waiting=8)
+
+    async def main():
+        # A 10 s window: only reaching max_batch can flush these in time
+        return await asyncio.wait_for(asyncio.gather(*[batcher.submit(i) for i in range(8)]), timeout=2)
+
+    assert asyncio.run(main()) == [i * 2 for i in range(8)]
+    assert seen == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert batcher.metrics()["flushed_full"] == 2 and batcher.waiting == 0
+
+
+def test_window_flush_and_per_item_errors(executor):
+    batcher = MicroBatcher(executor, doubled, max_batch=8, window_ms=5)
+
+    async def main():
+        return await asyncio.gather(batcher.submit(1), batcher.submit("bad"), batcher.submit(3),
+                                    return_exceptions=True)
+
+    one, bad, three = asyncio.run(main())
+    assert (one, three) == (2, 6) and isinstance(bad, ValueError)
+    assert batcher.metrics()["flushed_window"] == 1
+
+
+def test_running_batches_survive_garbage_collection(executor):
+    release = threading.Event()
+
+    def slow(items):
+        release.wait(2)
+        return doubled(items)
+
+    batcher = MicroBatcher(executor, slow, max_batch=2, window_ms=1)
+
+    async def main():
+        calls = asyncio.gather(batcher.submit(1), batcher.submit(2))
+        await asyncio.sleep(0.05)
+        gc.collect()  # only the batcher holds the batch task now
+        assert len(batcher._tasks) == 1
+        release.set()
+        return await asyncio.wait_for(calls, timeout=2)
+
+    assert asyncio.run(main()) == [2, 4]
+    assert not batcher._tasks
+
+
+def test_requests_beyond_max_waiting_get_429(executor):
+    release = threading.Event()
+
+    def slow(items):
+        release.wait(2)
+        return doubled(items)
+
+    batcher = MicroBatcher(executor, slow, max_batch=2, window_ms=1, max_waiting=3)
+    assert MicroBatcher(executor, slow, max_batch=2).max_waiting == 1 * 2 + 2
+
+    async def main():
+        accepted = [asyncio.ensure_future(batcher.submit(i)) for i in range(3)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(Overloaded) as rejected:
+            await batcher.submit(99)
+        release.set()
+        return rejected.value, await asyncio.gather(*accepted)
+
+    error, results = asyncio.run(main())
+    assert error.status_code == 429 and error.retry_after >= 1
+    assert results == [0, 2, 4] and batcher.rejected == 1
+
+
+def test_shutdown_flushes_gathered_work_and_refuses_new(executor):
+    batcher = MicroBatcher(executor, doubled, max_batch=8, window_ms=10_000)
+
+    async def main():
+        waiting = asyncio.ensure_future(batcher.submit(5))
+        await asyncio.sleep(0)
+        await batcher.shutdown()
+        with pytest.raises(Overloaded):
+            await batcher.submit(6)
+        return await waiting
+
+    assert asyncio.run(main()) == 10
+
+
+def test_shutdown_fails_batches_that_do_not_finish(executor):
+    release = threading.Event()
+
+    def stuck(items):
+        release.wait(2)
+        return doubled(items)
+
+    batcher = MicroBatcher(executor, stuck, max_batch=1, window_ms=1)
+
+    async def main():
+        call = asyncio.ensure_future(batcher.submit(1))
+        await asyncio.sleep(0.05)
+        await batcher.shutdown(timeout=0.05)
+        release.set()
+        with pytest.raises(Overloaded) as error:
+            await call
+        return error.value
+
+    assert asyncio.run(main()).status_code == 503
@@ -0,0 +1,89 @@
+# backend/tests/test_face_pipeline.py
+import cv2
+import numpy as np
+import pytest
+
+from face_backends import TinyRandomBackend, create_backend
+from face_tracking import FaceTracker
+
+face_pipeline = pytest.importorskip("face_pipeline")  # needs deepface
+FaceModels = face_pipeline.FaceModels
+
+
+def test_models_are_warm_before_they_report_ready(face_detector):
+    models = FaceModels(detector_backend="opencv", warmup_runs=2, backend=create_backend("random"))
+    assert models.state == "not_loaded" and not models.is_ready
+
+    models.start_background_load()
+    assert models.ready_event.wait(5)
+    status = models.status()
+    assert status["ready"] and status["state"] == "ready" and status["error"] is None
+    assert status["load_seconds"] is not None and status["warmup_seconds"] is not None
+    # Two single-frame warm-ups, then one batch of two: every path has run once
+    assert len(face_detector.calls) == 4
+    assert status["emotion_backend"]["frames"] == 4
+    models.start_background_load()  # already loaded: no second load
+    assert len(face_detector.calls) == 4
+
+
+class MissingWeights(TinyRandomBackend):
+    def load(self):
+        raise OSError("weights missing")
+
+
+def test_a_failed_load_is_reported(face_detector):
+    models = FaceModels(detector_backend="opencv", backend=MissingWeights())
+    models.load()
+    assert models.state == "failed" and models.error == "weights missing"
+    assert not models.is_ready and not models.ready_event.is_set()
+
+
+def encoded(image, ext=".jpg"):
+    ok, buf = cv2.imencode(ext, image)
+    assert ok
+    return buf.tobytes()
+
+
+def test_decode_bounded_keeps_frames_within_the_pixel_budget():
+    image = np.random.default_rng(0).integers(0, 255, (960, 1280, 3), dtype=np.uint8)
+    as_jpeg, as_png = encoded(image), encoded(image, ".png")
+    assert face_pipeline.image_dimensions(as_jpeg) == ("jpeg", 1280, 960)
+    assert face_pipeline.image_dimensions(as_png) == ("png", 1280, 960)
+    assert face_pipeline.image_dimensions(b"GIF89a") is None
+
+    assert face_pipeline.decode_bounded(as_jpeg, 640 * 480).shape == (480, 640, 3)  # libjpeg's 1/2 scale
+    assert face_pipeline.decode_bounded(as_png, 640 * 480).shape == (480, 640, 3)
+    bounded = face_pipeline.decode_bounded(as_jpeg, 500 * 300)
+    assert bounded.shape[0] * bounded.shape[1] <= 500 * 300 and bounded.shape[1] / bounded.shape[0] > 1.3
+    assert face_pipeline.decode_bounded(as_jpeg, 0).shape == (960, 1280, 3)
+    assert face_pipeline.decode_bounded(b"not an image") is None
+
+
+def frame_with_face(x, y, side=40, size=(320, 240)):
+    image = np.full((size[1], size[0], 3), 60, dtype=np.uint8)
+    image[y:y + side, x:x + side] = 230
+    return image
+
+
+def test_tracked_sessions_search_the_roi_until_a_redetect(face_detector):
+    tracker = FaceTracker(redetect_every=2, roi_padding=0.5)
+    models = FaceModels(detector_backend="opencv", tracker=tracker, backend=create_backend("random"))
+    track = tracker.get("s")
+
+    models.detect_face(frame_with_face(100, 80), track)
+    assert track.box == (100, 80, 40, 40) and face_detector.calls[-1][1] == (320, 240)
+
+    crop = models.detect_face(frame_with_face(104, 82), track)  # moved a little: found inside the ROI
+    assert face_detector.calls[-1][1] == (80, 80) and crop.shape[:2] == (40, 40)
+    assert track.box == (104, 82, 40, 40)
+
+    models.detect_face(frame_with_face(220, 150), track)  # jumped out of the ROI: miss, then full frame
+    assert [size for _, size in face_detector.calls[-2:]] == [(80, 80), (320, 240)]
+    assert track.box == (220, 150, 40, 40)
+
+    models.detect_face(frame_with_face(220, 150), track)
+    models.detect_face(frame_with_face(220, 150), track)
+    models.detect_face(frame_with_face(220, 150), track)  # redetect_every=2: full frame again
+    assert [size for _, size in face_detector.calls[-3:]] == [(80, 80), (80, 80), (320, 240)]
+    metrics = tracker.metrics()
+    assert (metrics["full_detections"], metrics["roi_detections"], metrics["roi_misses"]) == (3, 3, 1)
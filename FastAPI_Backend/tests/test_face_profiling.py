@@ -0,0 +1,57 @@
+# backend/tests/test_face_profiling.py
+import pytest
+
+from face_profiling import (BUCKET_BOUNDS_MS, StageProfiler, add_stage, parse_server_timing, server_timing_header,
+                            stage_timer)
+
+
+def test_stage_timers_accumulate_and_are_optional():
+    timings = {}
+    with stage_timer(timings, "detect"):
+        pass
+    first = timings["detect"]
+    with stage_timer(timings, "detect"):
+        pass
+    assert timings["detect"] > first > 0
+
+    add_stage(timings, "queue", 0.25)
+    add_stage(timings, "queue", 0.5)
+    assert timings["queue"] == 0.75
+
+    with stage_timer(None, "detect"):  # unprofiled requests record nothing
+        pass
+    add_stage(None, "queue", 1.0)
+
+    with pytest.raises(ValueError):
+        with stage_timer(timings, "classify"):
+            raise ValueError("boom")
+    assert "classify" in timings  # a failing stage still counts
+
+
+def test_server_timing_header_round_trips_in_pipeline_order():
+    header = server_timing_header({"total": 0.012, "detect": 0.004, "b64decode": 0.0005, "unknown": 1.0})
+    assert header == "b64decode;dur=0.50, detect;dur=4.00, total;dur=12.00"
+    assert parse_server_timing(header) == {"b64decode": 0.5, "detect": 4.0, "total": 12.0}
+
+
+def test_profiler_percentiles_come_from_the_histograms():
+    profiler = StageProfiler()
+    for ms in range(1, 101):
+        profiler.observe({"detect": ms / 1000.0, "total": 2 * ms / 1000.0, "not_a_stage": 1.0})
+    metrics = profiler.metrics()
+    assert metrics["requests"] == 100 and set(metrics["stages"]) == {"detect", "total"}
+
+    detect = metrics["stages"]["detect"]
+    assert (detect["count"], detect["mean_ms"], detect["max_ms"]) == (100, 50.5, 100.0)
+    # Bucket upper bounds are at most one quarter-octave (~19%) above the true value
+    for key, exact in (("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99)):
+        assert exact <= detect[key] <= exact * 1.19
+    assert detect["p99_ms"] <= detect["max_ms"]
+
+    buckets = profiler.metrics(buckets=True)["stages"]["detect"]["buckets"]
+    counts = list(buckets.values())
+    assert counts == sorted(counts) and buckets["+Inf"] == 100
+    assert float(list(buckets)[-2]) >= 100.0 > BUCKET_BOUNDS_MS[0]
+
+    profiler.reset()
+    assert profiler.metrics() == {"requests": 0, "stages": {}}
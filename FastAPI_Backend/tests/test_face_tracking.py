@@ -0,0 +1,58 @@
+# backend/tests/test_face_tracking.py
+from face_tracking import EmotionSmoother, FaceTracker, padded_roi
+
+
+def test_padded_roi_is_clipped_to_the_frame():
+    assert padded_roi((100, 50, 40, 60), (480, 640, 3), 0.5) == (80, 20, 80, 120)
+    assert padded_roi((0, 0, 40, 60), (480, 640, 3), 0.5) == (0, 0, 60, 90)
+    assert padded_roi((620, 440, 40, 60), (480, 640), 0.5) == (600, 410, 40, 70)
+
+
+def test_sessions_expire_and_are_bounded():
+    tracker = FaceTracker(max_sessions=2, session_ttl=120.0)
+    track = tracker.get("a")
+    track.box = (1, 2, 3, 4)
+    assert tracker.get("a") is track
+
+    track.last_seen -= 121  # idle past the TTL: the stale box must not be searched
+    fresh = tracker.get("a")
+    assert fresh is not track and fresh.box is None
+
+    tracker.get("b")
+    tracker.get("c")  # evicts "a", the least recently used
+    assert tracker.metrics()["sessions"] == 2
+    assert tracker.get("a") is not fresh  # and "b" is evicted in turn
+
+    tracker.drop("a")
+    tracker.drop("missing")
+    assert tracker.metrics()["sessions"] == 1
+
+
+def test_roi_search_until_a_redetect_is_due():
+    tracker = FaceTracker(redetect_every=3)
+    track = tracker.get("s")
+    assert not tracker.should_use_roi(track)  # no box yet
+    track.box = (10, 10, 20, 20)
+    for frames in range(3):
+        track.frames_since_detect = frames
+        assert tracker.should_use_roi(track)
+    track.frames_since_detect = 3
+    assert not tracker.should_use_roi(track)
+
+    tracker.record("full", 10000)
+    tracker.record("roi", 900)
+    tracker.record("roi", 900)
+    tracker.record("miss", 600)
+    metrics = tracker.metrics()
+    assert metrics["roi_hit_rate"] == round(2 / 3, 4)
+    assert (metrics["mean_full_pixels"], metrics["mean_roi_pixels"]) == (10000, 800)
+
+
+def test_smoother_needs_a_run_of_frames_to_switch():
+    smoother = EmotionSmoother(["happy", "sad", "neutral"], alpha=0.3)
+    assert smoother.update("happy") == ("happy", 1.0)
+    assert smoother.update("sad")[0] == "happy"  # one odd frame does not flip it
+    assert smoother.update("sad")[0] == "sad"
+    assert smoother.update("unknown")[0] == "sad"  # counted as neutral
+    assert smoother.distribution() == {"happy": 0.343, "sad": 0.357, "neutral": 0.3}
+    assert list(smoother.history) == ["happy", "sad", "sad", "unknown"]
@@ -0,0 +1,101 @@
+# backend/tests/test_face_trends.py
+import threading
+
+import numpy as np
+
+import face_trends
+from face_trends import TrendStore
+
+LABELS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+HOUR = 3600.0
+NOW = 1_700_000_000.0 - 1_700_000_000.0 % 86400 + 12 * HOUR  # midday UTC
+
+
+def make_store(tmp_path, **kwargs):
+    return TrendStore(LABELS, directory=str(tmp_path / "trends"), **kwargs)
+
+
+def test_raw_ring_wraps_and_reads_newest_first(tmp_path):
+    store = make_store(tmp_path, raw_capacity=4)
+    for i, emotion in enumerate(["sad", "neutral", "happy", "happy", "angry", "fear"]):
+        store.record("u", emotion, 0.5 + i / 100, ts=NOW + i)
+
+    recent = store.recent("u", limit=10)
+    assert [r["emotion"] for r in recent] == ["fear", "angry", "happy", "happy"]
+    assert [r["confidence"] for r in recent] == [0.55, 0.54, 0.53, 0.52]
+    assert store.recent("u", limit=2)[1]["emotion"] == "angry"
+    assert store.recent("nobody") == []
+
+
+def test_hourly_ring_ignores_slots_it_has_wrapped_past(tmp_path):
+    store = make_store(tmp_path, hours=3)
+    store.record("u", "happy", 0.9, ts=NOW - 4 * HOUR)  # same slot as NOW - 1h, three hours stale
+    store.record("u", "sad", 0.8, ts=NOW - 2 * HOUR)
+    store.record("u", "happy", 0.6, ts=NOW)
+    store.record("u", "surprise", 0.4, ts=NOW)
+    store.record("u", "neutral", 0.5, ts=NOW - 5 * HOUR)  # late: its slot holds a newer hour
+
+    trend = store.trend("u", "hourly", points=6, now=NOW)  # capped at the ring size
+    assert trend["counts"] == [1, 0, 2]
+    assert trend["values"] == [2.0, None, 4.5]
+    assert trend["dominant"] == ["sad", None, "happy"]
+    assert trend["confidence"] == [0.8, None, 0.5]
+
+    daily = store.trend("u", "daily", points=2, now=NOW)
+    assert daily["counts"] == [0, 5] and daily["values"][1] == 3.8
+
+
+def test_snapshot_round_trip(tmp_path):
+    store = make_store(tmp_path, raw_capacity=8)
+    for i, emotion in enumerate(["happy", "sad", "neutral"]):
+        store.record("u", emotion, 0.7, ts=NOW - i * HOUR)
+    assert store.snapshot() == 1
+    assert store.snapshot() == 0  # nothing changed since
+
+    restored = make_store(tmp_path, raw_capacity=8)
+    assert "u" not in restored
+    restored.load("u")
+    assert "u" in restored and restored.loaded == 1
+    for period in ("hourly", "daily"):
+        assert restored.trend("u", period, points=5, now=NOW) == store.trend("u", period, points=5, now=NOW)
+    assert restored.recent("u") == store.recent("u")
+
+    # A resized raw ring keeps the aggregates and starts its frames afresh
+    resized = make_store(tmp_path, raw_capacity=16)
+    assert resized.recent("u") == []
+    assert resized.trend("u", "daily", now=NOW) == store.trend("u", "daily", now=NOW)
+
+
+def test_evicted_users_are_written_and_reloaded(tmp_path):
+    store = make_store(tmp_path, max_users=2)
+    for user in ("a", "b", "c"):
+        store.record(user, "happy", 0.9, ts=NOW)
+    assert "a" not in store and store.evicted == 1
+
+    assert store.trend("a", "daily", points=1, now=NOW)["counts"] == [1]
+    assert store.loaded == 1 and "b" not in store
+
+
+def test_snapshots_are_read_outside_the_lock(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+    store.record("u", "happy", 0.9, ts=NOW)
+    store.snapshot()
+    store = make_store(tmp_path)
+    load = np.load
+    lock_free = []
+
+    def try_lock():
+        if store._lock.acquire(timeout=1):
+            store._lock.release()
+            lock_free.append(True)
+
+    def checked_load(*args, **kwargs):
+        probe = threading.Thread(target=try_lock)
+        probe.start()
+        probe.join()
+        return load(*args, **kwargs)
+
+    monkeypatch.setattr(face_trends.np, "load", checked_load)
+    store.record("u", "sad", 0.5, ts=NOW)
+    assert lock_free == [True]
+    assert store.trend("u", "daily", points=1, now=NOW)["counts"] == [2]
@@ -0,0 +1,95 @@
+# backend/tests/test_face_workers.py
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from face_workers import FaceWorkerPool
+from inference_executor import Overloaded
+
+
+@pytest.fixture
+def pool():
+    # Scheduling only: mark the workers ready without spawning processes
+    pool = FaceWorkerPool(3, slots_per_worker=2, max_wait=0.05)
+    for worker in pool.workers:
+        worker.state = "ready"
+    return pool
+
+
+def test_home_worker_is_stable():
+    pool = FaceWorkerPool(4)
+    homes = {pool.home_worker(f"session-{i}") for i in range(50)}
+    assert homes == {0, 1, 2, 3}
+    assert pool.home_worker("abc") == FaceWorkerPool(4).home_worker("abc")
+    assert pool.home_worker(None) is None and pool.home_worker("") is None
+
+
+def test_session_sticks_to_its_home_worker(pool):
+    home = pool.home_worker("alice")
+    pool.workers[home].outstanding = 10  # busier, but it still has free slots
+    worker, slots = pool._acquire(1, home)
+    assert worker.index == home and len(slots) == 1
+    assert (pool.sticky_hits, pool.sticky_fallbacks) == (1, 0)
+
+
+def test_saturated_home_falls_back_to_least_loaded(pool):
+    home = pool.home_worker("alice")
+    pool._acquire(2, home)  # home worker now has no free slots
+    others = [w for w in pool.workers if w.index != home]
+    others[0].outstanding = 1
+
+    worker, _ = pool._acquire(1, home)
+    assert worker is others[1]
+    assert pool.sticky_fallbacks == 1
+
+    pool.workers[home].state = "exited"
+    worker, _ = pool._acquire(1, home)
+    assert worker is not pool.workers[home]
+
+
+def test_no_session_uses_least_loaded(pool):
+    pool.workers[0].outstanding = 3
+    pool.workers[1].outstanding = 1
+    worker, _ = pool._acquire(1)
+    assert worker is pool.workers[2]
+    assert (pool.sticky_hits, pool.sticky_fallbacks) == (0, 0)
+
+
+def test_acquire_times_out_when_every_worker_is_full(pool):
+    for worker in pool.workers:
+        worker.free_slots = []
+    with pytest.raises(Overloaded):
+        pool._acquire(1, 0)
+
+
+def test_worker_processes_analyse_frames_from_shared_memory(monkeypatch):
+    pytest.importorskip("deepface")
+    monkeypatch.setenv("FACE_EMOTION_BACKEND", "random")  # spawned workers inherit it: no weights needed
+    pool = FaceWorkerPool(2, slots_per_worker=2, slot_bytes=64 * 1024, warmup_runs=1, max_wait=5)
+    pool.start_background_load()
+    try:
+        deadline = time.monotonic() + 60
+        while not all(w.state == "ready" for w in pool.workers):
+            assert time.monotonic() < deadline and pool.state != "failed", pool.status()
+            time.sleep(0.1)
+
+        rng = np.random.default_rng(0)
+        frames = [cv2.imencode(".jpg", rng.integers(0, 255, (120, 160, 3), dtype=np.uint8))[1].tobytes()
+                  for _ in range(5)]
+        jobs = [(frame, f"session-{i % 3}", {}, None) for i, frame in enumerate(frames)]
+        jobs += [(b"\xff\xd8 not a jpeg", None, None, None), (b"\x00" * (64 * 1024 + 1), None, None, None)]
+        results = pool.run_batch(jobs)
+
+        assert all(isinstance(r, tuple) and 0.0 <= r[1] <= 1.0 for r in results[:5])
+        assert "Invalid image" in str(results[5]) and "worker slot" in str(results[6])
+        assert all({"imdecode", "detect", "classify"} <= set(timings) for _, _, timings, _ in jobs[:5])
+        status = pool.status()
+        assert sum(w["frames"] for w in status["workers"]) == 6
+        assert status["sticky_hits"] >= 3 and all(w["outstanding"] == 0 for w in status["workers"])
+        # Session-0's first frame was a full-frame detect too: any worker gives the same answer
+        emotion, confidence = pool.analyze_job((frames[0], None, None, None))
+        assert emotion == results[0][0] and confidence == pytest.approx(results[0][1], abs=1e-5)
+    finally:
+        pool.shutdown()
@@ -0,0 +1,43 @@
+# backend/tests/test_inference_executor.py
+import asyncio
+import time
+
+import pytest
+
+from inference_executor import InferenceExecutor, Overloaded
+
+
+@pytest.fixture
+def executor():
+    executor = InferenceExecutor(concurrency=1, max_queue=1, max_wait=0.2)
+    yield executor
+    executor.shutdown()
+
+
+def test_executor_survives_a_new_event_loop(executor):
+    async def two_at_once():
+        # concurrency=1: the second request waits on the semaphore, binding it to this loop
+        return await asyncio.gather(executor.submit(sum, [1, 2]), executor.submit(sum, [3, 4]))
+
+    assert asyncio.run(two_at_once()) == [3, 7]
+    assert asyncio.run(two_at_once()) == [3, 7]
+    assert executor.metrics()["completed"] == 4
+
+
+def test_full_queue_is_rejected(executor):
+    async def burst():
+        return await asyncio.gather(*[executor.submit(time.sleep, 0.3) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(burst())
+    errors = [r for r in results if isinstance(r, Overloaded)]
+    assert {e.status_code for e in errors} == {429, 503}
+    assert executor.rejected_full == 1 and executor.rejected_timeout == 1
+
+
+def test_submit_async_counts_failures(executor):
+    async def boom():
+        raise ValueError("bad clip")
+
+    with pytest.raises(ValueError):
+        asyncio.run(executor.submit_async(boom))
+    assert executor.failed == 1 and executor.in_flight == 0
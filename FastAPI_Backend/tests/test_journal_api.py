@@ -0,0 +1,171 @@
+# backend/tests/test_journal_api.py
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+journal_api = pytest.importorskip("journal_api")
+
+
+def test_extract_keywords_keeps_contractions_whole():
+    text = "I don't know why I didn't sleep. Didn't eat breakfast either; breakfast matters"
+    keywords = journal_api.extract_keywords(text)
+    assert keywords[:2] == ["didnt", "breakfast"]
+    assert "dont" in keywords
+    assert "nt" not in keywords and "know" in keywords
+
+
+def test_extract_keywords_drops_stop_and_short_words():
+    assert journal_api.extract_keywords("This was the best day with my dog and cat") == ["best"]
+
+
+@pytest.mark.parametrize("text", [
+    "I don't know why I didn't sleep. Didn't eat breakfast either; breakfast matters",
+    "Can't believe it won't stop raining, I'm \"fine\" (really) - my well-being is at 50%",
+    "Work, work, WORK... then family dinner; then work again!",
+])
+def test_extract_keywords_from_shared_tokens_matches_plain_split(offline_nltk, text):
+    doc = journal_api.process_document(text)
+    assert journal_api.extract_keywords(text, doc=doc) == journal_api.extract_keywords(text)
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    """journal_api backed by a temporary SQLite store and archive"""
+    from journal_archive import JournalArchive
+    from journal_storage import SQLiteJournalStore
+
+    from journal_similarity import SimilarityIndexStore
+
+    store = SQLiteJournalStore(str(tmp_path / "journal.db"))
+    monkeypatch.setattr(journal_api, "store", store)
+    monkeypatch.setattr(journal_api, "archive", JournalArchive(str(tmp_path / "archive"), compression="gzip"))
+    monkeypatch.setattr(journal_api, "similarity_store", SimilarityIndexStore(str(tmp_path / "index")))
+    yield journal_api
+    store.close()
+
+
+def add_entry(store, days_ago: float, sentiment: float, keywords):
+    when = datetime.now() - timedelta(days=days_ago)
+    store.insert_entry({"user_id": "u", "datetime": when.isoformat(), "text": " ".join(keywords),
+                        "sentiment_score": sentiment, "keywords": keywords})
+
+
+def test_multi_range_insights_match_single_ranges(journal):
+    add_entry(journal.store, 200, -1.0, ["work"])
+    add_entry(journal.store, 60, 0.0, ["work", "rain"])
+    add_entry(journal.store, 20, 0.5, ["walk"])
+    add_entry(journal.store, 3, 1.0, ["walk", "sun"])
+    # Move the oldest entry into the archive so "all" mixes rollups and hot entries
+    journal.compact(journal.store, journal.archive, (datetime.now() - timedelta(days=100)).isoformat(),
+                    journal.entry_mood_score)
+
+    ranges = ["7d", "30d", "90d", "all"]
+    together = journal.build_multi_range_insights(ranges, "u")
+    for r in ranges:
+        assert together[r] == journal.build_insights_response(r, "u")
+
+    assert together["7d"].average_score == 1.0
+    assert together["30d"].average_score == 0.875
+    assert together["90d"].average_score == 0.75
+    assert together["all"].average_score == pytest.approx(0.5625, abs=1e-3)
+    assert [len(together[r].scores) for r in ranges] == [1, 2, 3, 4]
+    assert {k["word"]: k["count"] for k in together["all"].keywords} == {"work": 2, "walk": 2, "rain": 1, "sun": 1}
+    assert together["90d"].keywords[0] == {"word": "walk", "count": 2}
+
+
+def test_multi_range_insights_downsample(journal):
+    for day in range(40):
+        add_entry(journal.store, day + 0.5, (day % 5) / 5, ["day"])
+    result = journal.build_multi_range_insights(["30d", "all"], "u", max_points=10, method="bucket")
+    assert len(result["all"].scores) <= 10 and len(result["all"].timestamps) == len(result["all"].scores)
+    assert result["all"].average_score == journal.build_insights_response("all", "u").average_score
+
+
+def export_ids(client, **params):
+    response = client.get("/journal/export", params={"user_id": "u", "fields": "_id,datetime", **params})
+    assert response.status_code == 200
+    return [json.loads(line)["_id"] for line in response.text.splitlines()], response.headers["X-Export-Watermark"]
+
+
+def test_incremental_export_follows_write_time_not_entry_date(journal, offline_nltk, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(journal, "EXPORT_SETTLE_SECONDS", 0)
+    client = TestClient(journal.app)
+
+    def save(text, when):
+        response = client.post("/journal/entry", params={"user_id": "u"}, json={"text": text, "datetime": when})
+        assert response.status_code == 200
+        return response.json()["saved_entry"]["_id"]
+
+    now = datetime.now().isoformat()
+    first = save("A quiet morning with coffee.", now)
+    ids, watermark = export_ids(client)
+    assert ids == [first] and watermark
+
+    # Saved after the export but dated earlier: a backfill, and one dated exactly like the first
+    backfilled = save("Remembering last month's trip.", (datetime.now() - timedelta(days=30)).isoformat())
+    same_date = save("Another note from this morning.", now)
+
+    ids, next_watermark = export_ids(client, since=watermark)
+    assert sorted(ids) == sorted([backfilled, same_date])
+    assert next_watermark > watermark
+    assert export_ids(client, since=next_watermark)[0] == []
+    assert len(export_ids(client)[0]) == 3
+
+
+def test_export_watermark_trails_recent_writes(journal, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    journal.store.insert_entry({"user_id": "u", "datetime": "2024-01-01T09:00:00", "created_at": datetime.utcnow()})
+    ids, watermark = export_ids(TestClient(journal.app))
+    assert len(ids) == 1
+    # Within the settle window the watermark stays behind the write, so the entry is sent again
+    assert export_ids(TestClient(journal.app), since=watermark)[0] == ids
+
+
+def test_revalidation_sees_writes_from_other_workers(journal, monkeypatch):
+    from fastapi.testclient import TestClient
+    from journal_cache import ResponseCache, VersionTracker
+
+    monkeypatch.setattr(journal, "response_cache", ResponseCache())
+    monkeypatch.setattr(journal, "version_tracker", VersionTracker(ttl_seconds=60))
+    add_entry(journal.store, 1, 0.5, ["walk"])
+    client = TestClient(journal.app)
+    etag = client.get("/journal/entries", params={"range": "all", "user_id": "u"}).headers["ETag"]
+
+    unchanged = client.get("/journal/entries", params={"range": "all", "user_id": "u"},
+                           headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+
+    # Another worker saves an entry: only the stored version moves, this worker's copy is still fresh
+    add_entry(journal.store, 0, 0.9, ["sun"])
+    journal.store.bump_version("u")
+    changed = client.get("/journal/entries", params={"range": "all", "user_id": "u"},
+                         headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.json()["entries_count"] == 2
+
+
+def test_saving_reuses_the_analyze_preview(journal, offline_nltk, monkeypatch):
+    from fastapi.testclient import TestClient
+    from journal_cache import TTLCache
+
+    monkeypatch.setattr(journal, "analysis_cache", TTLCache())
+    analyze = journal.analyze_text_complete
+    analysed = []
+    monkeypatch.setattr(journal, "analyze_text_complete", lambda text: analysed.append(text) or analyze(text))
+    client = TestClient(journal.app)
+    text = "Long walk by the river, feeling calm and grateful."
+
+    preview = client.post("/journal/analyze", json={"text": text}).json()
+    saved = client.post("/journal/entry", params={"user_id": "u"},
+                        json={"text": text, "analysis_token": preview["analysis_token"]}).json()["saved_entry"]
+    assert analysed == [text]
+    assert saved["keywords"] == preview["keywords"] and saved["ai_summary"] == preview["ai_summary"]
+
+    # Text edited after the preview: the token no longer matches, so the entry is analysed again
+    edited = text + " Then it rained."
+    client.post("/journal/entry", params={"user_id": "u"}, json={"text": edited, "analysis_token": preview["analysis_token"]})
+    assert analysed == [text, edited]
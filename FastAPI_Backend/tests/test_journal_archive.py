@@ -0,0 +1,147 @@
+# backend/tests/test_journal_archive.py
+import threading
+
+import pytest
+
+import journal_archive
+from journal_archive import JournalArchive, compact
+from journal_storage import SQLiteJournalStore
+
+
+def score(doc):
+    return doc.get("sentiment_score", 0.0)
+
+
+def make_docs(n, day="2024-01"):
+    return [
+        {"_id": f"{i:024x}", "user_id": "u", "datetime": f"{day}-{i % 28 + 1:02d}T10:00:{i % 60:02d}",
+         "text": f"walked the dog number{i}", "keywords": ["dog"], "sentiment_score": 0.5}
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return JournalArchive(str(tmp_path / "archive"), compression="gzip")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteJournalStore(str(tmp_path / "journal.db"))
+    yield store
+    store.close()
+
+
+def test_compact_user_round_trip(archive):
+    docs = sorted(make_docs(10), key=lambda d: d["datetime"])
+    assert archive.compact_user("u", iter(docs), score) == [d["_id"] for d in docs]
+    assert archive.count("u") == 10
+
+    assert [d["_id"] for d in archive.iter_entries("u")] == [d["_id"] for d in docs]
+    newest_first = list(archive.iter_entries("u", descending=True, fields=["datetime"]))
+    assert [d["datetime"] for d in newest_first] == [d["datetime"] for d in reversed(docs)]
+    window = list(archive.iter_entries("u", start=docs[2]["datetime"], end=docs[4]["datetime"]))
+    assert [d["_id"] for d in window] == [d["_id"] for d in docs[2:5]]
+
+    # A re-run after a crash (before the hot delete) does not archive twice
+    assert len(archive.compact_user("u", iter(docs), score)) == 10
+    assert archive.count("u") == 10
+    assert sum(count for _, _, count, _ in archive.rollup_points("u")) == 10
+
+
+def test_delete_tombstones_and_updates_rollups(archive):
+    docs = sorted(make_docs(3), key=lambda d: d["datetime"])
+    archive.compact_user("u", iter(docs), score)
+
+    assert archive.delete("u", docs[1]["_id"], score)
+    assert not archive.delete("u", docs[1]["_id"], score)
+    assert not archive.delete("u", "f" * 24, score)
+
+    assert archive.count("u") == 2
+    assert docs[1]["_id"] not in {d["_id"] for d in archive.iter_entries("u")}
+    assert not archive.get_entries("u", [docs[1]["_id"]], ["text"])
+    assert sum(count for _, _, count, _ in archive.rollup_points("u")) == 2
+    assert {d["_id"] for d in archive.search("u", "dog")} == {docs[0]["_id"], docs[2]["_id"]}
+
+
+def test_concurrent_deletes_keep_every_tombstone(archive):
+    docs = sorted(make_docs(40), key=lambda d: d["datetime"])
+    archive.compact_user("u", iter(docs), score)
+
+    threads = [threading.Thread(target=archive.delete, args=("u", d["_id"], score)) for d in docs[:20]]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert archive.count("u") == 20
+    assert len(JournalArchive(archive.root)._load_meta("u")["tombstones"]) == 20
+
+
+def test_compact_moves_old_entries_out_of_the_store(archive, store):
+    ids = store.insert_entries([{k: v for k, v in d.items() if k != "_id"} for d in make_docs(5)])
+    store.insert_entry({"user_id": "u", "datetime": "2024-06-01T10:00:00", "text": "recent"})
+
+    stats = compact(store, archive, "2024-02-01", score)
+    assert (stats["archived"], stats["deleted"], stats["tombstoned"]) == (5, 5, 0)
+    assert store.count_entries("u") == 1
+    assert {d["_id"] for d in archive.iter_entries("u")} == set(ids)
+
+
+def test_compact_tombstones_entries_deleted_during_the_run(archive, store):
+    ids = store.insert_entries([{k: v for k, v in d.items() if k != "_id"} for d in make_docs(4)])
+    find_range = store.find_range
+
+    def find_then_delete(*args, **kwargs):
+        docs = list(find_range(*args, **kwargs))
+        store.delete_entry(ids[0])  # the user deletes it while compaction is running
+        return iter(docs)
+
+    store.find_range = find_then_delete
+    stats = compact(store, archive, "2024-02-01", score)
+    assert (stats["archived"], stats["deleted"], stats["tombstoned"]) == (4, 3, 1)
+    assert ids[0] not in {d["_id"] for d in archive.iter_entries("u")}
+    assert archive.count("u") == 3
+
+
+def test_compaction_deletes_in_batches(archive, store, monkeypatch):
+    monkeypatch.setattr(journal_archive, "DELETE_BATCH_SIZE", 3)
+    batches = []
+    delete_entries = store.delete_entries
+
+    def recording_delete(entry_ids):
+        batches.append(len(entry_ids))
+        return delete_entries(entry_ids)
+
+    store.delete_entries = recording_delete
+    store.insert_entries([{k: v for k, v in d.items() if k != "_id"} for d in make_docs(8)])
+    stats = compact(store, archive, "2024-02-01", score)
+    assert batches == [3, 3, 2]
+    assert (stats["deleted"], stats["tombstoned"]) == (8, 0)
+
+
+def test_latest_skips_tombstoned_entries(archive):
+    docs = sorted(make_docs(5), key=lambda d: d["datetime"])
+    archive.compact_user("u", iter(docs), score)
+    assert archive.latest("u") == docs[-1]["datetime"]
+
+    archive.delete("u", docs[-1]["_id"], score)
+    assert archive.latest("u") == docs[-2]["datetime"]
+    assert archive.latest("u", after=docs[-2]["datetime"]) is None
+
+
+def test_created_at_window_and_latest(archive):
+    from datetime import datetime
+
+    docs = sorted(make_docs(4), key=lambda d: d["datetime"])
+    for n, doc in enumerate(docs):
+        doc["created_at"] = datetime(2024, 6, 1, 12, n)  # written in a different order than dated
+    docs[0]["created_at"] = datetime(2024, 6, 1, 12, 9)
+    archive.compact_user("u", iter(docs), score)
+
+    assert archive.latest("u", "created_at") == "2024-06-01T12:09:00"
+    window = archive.iter_entries("u", created_after="2024-06-01T12:01:00", created_until="2024-06-01T12:03:00")
+    assert [d["_id"] for d in window] == [docs[2]["_id"], docs[3]["_id"]]
+
+    archive.delete("u", docs[0]["_id"], score)
+    assert archive.latest("u", "created_at") == "2024-06-01T12:03:00"
+    assert next(archive.iter_entries("u"))["created_at"] == "2024-06-01T12:01:00"
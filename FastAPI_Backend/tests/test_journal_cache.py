@@ -0,0 +1,51 @@
+# backend/tests/test_journal_cache.py
+from journal_cache import ResponseCache, VersionTracker, etag_matches, make_etag
+
+
+def test_make_etag_is_quoted_and_deterministic():
+    etag = make_etag("entries", "u1", 3, "2024-05-01")
+    assert etag.startswith('"') and etag.endswith('"') and len(etag) == 34
+    assert etag == make_etag("entries", "u1", 3, "2024-05-01")
+    assert etag != make_etag("entries", "u1", 4, "2024-05-01")
+    assert make_etag("a", "bc") != make_etag("ab", "c")
+    assert make_etag("u|1", "x") != make_etag("u", "1|x")
+    assert make_etag("u", ("7d", 10)) != make_etag("u", ("7d", "10"))
+
+
+def test_etag_matches():
+    etag = make_etag("x")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f"W/{etag}", etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches("", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(etag.strip('"'), etag)
+
+
+def test_response_cache_is_a_bounded_lru():
+    cache = ResponseCache(max_entries=2)
+    cache.put(("a",), '"1"', {"v": 1})
+    cache.put(("b",), '"2"', {"v": 2})
+    assert cache.get(("a",)) == ('"1"', {"v": 1})
+    cache.put(("c",), '"3"', {"v": 3})  # evicts "b", the least recently used
+    assert cache.get(("b",)) is None
+    assert cache.stats()["entries"] == 2
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_version_tracker_caches_until_ttl():
+    calls = []
+
+    def loader(user_id):
+        calls.append(user_id)
+        return len(calls)
+
+    tracker = VersionTracker(ttl_seconds=60)
+    assert tracker.current("u", loader) == 1
+    assert tracker.current("u", loader) == 1
+    tracker.set("u", 7)
+    assert tracker.current("u", loader) == 7
+    assert tracker.current("u", loader, fresh=True) == 2
+    assert VersionTracker(ttl_seconds=0).current("u", loader) == 3
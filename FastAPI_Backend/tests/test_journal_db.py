@@ -0,0 +1,45 @@
+# backend/tests/test_journal_db.py
+import pytest
+from pymongo.errors import DuplicateKeyError, ServerSelectionTimeoutError
+
+import journal_db
+from journal_db import MongoConnectionManager
+
+
+class FakeClient:
+    """MongoClient stand-in whose ping fails"""
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        self.closed = False
+        self.admin = self
+        FakeClient.instances.append(self)
+
+    def command(self, name):
+        raise ServerSelectionTimeoutError("no servers")
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    FakeClient.instances = []
+    monkeypatch.setattr(journal_db, "MongoClient", FakeClient)
+    return MongoConnectionManager("mongodb://example", "db", [], breaker_threshold=2)
+
+
+def test_failed_connect_closes_client(manager):
+    assert manager._connect() is False
+    assert manager._connect() is False
+    assert len(FakeClient.instances) == 2
+    assert all(client.closed for client in FakeClient.instances)
+    assert manager.client is None
+    assert manager.state == "circuit_open"
+
+
+def test_report_failure_only_wakes_on_connection_errors(manager):
+    manager.report_failure(DuplicateKeyError("dup"))
+    assert not manager._wake.is_set()
+    manager.report_failure(ServerSelectionTimeoutError("down"))
+    assert manager._wake.is_set()
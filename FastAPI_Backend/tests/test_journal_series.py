@@ -0,0 +1,52 @@
+# backend/tests/test_journal_series.py
+import numpy as np
+import pytest
+
+from journal_series import bucket_average, lttb_indices
+
+
+def series(n: int):
+    x = np.arange(n, dtype=np.float64) * 3600.0
+    y = np.sin(np.arange(n) / 5.0)
+    return x, y
+
+
+def test_lttb_keeps_endpoints_and_order():
+    x, y = series(500)
+    keep = lttb_indices(x, y, 50)
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 499
+    assert np.all(np.diff(keep) > 0)
+
+
+def test_lttb_keeps_a_spike():
+    x = np.arange(200, dtype=np.float64)
+    y = np.zeros(200)
+    y[123] = 10.0
+    assert 123 in lttb_indices(x, y, 20)
+
+
+@pytest.mark.parametrize("n_out, expected", [(500, 100), (100, 100), (2, 2), (1, 1)])
+def test_lttb_small_targets(n_out, expected):
+    x, y = series(100)
+    keep = lttb_indices(x, y, n_out)
+    assert len(keep) == expected
+    assert keep[0] == 0
+
+
+def test_bucket_average_means_per_bucket():
+    x = np.array([0.0, 1.0, 2.0, 3.0, 10.0, 11.0])
+    y = np.array([1.0, 3.0, 5.0, 7.0, 2.0, 4.0])
+    bx, by = bucket_average(x, y, 2)
+    assert bx.tolist() == [1.5, 10.5]
+    assert by.tolist() == [4.0, 3.0]
+
+
+def test_bucket_average_drops_empty_buckets_and_short_input():
+    x = np.array([0.0, 1.0, 100.0])
+    y = np.array([1.0, 1.0, 5.0])
+    bx, by = bucket_average(x, y, 2)
+    assert len(bx) == 2 and by.tolist() == [1.0, 5.0]
+    bx, by = bucket_average(x, y, 10)
+    assert bx is x and by is y
+    assert bucket_average(np.zeros(4), np.arange(4.0), 2)[1].tolist() == [1.5]
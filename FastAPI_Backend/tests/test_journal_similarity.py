@@ -0,0 +1,90 @@
+# backend/tests/test_journal_similarity.py
+import multiprocessing as mp
+
+import numpy as np
+import pytest
+
+from journal_similarity import VECTOR_DIM, EmotionIndex, SimilarityIndexStore, entry_vector, normalize
+
+
+def vector(seed: int) -> np.ndarray:
+    return normalize(np.random.default_rng(seed).random(VECTOR_DIM).astype(np.float32))
+
+
+def entry_id(n: int) -> bytes:
+    return n.to_bytes(12, "big")
+
+
+def test_entry_vector_is_unit_length():
+    doc = {"emotion_distribution": {"joy": 80, "sadness": 20}, "mood_scores": {"positive": 0.7},
+           "sentiment_score": 0.5}
+    assert np.linalg.norm(entry_vector(doc)) == pytest.approx(1.0)
+    assert not entry_vector({}).any()
+
+
+def test_rebuild_add_remove_and_nearest(tmp_path):
+    index = EmotionIndex(str(tmp_path / "u"))
+    index.rebuild([(entry_id(i), vector(i), 700000 + i % 3) for i in range(10)], version=1)
+    assert index.count == 10 and index.version == 1
+
+    assert index.nearest(vector(4), 1)[0][0] == entry_id(4)
+    assert entry_id(4) not in [i for i, _ in index.nearest(vector(4), 3, exclude=entry_id(4))]
+
+    assert index.apply_update(2, lambda idx: idx.remove(entry_id(0)))
+    assert index.count == 9 and index.vector_for(entry_id(0)) is None
+    # The last row moved into the freed slot and is still found
+    assert index.nearest(vector(9), 1)[0][0] == entry_id(9)
+    # Out-of-order versions are refused (left for a rebuild)
+    assert not index.apply_update(5, lambda idx: idx.add(entry_id(99), vector(99), 700000))
+
+    days = index.similar_days(700001, 5)
+    assert [d for d, _ in days] and all(d in (700000, 700002) for d, _ in days)
+
+
+def test_two_handles_on_one_index_see_each_others_writes(tmp_path):
+    path = str(tmp_path / "u")
+    first, second = EmotionIndex(path), EmotionIndex(path)
+    first.rebuild([(entry_id(i), vector(i), 700000) for i in range(3)], version=1)
+
+    assert second.current_version() == 1
+    assert second.apply_update(2, lambda idx: idx.add(entry_id(10), vector(10), 700000))
+    assert first.apply_update(3, lambda idx: idx.add(entry_id(11), vector(11), 700000))
+    for index in (first, second):
+        assert index.current_version() == 3 and index.count == 5
+        assert index.vector_for(entry_id(10)) is not None and index.vector_for(entry_id(11)) is not None
+
+    # A rebuild that lost the race to another handle is skipped
+    second.rebuild([], version=3)
+    assert first.count == 5
+
+
+def _append_many(path: str, start: int, count: int) -> None:
+    index = EmotionIndex(path)
+    for n in range(start, start + count):
+        with index.locked():
+            index.add(entry_id(n), vector(n), 700000)
+            index.flush()
+
+
+def test_processes_appending_concurrently_do_not_share_rows(tmp_path):
+    path = str(tmp_path / "u")
+    EmotionIndex(path).rebuild([], version=0)
+    ctx = mp.get_context("fork")
+    workers = [ctx.Process(target=_append_many, args=(path, start, 150)) for start in (0, 1000)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    index = EmotionIndex(path)
+    assert index.count == 300
+    assert len(index.rows) == 300  # no id overwrote another's slot
+
+
+def test_store_keeps_a_bounded_number_open(tmp_path):
+    store = SimilarityIndexStore(str(tmp_path), max_open=2)
+    a = store.get("a")
+    store.get("b")
+    store.get("c")
+    assert "a" not in store._open and store.get("a") is not a
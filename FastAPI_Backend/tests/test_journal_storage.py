@@ -0,0 +1,99 @@
+# backend/tests/test_journal_storage.py
+import threading
+from datetime import date, datetime, timezone
+
+import pytest
+
+from journal_storage import SQLiteJournalStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteJournalStore(str(tmp_path / "journal.db"))
+    yield store
+    store.close()
+
+
+def entry(user_id: str, dt: str, text: str = "a calm day", **extra):
+    return {"user_id": user_id, "datetime": dt, "text": text, "sentiment_score": 0.2, **extra}
+
+
+def test_insert_and_find_range(store):
+    ids = store.insert_entries([entry("u", f"2024-01-0{d}T09:00:00") for d in (3, 1, 2)])
+    assert len(set(ids)) == 3 and all(len(i) == 24 for i in ids)
+    store.insert_entry(entry("other", "2024-01-02T09:00:00"))
+
+    assert [d["datetime"][:10] for d in store.find_range("u")] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    window = list(store.find_range("u", start="2024-01-02", end="2024-01-02T23:59", fields=["datetime"]))
+    assert window == [{"datetime": "2024-01-02T09:00:00"}]
+    newest = list(store.find_range("u", descending=True, limit=1, fields=["_id", "datetime"]))
+    assert newest == [{"_id": ids[0], "datetime": "2024-01-03T09:00:00"}]
+    assert len(list(store.find_range("u", start="2024-01-02T09:00:00", start_inclusive=False))) == 1
+
+    assert store.count_entries("u") == 3
+    assert store.users_before("2024-01-02") == ["u"]
+
+
+def test_created_at_bounds(store):
+    assert store.latest_created("u") is None
+    store.insert_entries([
+        entry("u", "2024-01-05T09:00:00", created_at=datetime(2024, 3, 1, 12, 0, 0, 500)),
+        entry("u", "2023-12-01T09:00:00", created_at=datetime(2024, 3, 2, 8, 0, tzinfo=timezone.utc)),
+        entry("u", "2024-01-01T09:00:00", created_at=datetime(2024, 3, 3)),
+    ])
+    assert store.latest_created("u") == "2024-03-03T00:00:00"
+    window = store.find_range("u", created_after="2024-03-01T12:00:00.000500", created_until="2024-03-02T08:00:00",
+                              fields=["datetime", "created_at"])
+    assert list(window) == [{"datetime": "2023-12-01T09:00:00", "created_at": "2024-03-02T08:00:00"}]
+
+
+def test_json_fields_round_trip(store):
+    entry_id = store.insert_entry(entry("u", "2024-01-01T09:00:00", keywords=["sleep", "tea"],
+                                        mood_scores={"happy": 0.7}))
+    doc = store.get_entries([entry_id, "f" * 24], ["keywords", "mood_scores"])[entry_id]
+    assert doc == {"_id": entry_id, "keywords": ["sleep", "tea"], "mood_scores": {"happy": 0.7}}
+
+
+def test_delete_returns_owner(store):
+    first, second, third = store.insert_entries([entry("u", f"2024-01-0{d}T09:00:00") for d in (1, 2, 3)])
+    assert store.delete_entry(first) == "u"
+    assert store.delete_entry(first) is None
+    assert store.delete_entries([second, third, first]) == 2
+    assert store.delete_entries([]) == 0
+    assert store.count_entries("u") == 0
+
+
+def test_search_matches_words_and_escapes_input(store):
+    store.insert_entries([
+        entry("u", "2024-01-01T09:00:00", "went hiking with friends"),
+        entry("u", "2024-01-02T09:00:00", "hiking again, tired"),
+        entry("v", "2024-01-02T09:00:00", "hiking alone"),
+    ])
+    assert [d["datetime"][:10] for d in store.search("u", "hiking")] == ["2024-01-02", "2024-01-01"]
+    assert store.search("u", "hiking", limit=1)[0]["text"] == "hiking again, tired"
+    assert store.search("u", 'hiking" OR "x') == []
+
+
+def test_versions_and_streak(store):
+    assert store.get_version("u") == 0
+    assert [store.bump_version("u") for _ in range(3)] == [1, 2, 3]
+    assert store.get_version("u") == 3
+
+    store.insert_entries([entry("u", f"2024-01-{d:02d}T09:00:00") for d in (10, 9, 8, 6)])
+    assert store.streak("u", date(2024, 1, 10)) == 3
+    assert store.streak("u", date(2024, 1, 11)) == 0
+
+
+def test_concurrent_writers(store):
+    def write(n):
+        for i in range(20):
+            store.insert_entry(entry(f"user{n}", f"2024-02-01T10:{i:02d}:00"))
+            store.bump_version(f"user{n}")
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [store.count_entries(f"user{n}") for n in range(4)] == [20] * 4
+    assert [store.get_version(f"user{n}") for n in range(4)] == [20] * 4
@@ -0,0 +1,94 @@
+# backend/tests/test_speech_audio.py
+import io
+import wave
+
+import numpy as np
+import pytest
+
+from speech_audio import TARGET_RATE, AudioDecodeError, decode_audio, parse_wav, resample
+
+
+def tone(rate: int, seconds: float = 0.5, freq: float = 440.0) -> np.ndarray:
+    t = np.arange(int(rate * seconds)) / rate
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def pcm16_wav(samples: np.ndarray, rate: int, channels: int = 1) -> bytes:
+    frames = np.repeat(samples[:, None], channels, axis=1) if channels > 1 else samples
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes((frames * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def riff(format_tag: int, channels: int, rate: int, bits: int, data: bytes, extra: bytes = b"") -> bytes:
+    block = channels * bits // 8
+    fmt = (format_tag.to_bytes(2, "little") + channels.to_bytes(2, "little") + rate.to_bytes(4, "little")
+           + (rate * block).to_bytes(4, "little") + block.to_bytes(2, "little") + bits.to_bytes(2, "little"))
+    chunks = extra + b"fmt " + len(fmt).to_bytes(4, "little") + fmt + b"data" + len(data).to_bytes(4, "little") + data
+    return b"RIFF" + (4 + len(chunks)).to_bytes(4, "little") + b"WAVE" + chunks
+
+
+def test_parse_pcm16_mono_and_stereo():
+    samples = tone(16000)
+    audio, rate = parse_wav(pcm16_wav(samples, 16000))
+    assert rate == 16000 and audio.dtype == np.float32
+    assert np.abs(audio - samples).max() < 1e-3
+
+    stereo, _ = parse_wav(pcm16_wav(samples, 16000, channels=2))
+    assert np.abs(stereo - samples).max() < 1e-3
+
+
+def test_parse_other_sample_formats():
+    samples = tone(8000)
+    as_float = parse_wav(riff(0x0003, 1, 8000, 32, samples.astype("<f4").tobytes()))
+    assert np.array_equal(as_float[0], samples)
+
+    as_u8 = parse_wav(riff(0x0001, 1, 8000, 8, ((samples + 1) * 128).astype(np.uint8).tobytes()))[0]
+    assert np.abs(as_u8 - samples).max() < 1 / 64
+
+    ints = (samples * 8388607).astype("<i4")
+    as_24 = parse_wav(riff(0x0001, 1, 8000, 24, b"".join(int(v).to_bytes(3, "little", signed=True) for v in ints)))[0]
+    assert np.abs(as_24 - samples).max() < 1e-6
+
+
+def test_parse_skips_unknown_chunks_and_rejects_the_rest():
+    samples = tone(16000, 0.1)
+    data = (samples * 32767).astype("<i2").tobytes()
+    odd_chunk = b"LIST" + (3).to_bytes(4, "little") + b"abc\x00"  # odd size, padded
+    audio, _ = parse_wav(riff(0x0001, 1, 16000, 16, data, extra=odd_chunk))
+    assert len(audio) == len(samples)
+
+    assert parse_wav(b"OggS" + b"\x00" * 40) is None
+    assert parse_wav(riff(0x0006, 1, 8000, 8, b"\x00" * 10)) is None  # a-law: left to ffmpeg
+    assert parse_wav(b"RIFF\x00\x00\x00\x00WAVE") is None
+
+
+def test_resample_keeps_duration_and_pitch():
+    samples = tone(44100, seconds=1.0, freq=440.0)
+    out = resample(samples, 44100, TARGET_RATE)
+    assert len(out) == TARGET_RATE and out.dtype == np.float32
+    peak_hz = np.argmax(np.abs(np.fft.rfft(out))) * TARGET_RATE / len(out)
+    assert peak_hz == pytest.approx(440.0, abs=2.0)
+    assert np.sqrt(np.mean(out ** 2)) == pytest.approx(0.5 / np.sqrt(2), rel=0.02)
+
+    assert resample(samples, TARGET_RATE) is samples
+    assert len(resample(tone(8000), 8000)) == TARGET_RATE // 2
+
+
+def test_decode_audio_wav_paths():
+    audio, decoder = decode_audio(pcm16_wav(tone(16000), 16000))
+    assert decoder == "wav" and len(audio) == 8000
+    audio, decoder = decode_audio(pcm16_wav(tone(22050), 22050))
+    assert decoder == "wav_resampled" and len(audio) == 8000
+
+
+def test_non_wav_without_ffmpeg_is_a_decode_error(monkeypatch):
+    import speech_audio
+
+    monkeypatch.setattr(speech_audio, "ffmpeg_available", lambda: False)
+    with pytest.raises(AudioDecodeError):
+        decode_audio(b"\x1a\x45\xdf\xa3 webm")
@@ -153,6 +153,11 @@ function enhanceImageData(imageData) {
     return imageData;
 }
 
+// Signed-in users get their results recorded in the face service's emotion trend
+function trendUserId() {
+    return currentUserId && currentUserId !== "guest" ? currentUserId : undefined;
+}
+
 // Improved Send Image for Analysis
 async function sendImageForAnalysis(base64Image) {
     emotionResult.innerHTML = `
@@ -173,6 +178,7 @@ async function sendImageForAnalysis(base64Image) {
             },
             body: JSON.stringify({ 
                 image: processedImage,
+                user_id: trendUserId(),
                 enhanced: true,
                 timestamp: new Date().toISOString()
             })
@@ -462,7 +468,7 @@ async function fallbackBasicAnalysis(base64Image) {
         const response = await fetch("http://localhost:5000/analyze-face", {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ image: base64Image })
+            body: JSON.stringify({ image: base64Image, user_id: trendUserId() })
         });
         
         if (response.ok) {
@@ -1623,7 +1629,7 @@ async function sendImageForAnalysis(base64Image) {
         const response = await fetch("http://localhost:5000/analyze-face", {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ image: base64Image })
+            body: JSON.stringify({ image: base64Image, user_id: trendUserId() })
         });
 
         if (!response.ok) {
@@ -397,7 +397,8 @@ async function saveEntry() {
       text,
       mood: currentMood || (analysisData?.dominant_mood) || 'neutral',
       prompt: currentPrompt || '',
-      datetime: new Date().toISOString()
+      datetime: new Date().toISOString(),
+      analysis_token: analysisData?.analysis_token || null
     };
 
     const result = await apiCall(`/journal/entry?user_id=${USER_ID}`, {
@@ -680,7 +681,7 @@ async function deleteEntry(entryId) {
   if (!confirmed) return;
   
   try {
-    await apiCall(`/journal/entry/${encodeURIComponent(entryId)}`, {
+    await apiCall(`/journal/entry/${encodeURIComponent(entryId)}?user_id=${USER_ID}`, {
       method: 'DELETE'
     });
     